@@ -11,6 +11,44 @@ DATA_DIR = ROOT_DIR / 'data'
 DOWNLOAD_DIR = DATA_DIR / 'downloads'
 LOG_DIR = DATA_DIR / 'logs'
 
-# 创建必要的目录
-DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
-LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+def ensure_data_dirs():
+    """创建数据目录，在应用启动时调用，导入包时不做文件操作"""
+    DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def create_app(config_object=None):
+    """创建Flask应用
+
+    Args:
+        config_object: 配置类，默认使用开发环境配置
+
+    Returns:
+        Flask: 注册了API蓝图的应用实例
+    """
+    from flask import Flask
+    from flask_cors import CORS
+
+    from app.api import api_bp
+    from app.config.settings import config
+    from app.utils.bandwidth import bandwidth_shaper
+    from app.utils.debug_capture import debug_capture
+    from app.utils.log import setup_logging
+
+    ensure_data_dirs()
+    app = Flask(__name__)
+    app.config.from_object(config_object or config['default'])
+    setup_logging(app.config['LOG_LEVEL'], app.config.get('LOG_DIR'))
+    bandwidth_shaper.set_rate(app.config['BANDWIDTH_RATE'] or None)
+    bandwidth_shaper.configure(weights=app.config['BANDWIDTH_WEIGHTS'], caps=app.config['BANDWIDTH_CAPS'])
+    debug_capture.configure(
+        directory=app.config['DEBUG_CAPTURE_DIR'],
+        sample_rate=app.config['DEBUG_CAPTURE_RATE'],
+        error_sample_rate=app.config['DEBUG_CAPTURE_ERROR_RATE'],
+        max_files=app.config['DEBUG_CAPTURE_MAX_FILES'],
+        max_bytes=app.config['DEBUG_CAPTURE_MAX_BYTES']
+    )
+    CORS(app)
+    app.register_blueprint(api_bp, url_prefix=f"/api/{app.config['API_VERSION']}")
+    return app
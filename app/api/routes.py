@@ -1,13 +1,175 @@
 """
 API路由定义
 """
-from flask import jsonify, request
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from flask import Response, current_app, g, has_app_context, jsonify, request, stream_with_context
 from loguru import logger
 
 from app.api import api_bp
+from app.core.downloader import DouyinDownloader
+from app.core.metadata import MetadataProbe
 from app.core.parser import URLParser
-from app.schemas.request import URLSchema
-from app.schemas.response import ErrorSchema, UserSchema
+from app.core.progress import progress_bus
+from app.core.resilience import CircuitOpenError, RateLimitedError, RequestError
+from app.schemas.request import BandwidthSchema, BatchURLSchema, URLSchema
+from app.schemas.response import ErrorSchema, UserSchema, VideoListSchema
+from app.utils.bandwidth import bandwidth_shaper
+from app.utils.cache import SingleFlight, TTLCache, cached_call
+from app.utils.metrics import CONTENT_TYPE, metrics
+from app.utils.rate_limiter import RateLimiter
+
+# 路由共享的下载器和解析器实例，首次使用时创建
+_downloader = None
+_parser = None
+_metadata_probe = None
+_shared_lock = threading.Lock()
+
+# 上游响应缓存与请求合并
+_response_cache = TTLCache(ttl=30, max_size=4096)
+_inflight = SingleFlight()
+
+# 进度事件流的连接数，每个连接长期占用一个工作线程
+_stream_subscribers = 0
+_stream_lock = threading.Lock()
+
+# 接口请求指标
+HTTP_REQUESTS = metrics.counter('http_requests_total', 'API请求次数', ('method', 'route', 'status'))
+HTTP_LATENCY = metrics.histogram('http_request_seconds', 'API请求处理耗时', ('route',))
+HTTP_IN_FLIGHT = metrics.gauge('http_requests_in_flight', '正在处理的API请求数')
+PROGRESS_SUBSCRIBERS = metrics.gauge('progress_stream_subscribers', '当前连接的进度事件流数')
+# 熔断器状态的数值表示
+BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+def _app_config():
+    """当前应用的配置，不在应用上下文中时使用默认值"""
+    return current_app.config if has_app_context() else {}
+
+
+def _site_options(app_config) -> dict:
+    """从应用配置读取抖音站点地址"""
+    return {
+        'base_url': app_config.get('DOUYIN_BASE_URL'),
+        'short_url_base': app_config.get('DOUYIN_SHORT_URL_BASE')
+    }
+
+
+def _create_downloader() -> DouyinDownloader:
+    """按应用配置创建下载器"""
+    app_config = _app_config()
+    downloader = DouyinDownloader(**_site_options(app_config))
+    if app_config.get('COOKIES_FILE'):
+        downloader.cookies_file = Path(app_config['COOKIES_FILE'])
+    rate = app_config.get('UPSTREAM_RATE_LIMIT')
+    if rate:
+        downloader.rate_limiter = RateLimiter(rate=rate, burst=rate)
+    return downloader
+
+
+def get_downloader() -> DouyinDownloader:
+    """获取路由共享的下载器实例"""
+    global _downloader
+    if _downloader is None:
+        with _shared_lock:
+            if _downloader is None:
+                _downloader = _create_downloader()
+    return _downloader
+
+
+def get_parser() -> URLParser:
+    """获取路由共享的URL解析器实例，复用连接池和短链接缓存"""
+    global _parser
+    if _parser is None:
+        with _shared_lock:
+            if _parser is None:
+                _parser = URLParser(**_site_options(_app_config()))
+    return _parser
+
+
+def get_metadata_probe() -> MetadataProbe:
+    """获取路由共享的视频元数据探测器"""
+    global _metadata_probe
+    if _metadata_probe is None:
+        downloader = get_downloader()
+        with _shared_lock:
+            if _metadata_probe is None:
+                _metadata_probe = MetadataProbe(downloader)
+    return _metadata_probe
+
+
+def reset_shared():
+    """丢弃路由共享的实例和响应缓存，下次使用时按当前应用配置重新创建"""
+    global _downloader, _parser, _metadata_probe
+    with _shared_lock:
+        _downloader = _parser = _metadata_probe = None
+    _response_cache.clear()
+
+
+def _route_label() -> str:
+    """请求匹配的路由模板，避免把路径参数当作标签值"""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+@api_bp.before_request
+def _start_request_timer():
+    """记录请求开始时间"""
+    g.metrics_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+
+
+@api_bp.after_request
+def _observe_request(response):
+    """记录请求次数和耗时"""
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        route = _route_label()
+        HTTP_REQUESTS.labels(request.method, route, response.status_code).inc()
+        HTTP_LATENCY.labels(route).observe(time.perf_counter() - started)
+    return response
+
+
+@api_bp.teardown_request
+def _finish_request(error=None):
+    """请求结束（包括异常结束）时减少处理中的请求数"""
+    HTTP_IN_FLIGHT.dec()
+
+
+def _register_runtime_metrics():
+    """注册导出时才读取的运行状态：响应缓存、会话池、熔断器和带宽分配"""
+    metrics.register_callback('response_cache_hits_total', '响应缓存命中次数', lambda: _response_cache.hits,
+                              metric_type='counter')
+    metrics.register_callback('response_cache_misses_total', '响应缓存未命中次数', lambda: _response_cache.misses,
+                              metric_type='counter')
+    metrics.register_callback('response_cache_entries', '响应缓存条目数', lambda: len(_response_cache))
+    metrics.register_callback(
+        'session_pool_busy', '已借出的会话数，接近会话总数时说明请求在排队等待会话',
+        lambda: _downloader.session_pool.busy if _downloader is not None else None)
+    metrics.register_callback(
+        'session_pool_size', '会话数量上限',
+        lambda: _downloader.session_pool.size if _downloader is not None else None)
+    metrics.register_callback(
+        'circuit_breaker_state', '域名熔断器状态（0关闭，1半开，2打开）',
+        lambda: {item['host']: BREAKER_STATES.get(item['state'], 0)
+                 for item in (_downloader.breakers.stats() if _downloader is not None else [])},
+        labelnames=('host',))
+    metrics.register_callback(
+        'bandwidth_class_rate_bytes', '各优先级类别当前分配的速率（字节/秒），未限速时不导出',
+        lambda: {name: item['rate'] for name, item in bandwidth_shaper.stats().items()},
+        labelnames=('priority',))
+
+
+_register_runtime_metrics()
+
+
+@api_bp.route('/metrics', methods=['GET'])
+def export_metrics():
+    """按Prometheus文本格式导出运行指标"""
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
 
 
 @api_bp.route('/parse', methods=['POST'])
@@ -26,7 +188,7 @@ def parse_url():
         url = data['url']
 
         # 解析URL
-        parser = URLParser()
+        parser = get_parser()
         parsed_url = parser.parse_url(url)
         
         if not parsed_url:
@@ -59,23 +221,67 @@ def parse_url():
         }), 500
 
 
+@api_bp.route('/parse/batch', methods=['POST'])
+def parse_urls():
+    """
+    批量解析抖音用户URL，以NDJSON流式返回每个URL的结果
+    ---
+    请求体:
+    {
+        "urls": ["https://www.douyin.com/user/xxx", "https://v.douyin.com/xxx/"]
+    }
+    """
+    try:
+        data = BatchURLSchema().load(request.json)
+    except Exception as e:
+        return ErrorSchema().dump({
+            'code': 400,
+            'message': f'请求参数错误: {str(e)}'
+        }), 400
+
+    parser = get_parser()
+
+    def generate():
+        for raw, parsed_url in parser.parse_urls(data['urls']):
+            item = {'input': raw, 'url': parsed_url}
+            if not parsed_url:
+                item['error'] = 'URL解析失败'
+            yield json.dumps(item, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @api_bp.route('/user/<user_id>', methods=['GET'])
 def get_user_info(user_id):
     """
     获取用户信息
     """
     try:
-        # TODO: 实现用户信息获取逻辑
-        return UserSchema().dump({
-            'user_id': user_id,
-            'nickname': '测试用户',
-            'avatar': 'https://example.com/avatar.jpg',
-            'signature': '这是一个测试签名',
-            'following_count': 100,
-            'follower_count': 1000,
-            'liked_count': 10000
+        def load():
+            downloader = get_downloader()
+            return downloader.get_user_info(f"{downloader.base_url}/user/{user_id}")
+
+        user_info = cached_call(
+            _response_cache, _inflight, ('user', user_id), load,
+            ttl=current_app.config.get('USER_CACHE_TTL', 60)
+        )
+        if not user_info:
+            return ErrorSchema().dump({
+                'code': 502,
+                'message': '获取用户信息失败'
+            }), 502
+
+        data = dict(user_info)
+        data['user_id'] = user_id
+        return jsonify({
+            'code': 200,
+            'message': 'success',
+            'data': UserSchema().dump(data)
         })
 
+    except RequestError as e:
+        logger.warning(f"获取用户信息失败: {str(e)}")
+        return _upstream_error(e)
     except Exception as e:
         logger.exception("获取用户信息失败")
         return ErrorSchema().dump({
@@ -88,19 +294,44 @@ def get_user_info(user_id):
 def get_user_videos(user_id):
     """
     获取用户视频列表
+    ---
+    查询参数:
+        cursor: 分页游标（可选，默认从第一页开始）
+        probe: 为1时读取视频文件头部补全分辨率和码率（可选）
     """
     try:
-        # TODO: 实现视频列表获取逻辑
+        cursor = request.args.get('cursor') or '0'
+        if not cursor.isdigit():
+            return ErrorSchema().dump({
+                'code': 400,
+                'message': '无效的分页游标'
+            }), 400
+
+        probe = request.args.get('probe') == '1'
+
+        def load():
+            videos, next_cursor = get_downloader().get_video_list(user_id, int(cursor))
+            if probe:
+                get_metadata_probe().enrich(videos)
+            return videos, next_cursor
+
+        videos, next_cursor = cached_call(
+            _response_cache, _inflight, ('videos', user_id, cursor, probe), load,
+            ttl=current_app.config.get('VIDEO_LIST_CACHE_TTL', 30)
+        )
         return jsonify({
             'code': 200,
             'message': 'success',
-            'data': {
-                'videos': [],
-                'has_more': False,
-                'cursor': ''
-            }
+            'data': VideoListSchema().dump({
+                'videos': [_to_video_schema(video) for video in videos],
+                'has_more': next_cursor != 0,
+                'cursor': str(next_cursor) if next_cursor else ''
+            })
         })
 
+    except RequestError as e:
+        logger.warning(f"获取视频列表失败: {str(e)}")
+        return _upstream_error(e)
     except Exception as e:
         logger.exception("获取视频列表失败")
         return ErrorSchema().dump({
@@ -109,6 +340,46 @@ def get_user_videos(user_id):
         }), 500
 
 
+def _upstream_error(error: RequestError):
+    """把上游请求错误转换为错误响应：熔断和限流返回503并附带Retry-After，其余返回502"""
+    if isinstance(error, (CircuitOpenError, RateLimitedError)):
+        retry_in = error.retry_in if isinstance(error, CircuitOpenError) else error.retry_after
+        response = jsonify(ErrorSchema().dump({
+            'code': 503,
+            'message': f'上游暂时不可用: {str(error)}'
+        }))
+        response.status_code = 503
+        if retry_in:
+            response.headers['Retry-After'] = str(int(retry_in + 0.999))
+        return response
+    return ErrorSchema().dump({
+        'code': 502,
+        'message': f'上游请求失败: {str(error)}'
+    }), 502
+
+
+def _to_video_schema(video):
+    """把下载器返回的视频信息转换为VideoSchema字段"""
+    statistics = video.get('statistics') or {}
+    create_time = video.get('create_time')
+    data = {
+        'video_id': video.get('video_id'),
+        'title': video.get('title') or '',
+        'cover': video.get('cover') or '',
+        'play_url': video.get('play_url') or '',
+        'duration': video.get('duration') or 0,
+        'create_time': datetime.fromtimestamp(create_time, tz=timezone.utc) if create_time else None,
+        'like_count': statistics.get('digg_count', 0),
+        'comment_count': statistics.get('comment_count', 0),
+        'share_count': statistics.get('share_count', 0)
+    }
+    # 探测过元数据的视频附带分辨率和码率
+    for key in ('width', 'height', 'bitrate'):
+        if video.get(key) is not None:
+            data[key] = video[key]
+    return data
+
+
 @api_bp.route('/download', methods=['POST'])
 def download_video():
     """
@@ -136,4 +407,116 @@ def download_video():
         return ErrorSchema().dump({
             'code': 500,
             'message': f'服务器错误: {str(e)}'
-        }), 500 
\ No newline at end of file
+        }), 500
+
+
+@api_bp.route('/progress/stream', methods=['GET'])
+def progress_stream():
+    """
+    下载进度事件流 (Server-Sent Events)
+    ---
+    查询参数:
+        task_id: 只推送指定任务的事件（可选）
+    请求头:
+        Last-Event-ID: 断线重连时从该事件之后继续推送（可选）
+    """
+    global _stream_subscribers
+    task_id = request.args.get('task_id')
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    last_id = int(last_id) if last_id and last_id.isdigit() else None
+    max_age = current_app.config.get('PROGRESS_STREAM_MAX_AGE', 300)
+    max_subscribers = current_app.config.get('PROGRESS_STREAM_MAX_SUBSCRIBERS', 16)
+
+    with _stream_lock:
+        if _stream_subscribers >= max_subscribers:
+            response = jsonify(ErrorSchema().dump({
+                'code': 503,
+                'message': '进度事件流连接数已达上限'
+            }))
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        _stream_subscribers += 1
+    PROGRESS_SUBSCRIBERS.inc()
+
+    def release():
+        global _stream_subscribers
+        with _stream_lock:
+            _stream_subscribers -= 1
+        PROGRESS_SUBSCRIBERS.dec()
+
+    def generate():
+        yield 'retry: 3000\n\n'
+        # 新连接先推送任务的最新状态
+        if last_id is None:
+            for event in progress_bus.snapshot(task_id):
+                yield _format_sse(event)
+        # 到期后结束响应释放线程，客户端按 retry 自动重连并携带 Last-Event-ID 续传
+        for event in progress_bus.subscribe(task_id=task_id, last_id=last_id, max_age=max_age):
+            if event is None:
+                yield ': keepalive\n\n'
+            else:
+                yield _format_sse(event)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # 由服务器在连接关闭时调用，生成器未开始迭代时也会执行
+    response.call_on_close(release)
+    return response
+
+
+def _format_sse(event):
+    """把事件格式化为SSE消息"""
+    data = json.dumps(event, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+def _bandwidth_settings() -> dict:
+    """带宽整形的当前设置和各类别的分配情况"""
+    return {
+        'rate': bandwidth_shaper.rate,
+        'classes': bandwidth_shaper.stats()
+    }
+
+
+@api_bp.route('/admin/bandwidth', methods=['GET'])
+def get_bandwidth():
+    """查看带宽整形的全局速率上限，以及各优先级类别的权重、上限和当前分配的速率"""
+    return jsonify({
+        'code': 200,
+        'message': 'success',
+        'data': _bandwidth_settings()
+    })
+
+
+@api_bp.route('/admin/bandwidth', methods=['PUT'])
+def update_bandwidth():
+    """
+    调整带宽整形设置，未提供的字段保持不变
+    ---
+    请求体:
+    {
+        "rate": 20000000,
+        "weights": {"interactive": 8, "backfill": 1},
+        "caps": {"backfill": 2000000, "incremental": null}
+    }
+    """
+    try:
+        data = BandwidthSchema().load(request.json)
+    except Exception as e:
+        return ErrorSchema().dump({
+            'code': 400,
+            'message': f'请求参数错误: {str(e)}'
+        }), 400
+
+    if 'rate' in data:
+        bandwidth_shaper.set_rate(data['rate'])
+    bandwidth_shaper.configure(weights=data.get('weights'), caps=data.get('caps'))
+    logger.info("带宽整形设置已更新: {}", data)
+    return jsonify({
+        'code': 200,
+        'message': 'success',
+        'data': _bandwidth_settings()
+    })
@@ -3,6 +3,17 @@
 """
 import os
 from pathlib import Path
+from typing import Dict, Optional
+
+
+def _parse_mapping(value: Optional[str]) -> Dict[str, float]:
+    """解析 "interactive=8,backfill=1" 形式的环境变量"""
+    mapping = {}
+    for item in (value or '').split(','):
+        if item.strip():
+            name, _, number = item.partition('=')
+            mapping[name.strip()] = float(number)
+    return mapping
 
 
 class Config:
@@ -20,9 +31,38 @@ class Config:
     REQUEST_TIMEOUT = 30
     MAX_RETRIES = 3
 
-    # 日志配置
+    # 抖音站点配置，指向本地替身服务器时可以离线压测
+    DOUYIN_BASE_URL = os.environ.get('DOUYIN_BASE_URL') or 'https://www.douyin.com'
+    DOUYIN_SHORT_URL_BASE = os.environ.get('DOUYIN_SHORT_URL_BASE') or 'https://v.douyin.com'
+    COOKIES_FILE = Path(os.environ.get('COOKIES_FILE') or BASE_DIR / 'data' / 'cookies.pkl')
+    # 上游请求速率上限（次/秒），0 表示每次请求前随机等待1-3秒
+    UPSTREAM_RATE_LIMIT = float(os.environ.get('UPSTREAM_RATE_LIMIT') or 0)
+
+    # 带宽整形配置：全局速率上限（字节/秒，0 表示不限制），各优先级类别的权重和速率上限，
+    # 环境变量形如 BANDWIDTH_CAPS="backfill=2000000"，运行时可以通过 /admin/bandwidth 接口调整
+    BANDWIDTH_RATE = float(os.environ.get('BANDWIDTH_RATE') or 0)
+    BANDWIDTH_WEIGHTS = _parse_mapping(os.environ.get('BANDWIDTH_WEIGHTS'))
+    BANDWIDTH_CAPS = _parse_mapping(os.environ.get('BANDWIDTH_CAPS'))
+
+    # 接口缓存配置（秒）
+    USER_CACHE_TTL = 60
+    VIDEO_LIST_CACHE_TTL = 30
+
+    # 进度事件流配置：单个连接的最长时长（秒），到期后客户端自动重连续传；
+    # 每个进程的最大连接数，每个连接占用一个工作线程，需小于 gunicorn 的线程数
+    PROGRESS_STREAM_MAX_AGE = 300
+    PROGRESS_STREAM_MAX_SUBSCRIBERS = int(os.environ.get('PROGRESS_STREAM_MAX_SUBSCRIBERS') or 16)
+
+    # 日志配置，LOG_DIR 为空时只输出到终端
     LOG_DIR = BASE_DIR / 'data' / 'logs'
-    LOG_LEVEL = 'INFO'
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+
+    # 调试抓取配置：按采样率保存上游响应，默认关闭
+    DEBUG_CAPTURE_DIR = BASE_DIR / 'data' / 'logs' / 'captures'
+    DEBUG_CAPTURE_RATE = float(os.environ.get('DEBUG_CAPTURE_RATE') or 0)
+    DEBUG_CAPTURE_ERROR_RATE = float(os.environ.get('DEBUG_CAPTURE_ERROR_RATE') or 0)
+    DEBUG_CAPTURE_MAX_FILES = 50
+    DEBUG_CAPTURE_MAX_BYTES = 20 * 1024 * 1024
 
     # API配置
     API_TITLE = '抖音视频下载工具'
@@ -46,6 +86,7 @@ class TestingConfig(Config):
     """测试环境配置"""
     DEBUG = True
     TESTING = True
+    LOG_DIR = None
 
 
 # 环境配置映射
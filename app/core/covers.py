@@ -0,0 +1,238 @@
+"""
+封面下载模块
+独立于视频下载的图片抓取阶段：使用自己的线程池和限速器，不与视频传输争抢并发名额；
+请求经由下载器发出，与视频传输共用CDN重试策略、熔断器和代理池。
+封面按URL（去掉签名参数和CDN节点域名）和内容哈希去重，文件按内容哈希分目录存储，已缓存的封面直接跳过。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from app.utils.cache import SingleFlight
+from app.utils.rate_limiter import RateLimiter
+
+# 按Content-Type决定的文件扩展名
+IMAGE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/webp': '.webp',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/avif': '.avif',
+    'image/heic': '.heic'
+}
+
+
+def cover_key(url: str) -> str:
+    """封面的去重键：只保留URL路径
+
+    封面URL带有过期时间和签名参数，同一张图还会由不同的CDN节点域名（p3/p6/p9等）提供，
+    路径部分对同一张图保持不变
+    """
+    return urllib.parse.urlsplit(url).path
+
+
+class CoverFetcher:
+    """封面抓取器"""
+
+    # 封面请求头，Referer按下载器的站点地址设置
+    COVER_HEADERS = {
+        'Accept': 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8'
+    }
+
+    def __init__(self, downloader, store_dir: str = 'data/covers', workers: int = 8, rate: float = 20.0,
+                 burst: float = 10.0, timeout: float = 15.0, max_bytes: int = 5 * 1024 * 1024):
+        """初始化封面抓取器
+
+        Args:
+            downloader: 下载器实例，封面请求复用其会话、重试策略、熔断器和代理池
+            store_dir: 存储目录，图片存放在 objects/<哈希前两位>/<哈希><扩展名>，索引存放在 index.db
+            workers: 并发下载数
+            rate: 每秒最多请求数，独立于视频下载的限速
+            burst: 允许的突发请求数
+            timeout: 单个请求超时（秒）
+            max_bytes: 单张图片的大小上限（字节）
+        """
+        self.downloader = downloader
+        self.store_dir = Path(store_dir)
+        self.objects_dir = self.store_dir / 'objects'
+        self.workers = workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.rate_limiter = RateLimiter(rate, burst)
+
+        self._local = threading.local()
+        # 各线程创建的连接，close() 时统一关闭
+        self._conns: List[sqlite3.Connection] = []
+        self._flight = SingleFlight()
+        self._executor = None
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+        self._store_lock = threading.Lock()
+        self._stats = {'fetched': 0, 'cached': 0, 'deduplicated': 0, 'failed': 0, 'bytes': 0}
+
+        self._init_db()
+
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的索引数据库连接
+
+        连接只在创建它的线程中使用，关闭时由调用 close() 的线程统一关闭，因此不检查线程
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.store_dir / 'index.db'), timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA busy_timeout = 30000')
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def _init_db(self):
+        """创建索引表"""
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS covers (
+                url_key TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL
+            )
+        ''')
+
+    def object_path(self, digest: str, ext: str) -> Path:
+        """内容哈希对应的存储路径"""
+        return self.objects_dir / digest[:2] / f"{digest}{ext}"
+
+    def lookup(self, url: str) -> Optional[Path]:
+        """查找已缓存的封面"""
+        row = self._conn().execute('SELECT digest, ext FROM covers WHERE url_key = ?', (cover_key(url),)).fetchone()
+        if row is None:
+            return None
+        path = self.object_path(*row)
+        return path if path.exists() else None
+
+    def fetch(self, url: str) -> Optional[Path]:
+        """获取单张封面，已缓存时直接返回，并发请求同一张封面时只下载一次
+
+        Returns:
+            Optional[Path]: 本地文件路径，失败时为None
+        """
+        if not url:
+            return None
+        path = self.lookup(url)
+        if path is not None:
+            self._count('cached')
+            return path
+        return self._flight.do(cover_key(url), lambda: self._download(url))
+
+    def fetch_all(self, videos: List[Dict]) -> Dict[str, Optional[str]]:
+        """批量获取视频封面并等待完成
+
+        Returns:
+            Dict[str, Optional[str]]: 视频ID到封面文件路径的映射，失败时为None
+        """
+        futures = {video['video_id']: self._submit(video.get('cover')) for video in videos}
+        return {video_id: (str(f.result()) if f.result() else None) for video_id, f in futures.items()}
+
+    def submit(self, videos: List[Dict]) -> None:
+        """提交封面下载任务后立即返回，用 wait() 等待全部完成"""
+        futures = [self._submit(video.get('cover')) for video in videos]
+        with self._lock:
+            self._futures = [f for f in self._futures if not f.done()] + futures
+
+    def wait(self) -> Dict[str, int]:
+        """等待已提交的任务完成，返回统计信息"""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        """统计信息：fetched 新下载、cached 命中缓存、deduplicated 内容与已有图片相同、failed 失败"""
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        """等待任务完成并释放线程池和所有线程的数据库连接"""
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        for conn in conns:
+            conn.close()
+
+    def _submit(self, url: Optional[str]) -> Future:
+        """提交到封面专用线程池"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cover')
+        return self._executor.submit(self.fetch, url)
+
+    def _download(self, url: str) -> Optional[Path]:
+        """下载封面并按内容哈希存储"""
+        # 等待期间可能已被其他线程下载
+        path = self.lookup(url)
+        if path is not None:
+            self._count('cached')
+            return path
+
+        self.rate_limiter.acquire()
+        try:
+            headers = dict(self.COVER_HEADERS, Referer=f"{self.downloader.base_url}/")
+            response = self.downloader._make_request('GET', url, stream=True, timeout=self.timeout, headers=headers)
+            with response:
+                content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                if response.status_code != 200 or not content_type.startswith('image/'):
+                    raise ValueError(f"无效的封面响应: {response.status_code} {content_type}")
+                data = bytearray()
+                for chunk in response.iter_content(64 * 1024):
+                    data.extend(chunk)
+                    if len(data) > self.max_bytes:
+                        raise ValueError(f"封面超过大小上限: {len(data)}")
+        except Exception as e:
+            logger.warning(f"下载封面失败 {url}: {str(e)}")
+            self._count('failed')
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        ext = IMAGE_EXTENSIONS.get(content_type, '.img')
+        path = self.object_path(digest, ext)
+        with self._store_lock:
+            duplicated = path.exists()
+            if not duplicated:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = path.with_name(f"{path.name}.part")
+                temp_path.write_bytes(data)
+                os.replace(temp_path, path)
+        if duplicated:
+            self._count('deduplicated')
+        else:
+            self._count('fetched', len(data))
+
+        self._conn().execute(
+            'INSERT OR REPLACE INTO covers (url_key, digest, ext, size, fetched_at) VALUES (?, ?, ?, ?, ?)',
+            (cover_key(url), digest, ext, len(data), time.time())
+        )
+        return path
+
+    def _count(self, name: str, nbytes: int = 0):
+        """更新统计"""
+        with self._lock:
+            self._stats[name] += 1
+            self._stats['bytes'] += nbytes
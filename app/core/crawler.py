@@ -0,0 +1,339 @@
+"""
+多用户批量抓取模块
+多个用户主页URL共享同一个线程池和限速器，按用户轮询调度任务，避免视频很多的用户占满所有线程
+
+命令行用法:
+    python -m app.core.crawler https://www.douyin.com/user/xxx https://v.douyin.com/yyy/ --workers 8 --rate 2
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+from app.core.downloader import DouyinDownloader, create_downloader
+from app.core.progress import EVENT_CREATOR, progress_bus
+from app.core.resilience import RequestError
+from app.utils.log import add_logging_arguments, setup_cli_logging
+from app.utils.rate_limiter import RateLimiter
+
+# 任务类型
+TASK_RESOLVE = 'resolve'
+TASK_LIST = 'list'
+TASK_VIDEO = 'video'
+
+
+class CreatorState:
+    """单个用户的抓取状态"""
+
+    def __init__(self, user_url: str):
+        self.user_url = user_url
+        self.nickname = None
+        self.user_info = None
+        self.download_dir: Optional[Path] = None
+        self.state = 'pending'  # pending/listing/downloading/done/failed
+        self.listing_done = False
+        self.discovered = 0
+        self.success = 0
+        self.failed = 0
+        self.skipped = 0
+        self.error = None
+        self.results: List[Dict] = []
+
+        # 调度状态，仅由调度线程访问
+        self.queue = deque()
+        self.inflight = 0
+        # 当前页连续获取失败的次数
+        self.list_failures = 0
+
+    @property
+    def completed(self) -> int:
+        """已处理的视频数"""
+        return self.success + self.failed + self.skipped
+
+    def to_dict(self) -> Dict:
+        """导出进度信息"""
+        return {
+            'user_url': self.user_url,
+            'nickname': self.nickname,
+            'state': self.state,
+            'discovered': self.discovered,
+            'completed': self.completed,
+            'success': self.success,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'pending': self.discovered - self.completed,
+            'error': self.error
+        }
+
+
+class BatchCrawler:
+    """多用户批量抓取器"""
+
+    def __init__(self, downloader: DouyinDownloader, max_workers: int = 4,
+                 rate_limiter: Optional[RateLimiter] = None, max_inflight_per_creator: Optional[int] = None,
+                 on_progress: Optional[Callable[[Dict, Dict], None]] = None, cover_fetcher=None,
+                 list_retries: int = 2):
+        """初始化抓取器
+
+        Args:
+            downloader: 共享的下载器实例
+            max_workers: 线程池大小
+            rate_limiter: 所有用户共享的限速器，为空时沿用下载器自身的延迟策略
+            max_inflight_per_creator: 单个用户同时占用的最大线程数，默认为线程池的一半
+            on_progress: 进度回调，参数为 (用户进度, 总体进度)
+            cover_fetcher: 封面抓取器（可选），每获取一页视频列表就把封面交给它在独立线程池中下载
+            list_retries: 一页视频列表获取失败后的重试次数，用尽后该用户标记为失败
+        """
+        self.downloader = downloader
+        self.max_workers = max_workers
+        self.max_inflight_per_creator = max_inflight_per_creator or max(1, max_workers // 2)
+        self.on_progress = on_progress
+        self.cover_fetcher = cover_fetcher
+        self.list_retries = list_retries
+        if rate_limiter is not None:
+            self.downloader.rate_limiter = rate_limiter
+        # 每个工作线程需要独占一个会话
+        session_pool = getattr(self.downloader, 'session_pool', None)
+        if session_pool is not None:
+            session_pool.ensure_size(max_workers)
+
+        self.creators: Dict[str, CreatorState] = {}
+        self._lock = threading.Lock()
+        self._started_at = None
+        # 总体进度的累计值，随用户进度一起更新，避免每次报告都遍历所有用户
+        self._totals = self._empty_totals()
+
+    def run(self, user_urls: List[str]) -> Dict[str, List[Dict]]:
+        """抓取所有用户的视频
+
+        Args:
+            user_urls: 用户主页URL列表
+
+        Returns:
+            Dict[str, List[Dict]]: 每个用户URL对应的下载结果列表
+        """
+        self._started_at = time.monotonic()
+        self.creators = {}
+        self._totals = self._empty_totals()
+        for url in user_urls:
+            if url not in self.creators:
+                creator = CreatorState(url)
+                creator.queue.append((TASK_RESOLVE, None))
+                self.creators[url] = creator
+
+        # 轮询队列：有待处理任务的用户按顺序轮流派发
+        ready = deque(self.creators.values())
+        inflight = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='crawler') as executor:
+            while ready or inflight:
+                # 派发任务直到线程池占满或所有用户都达到并发上限
+                skipped = 0
+                while ready and len(inflight) < self.max_workers and skipped < len(ready):
+                    creator = ready.popleft()
+                    if creator.inflight >= self.max_inflight_per_creator:
+                        ready.append(creator)
+                        skipped += 1
+                        continue
+                    skipped = 0
+                    task = creator.queue.popleft()
+                    creator.inflight += 1
+                    future = executor.submit(self._run_task, creator, task)
+                    inflight[future] = creator
+                    if creator.queue:
+                        ready.append(creator)
+
+                if not inflight:
+                    break
+
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    creator = inflight.pop(future)
+                    creator.inflight -= 1
+                    new_tasks = future.result()
+                    had_work = bool(creator.queue)
+                    creator.queue.extend(new_tasks)
+                    if creator.queue and not had_work:
+                        ready.append(creator)
+                    self._check_finished(creator)
+
+        if self.cover_fetcher is not None:
+            logger.info(f"封面下载完成: {self.cover_fetcher.wait()}")
+        return {url: creator.results for url, creator in self.creators.items()}
+
+    def progress(self) -> Dict:
+        """获取总体进度"""
+        with self._lock:
+            return self._overall()
+
+    def _run_task(self, creator: CreatorState, task) -> List:
+        """在工作线程中执行任务，返回新产生的任务"""
+        kind, payload = task
+        try:
+            # 同一用户的任务尽量使用同一个访问身份，保持Cookies一致
+            with self._identity(creator):
+                if kind == TASK_RESOLVE:
+                    return self._resolve(creator)
+                if kind == TASK_LIST:
+                    return self._list(creator, payload)
+                return self._download(creator, payload)
+        except Exception as e:
+            if kind == TASK_LIST and isinstance(e, RequestError) and creator.list_failures < self.list_retries:
+                # 列表页失败不能当作列表结束，重新排队这一页
+                creator.list_failures += 1
+                logger.warning(f"获取视频列表失败，稍后重试 [{creator.user_url}] 游标 {payload}: {str(e)}")
+                return [(TASK_LIST, payload)]
+            logger.error(f"抓取任务失败 [{creator.user_url}] {kind}: {str(e)}")
+            if kind == TASK_VIDEO:
+                self._record(creator, {
+                    'video_id': payload.get('video_id'),
+                    'title': payload.get('title'),
+                    'status': 'failed',
+                    'error': str(e)
+                })
+            else:
+                with self._lock:
+                    self._finish(creator, 'failed')
+                    creator.error = str(e)
+                    creator.listing_done = True
+                self._report(creator)
+            return []
+
+    def _identity(self, creator: CreatorState):
+        """借出与用户绑定的会话"""
+        session_pool = getattr(self.downloader, 'session_pool', None)
+        if session_pool is None:
+            return nullcontext()
+        return session_pool.checkout(affinity=creator.user_url)
+
+    def _resolve(self, creator: CreatorState) -> List:
+        """解析用户URL并获取用户信息"""
+        user_info, download_dir = self.downloader.prepare_user_download(creator.user_url)
+        with self._lock:
+            creator.user_info = user_info
+            creator.nickname = user_info.get('nickname')
+            creator.download_dir = download_dir
+            creator.state = 'listing'
+        self._report(creator)
+        return [(TASK_LIST, 0)]
+
+    def _list(self, creator: CreatorState, cursor: int) -> List:
+        """获取一页视频列表，产生下载任务和下一页任务"""
+        videos, next_cursor = self.downloader.get_video_list(creator.user_info['user_id'], cursor)
+        creator.list_failures = 0
+        tasks = [(TASK_VIDEO, video) for video in videos]
+        if self.cover_fetcher is not None:
+            self.cover_fetcher.submit(videos)
+        has_more = next_cursor != 0 and next_cursor != cursor
+        # 下一页排在本页视频之后，限制每个用户积压的任务数
+        if has_more:
+            tasks.append((TASK_LIST, next_cursor))
+        with self._lock:
+            creator.discovered += len(videos)
+            self._totals['discovered'] += len(videos)
+            creator.state = 'downloading'
+            creator.listing_done = not has_more
+        self._report(creator)
+        return tasks
+
+    def _download(self, creator: CreatorState, video: Dict) -> List:
+        """下载单个视频"""
+        result = self.downloader.download_one_video(video, creator.download_dir)
+        self._record(creator, result)
+        return []
+
+    def _record(self, creator: CreatorState, result: Dict):
+        """记录视频下载结果"""
+        with self._lock:
+            creator.results.append(result)
+            status = result.get('status')
+            if status == 'success':
+                creator.success += 1
+            elif status == 'skipped':
+                creator.skipped += 1
+            else:
+                status = 'failed'
+                creator.failed += 1
+            self._totals[status] += 1
+        self._report(creator)
+
+    def _check_finished(self, creator: CreatorState):
+        """检查用户是否已全部处理完成"""
+        if creator.queue or creator.inflight:
+            return
+        with self._lock:
+            if creator.state == 'failed':
+                return
+            self._finish(creator, 'done')
+        logger.info(f"用户抓取完成: {creator.nickname or creator.user_url} {creator.to_dict()}")
+        self._report(creator)
+
+    @staticmethod
+    def _empty_totals() -> Dict[str, int]:
+        """总体进度累计值的初始值"""
+        return {'creators_done': 0, 'discovered': 0, 'success': 0, 'failed': 0, 'skipped': 0}
+
+    def _finish(self, creator: CreatorState, state: str):
+        """把用户标记为结束状态（done/failed），调用方需持有锁"""
+        if creator.state not in ('done', 'failed'):
+            self._totals['creators_done'] += 1
+        creator.state = state
+
+    def _overall(self) -> Dict:
+        """汇总总体进度，调用方需持有锁"""
+        totals = self._totals
+        overall = {
+            'creators': len(self.creators),
+            'creators_done': totals['creators_done'],
+            'discovered': totals['discovered'],
+            'completed': totals['success'] + totals['failed'] + totals['skipped'],
+            'success': totals['success'],
+            'failed': totals['failed'],
+            'skipped': totals['skipped'],
+        }
+        if self._started_at:
+            overall['elapsed'] = round(time.monotonic() - self._started_at, 1)
+        return overall
+
+    def _report(self, creator: CreatorState):
+        """发布用户进度和总体进度"""
+        with self._lock:
+            state = creator.to_dict()
+            overall = self._overall()
+        progress_bus.publish(f"creator:{creator.user_url}", EVENT_CREATOR, **state)
+        if self.on_progress:
+            try:
+                self.on_progress(state, overall)
+            except Exception as e:
+                logger.error(f"进度回调失败: {str(e)}")
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='批量抓取多个用户的视频')
+    parser.add_argument('user_urls', nargs='+', help='用户主页URL或短链接')
+    parser.add_argument('--workers', type=int, default=4, help='线程池大小')
+    parser.add_argument('--rate', type=float, default=2, help='所有用户合计的上游请求速率（次/秒）')
+    parser.add_argument('--download-root', default='data/downloads', help='下载根目录')
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    setup_cli_logging(args)
+
+    downloader = create_downloader(download_root=args.download_root, session_pool_size=args.workers)
+    crawler = BatchCrawler(downloader, max_workers=args.workers, rate_limiter=RateLimiter(rate=args.rate))
+    crawler.run(args.user_urls)
+    print(json.dumps({
+        'overall': crawler.progress(),
+        'creators': [creator.to_dict() for creator in crawler.creators.values()]
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
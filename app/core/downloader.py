@@ -8,15 +8,29 @@ import re
 import random
 import pickle
 import base64
+import functools
+import threading
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
 import requests
-from bs4 import BeautifulSoup
 from loguru import logger
 from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+
+from app.core.failures import (REASON_NO_URL, REASON_SIZE_MISMATCH, DownloadError, classify_failure,
+                               status_reason)
+from app.core.progress import EVENT_COMPLETED, EVENT_FAILED, EVENT_STARTED, progress_bus
+from app.core.proxy_pool import ProxyPool
+from app.core.resilience import (API_RETRY_POLICY, CDN_RETRY_POLICY, BlockedError, CircuitBreakerRegistry,
+                                 HTTPStatusError, NetworkError, RateLimitedError, RequestError, ResponseParseError,
+                                 RetryPolicy, parse_retry_after)
+from app.core.session_pool import SessionPool
+from app.utils.bandwidth import PRIORITY_BACKFILL, PRIORITY_INTERACTIVE, bandwidth_shaper
+from app.utils.debug_capture import debug_capture
+from app.utils.metrics import TRANSFER_BUCKETS, metrics
+from app.utils.tracing import traced, tracer
 
 # 常用User-Agent列表
 USER_AGENTS = [
@@ -26,47 +40,97 @@ USER_AGENTS = [
     'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
 ]
 
+# 接口路径到端点类别的映射，用作指标标签
+API_ENDPOINTS = (
+    ('/aweme/v1/web/aweme/post/', 'video_list'),
+    ('/aweme/v1/web/aweme/detail/', 'video_detail'),
+    ('/user/', 'user_page')
+)
+
+# 运行指标
+UPSTREAM_REQUESTS = metrics.counter('upstream_requests_total', '上游请求次数，每次发送（含重试）计一次',
+                                    ('endpoint', 'host', 'status'))
+UPSTREAM_LATENCY = metrics.histogram('upstream_request_seconds', '上游请求收到响应头的耗时', ('endpoint', 'host'))
+UPSTREAM_RETRIES = metrics.counter('upstream_retries_total', '上游请求重试次数', ('endpoint', 'host', 'reason'))
+UPSTREAM_ERRORS = metrics.counter('upstream_errors_total', '重试后仍失败的上游请求', ('endpoint', 'host', 'error'))
+VIDEO_LIST_PAGES = metrics.counter('video_list_pages_total', '获取视频列表的页数', ('result',))
+VIDEO_LIST_VIDEOS = metrics.counter('video_list_videos_total', '视频列表返回的视频数')
+VIDEO_LIST_LATENCY = metrics.histogram('video_list_seconds', '获取一页视频列表的耗时（含限速等待）')
+DOWNLOADS = metrics.counter('downloads_total', '视频下载次数', ('result',))
+DOWNLOAD_FAILURES = metrics.counter('download_failures_total', '视频下载失败次数', ('reason',))
+DOWNLOAD_LATENCY = metrics.histogram('download_seconds', '成功下载一个视频的耗时', ('priority',), TRANSFER_BUCKETS)
+DOWNLOAD_BYTES = metrics.counter('download_bytes_total', '视频传输字节数', ('priority',))
+ACTIVE_TRANSFERS = metrics.gauge('active_transfers', '正在进行的视频传输数', ('priority',))
+
+
+def endpoint_class(url: str, base_url: str = 'https://www.douyin.com',
+                   short_url_base: str = 'https://v.douyin.com') -> str:
+    """请求URL的端点类别：接口按路径区分，短链接单独一类，其余域名视为视频CDN"""
+    if url.startswith(short_url_base):
+        return 'short_url'
+    if not url.startswith(base_url):
+        return 'cdn'
+    path = urllib.parse.urlsplit(url).path
+    for prefix, name in API_ENDPOINTS:
+        if path.startswith(prefix):
+            return name
+    return 'api_other'
+
+
+def video_save_path(video: Dict, download_dir: Path) -> Path:
+    """视频的保存路径：<标题>_<视频ID>.mp4，非法字符替换为下划线"""
+    title = video.get('title') or f"video_{video['video_id']}"
+    save_name = re.sub(r'[\\/:*?"<>|]', '_', f"{title}_{video['video_id']}.mp4")
+    return Path(download_dir) / save_name
+
+
+def _with_session(func):
+    """方法执行期间独占会话池中的一个会话，嵌套调用复用同一个会话"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.session_pool.checkout():
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
 class DouyinDownloader:
     """抖音视频下载器"""
 
-    def __init__(self, use_proxy: bool = False, proxy_url: str = None):
+    # 视为代理异常的状态码（代理认证失败、出口IP被限流或封禁、代理网关错误）
+    PROXY_FAILURE_STATUSES = (403, 407, 429, 502, 503, 504)
+
+    # 站点和短链接的默认地址，两者都是接口域名，使用单独的连接池，其余域名（视频CDN）共用CDN连接池
+    BASE_URL = 'https://www.douyin.com'
+    SHORT_URL_BASE = 'https://v.douyin.com'
+    # 每个会话同一时间只被一个线程使用，每个域名保留少量长连接即可；
+    # 分段下载时同一会话对CDN域名会同时建立多个连接，CDN连接池按默认分段数保留
+    API_POOL_MAXSIZE = 2
+    CDN_POOL_HOSTS = 16
+    CDN_POOL_MAXSIZE = 4
+
+    def __init__(self, use_proxy: bool = False, proxy_url: str = None, proxy_pool: Optional[ProxyPool] = None,
+                 session_pool_size: int = 4, failure_ledger=None, base_url: Optional[str] = None,
+                 short_url_base: Optional[str] = None, download_root: str = 'data/downloads'):
         """初始化下载器
         
         Args:
             use_proxy: 是否使用代理
             proxy_url: 代理服务器地址，如 http://127.0.0.1:7890
+            proxy_pool: 代理池，设置后每个请求从代理池领取代理，忽略 use_proxy/proxy_url
+            session_pool_size: 会话池大小，每个会话是一个固定User-Agent和Cookies的访问身份，
+                并发线程数不应超过该值
+            failure_ledger: 下载失败台账（FailureLedger），设置后失败的视频会被持久化，
+                之后可以只为失败的视频重新获取播放地址并重试
+            base_url: 站点地址，默认 https://www.douyin.com，指向本地替身服务器时用于离线测试和基准测试
+            short_url_base: 短链接地址前缀，默认 https://v.douyin.com
+            download_root: 下载根目录，每个用户的视频保存在以昵称命名的子目录中
         """
-        # 随机选择一个User-Agent
-        self.user_agent = random.choice(USER_AGENTS)
-        
-        # 设置会话
-        self.session = requests.Session()
-        
-        # 设置重试策略
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
-        
-        # 设置基本请求头
-        self.session.headers.update({
-            'User-Agent': self.user_agent,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Cache-Control': 'max-age=0'
-        })
-        
+        # 站点地址
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        self.short_url_base = (short_url_base or self.SHORT_URL_BASE).rstrip('/')
+        self.api_url_prefixes = (self.base_url, self.short_url_base)
+        self.download_root = Path(download_root)
+
         # 设置代理
         self.proxies = None
         if use_proxy:
@@ -81,30 +145,65 @@ class DouyinDownloader:
                     'http': 'http://127.0.0.1:7890',
                     'https': 'http://127.0.0.1:7890'
                 }
-            self.session.proxies = self.proxies
             logger.info(f"已设置代理: {self.proxies}")
+
+        # 设置代理池
+        self.proxy_pool = proxy_pool
+        if proxy_pool is not None:
+            logger.info(f"已设置代理池: {len(proxy_pool.stats())} 个代理")
+
+        # 设置会话池，第一个会话为主身份，其Cookies会持久化；会话在第一次请求时才创建
+        self.session_pool = SessionPool(self._create_session, size=session_pool_size)
             
-        # 设置cookies文件路径
-        self.cookies_file = Path("data/cookies.pkl")
+        # 共享限速器，设置后替代固定的随机延迟（批量抓取时由多个线程共享）
+        self.rate_limiter = None
+
+        # 重试策略和按域名的熔断器
+        self.api_retry_policy = API_RETRY_POLICY
+        self.cdn_retry_policy = CDN_RETRY_POLICY
+        self.breakers = CircuitBreakerRegistry()
+
+        # 带宽整形器，默认使用进程内所有下载共享的全局实例
+        self.bandwidth = bandwidth_shaper
+
+        # 调试抓取，默认使用全局实例（默认关闭）
+        self.debug_capture = debug_capture
+
+        # 下载失败台账（可选）
+        self.failure_ledger = failure_ledger
             
-        # 加载cookies
-        self._load_cookies()
+        # 设置cookies文件路径，Cookies在创建主身份会话时加载，构造后修改路径同样生效
+        self.cookies_file = Path("data/cookies.pkl")
+        self._cookies_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """当前线程使用的会话，未借出会话时为主身份会话"""
+        return self.session_pool.current() or self._primary_session
+
+    @property
+    def _primary_session(self) -> requests.Session:
+        """主身份会话，其Cookies会持久化"""
+        return self.session_pool.primary()
+
+    @property
+    def user_agent(self) -> str:
+        """当前会话固定的User-Agent"""
+        return self.session.headers['User-Agent']
 
     def _create_session(self) -> requests.Session:
         """创建请求会话"""
         session = requests.Session()
         
-        # 配置重试策略
-        retry_strategy = Retry(
-            total=3,  # 最大重试次数
-            backoff_factor=1,  # 重试间隔
-            status_forcelist=[429, 500, 502, 503, 504]  # 需要重试的HTTP状态码
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
+        # 接口域名和CDN域名使用不同大小的连接池，重试由 _make_request 按重试策略处理
+        api_adapter = HTTPAdapter(pool_connections=len(self.api_url_prefixes), pool_maxsize=self.API_POOL_MAXSIZE)
+        cdn_adapter = HTTPAdapter(pool_connections=self.CDN_POOL_HOSTS, pool_maxsize=self.CDN_POOL_MAXSIZE)
+        session.mount("http://", cdn_adapter)
+        session.mount("https://", cdn_adapter)
+        for prefix in self.api_url_prefixes:
+            session.mount(prefix, api_adapter)
         
-        # 设置基础请求头
+        # 设置基础请求头，User-Agent在会话生命周期内保持不变
         session.headers.update({
             'User-Agent': random.choice(USER_AGENTS),
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -122,37 +221,58 @@ class DouyinDownloader:
             'sec-fetch-site': 'none',
             'sec-fetch-user': '?1'
         })
+        if self.proxies:
+            session.proxies = self.proxies
+
+        # 第一个会话是主身份，加载保存的Cookies
+        if not self.session_pool.sessions:
+            self._load_cookies(session)
         
         return session
 
-    def _load_cookies(self):
-        """加载Cookies"""
+    def _load_cookies(self, session: requests.Session):
+        """把保存的Cookies加载到会话"""
         if self.cookies_file.exists():
             try:
                 with open(self.cookies_file, 'rb') as f:
-                    self.session.cookies.update(pickle.load(f))
+                    session.cookies.update(pickle.load(f))
                 logger.info("已加载保存的Cookies")
             except Exception as e:
                 logger.error(f"加载Cookies失败: {str(e)}")
 
     def _save_cookies(self):
-        """保存Cookies"""
+        """保存Cookies，只持久化主身份会话的Cookies"""
+        if self.session is not self._primary_session:
+            return
         try:
             self.cookies_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.cookies_file, 'wb') as f:
+            with self._cookies_lock, open(self.cookies_file, 'wb') as f:
                 pickle.dump(self.session.cookies, f)
             logger.info("已保存Cookies")
         except Exception as e:
             logger.error(f"保存Cookies失败: {str(e)}")
 
-    def _update_headers(self):
-        """更新请求头"""
-        self.session.headers.update({
-            'User-Agent': random.choice(self.USER_AGENTS)
-        })
+    @traced('throttle')
+    def _throttle(self):
+        """请求前的延迟，设置了共享限速器时按限速器等待，否则随机等待1-3秒"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        else:
+            time.sleep(random.uniform(1, 3))
+
+    def _endpoint(self, url: str) -> str:
+        """请求URL的端点类别，用于指标和追踪"""
+        return endpoint_class(url, self.base_url, self.short_url_base)
 
-    def _make_request(self, method: str, url: str, **kwargs) -> Optional[requests.Response]:
+    def _retry_policy(self, url: str) -> RetryPolicy:
+        """接口请求和CDN传输使用不同的重试策略"""
+        return self.api_retry_policy if url.startswith(self.api_url_prefixes) else self.cdn_retry_policy
+
+    def _make_request(self, method: str, url: str, **kwargs) -> requests.Response:
         """发送HTTP请求
+
+        网络错误和可重试的状态码按重试策略退避重试（优先遵守Retry-After），
+        目标域名处于熔断状态时不发出请求直接失败
         
         Args:
             method: 请求方法
@@ -160,31 +280,130 @@ class DouyinDownloader:
             **kwargs: 其他请求参数
             
         Returns:
-            Response对象或None
+            Response对象，不需要重试的状态码（如404）原样返回，由调用方判断
+
+        Raises:
+            CircuitOpenError: 域名已熔断
+            BlockedError: 返回403
+            RateLimitedError: 持续返回429，或要求的等待时间超过策略上限
+            HTTPStatusError: 重试后仍返回服务器错误
+            NetworkError: 重试后仍无法连接
         """
+        policy = self._retry_policy(url)
+        host = urllib.parse.urlsplit(url).netloc
+        breaker = self.breakers.get(host)
+        endpoint = self._endpoint(url)
+        latency = UPSTREAM_LATENCY.labels(endpoint, host)
         try:
-            # 更新User-Agent
-            self.session.headers.update({
-                'User-Agent': random.choice(USER_AGENTS)
-            })
-            
-            # 发送请求
-            response = self.session.request(method, url, **kwargs)
-            
-            # 保存Cookies
-            self._save_cookies()
-            
-            return response
-        except Exception as e:
-            logger.error(f"请求失败: {str(e)}")
-            return None
+            for attempt in range(1, policy.max_attempts + 1):
+                breaker.allow()
+                started = time.monotonic()
+                try:
+                    response = self._send(method, url, **kwargs)
+                except requests.RequestException as e:
+                    UPSTREAM_REQUESTS.labels(endpoint, host, 'error').inc()
+                    breaker.record_failure()
+                    if attempt >= policy.max_attempts:
+                        raise NetworkError(f"请求失败: {str(e)}", url=url, attempts=attempt) from e
+                    delay = policy.backoff(attempt)
+                    UPSTREAM_RETRIES.labels(endpoint, host, 'network').inc()
+                    logger.warning(f"请求异常，{delay:.1f} 秒后重试 ({attempt}/{policy.max_attempts}): {url} {str(e)}")
+                    with tracer.span('retry_sleep', endpoint=endpoint, delay=delay):
+                        time.sleep(delay)
+                    continue
+                except BaseException:
+                    # 不是上游导致的失败（如没有可用代理、等待会话超时），不计入熔断统计，
+                    # 但必须归还半开状态的探测名额，否则该域名会一直处于熔断状态
+                    breaker.release()
+                    raise
+
+                latency.observe(time.monotonic() - started)
+                status = response.status_code
+                UPSTREAM_REQUESTS.labels(endpoint, host, status).inc()
+                if not policy.is_host_failure(status):
+                    breaker.record_success()
+                    if status != 403:
+                        return response
+
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                too_long = retry_after is not None and retry_after > policy.max_retry_after
+                if policy.is_host_failure(status):
+                    # 服务器要求等待的时间超过上限时，整个域名按要求的时长熔断
+                    breaker.record_failure(cooldown=retry_after if too_long else None)
+
+                if status == 403:
+                    response.close()
+                    raise BlockedError(f"请求被拒绝: {url}", url=url, status_code=status, attempts=attempt)
+                if not policy.should_retry(status):
+                    return response
+
+                response.close()
+                if attempt >= policy.max_attempts or too_long:
+                    error_cls = RateLimitedError if status == 429 else HTTPStatusError
+                    extra = {'retry_after': retry_after} if status == 429 else {}
+                    raise error_cls(f"请求失败: {status} {url}", url=url, status_code=status, attempts=attempt,
+                                    **extra)
+                delay = retry_after if retry_after is not None else policy.backoff(attempt)
+                UPSTREAM_RETRIES.labels(endpoint, host, status).inc()
+                logger.warning(f"请求返回 {status}，{delay:.1f} 秒后重试 ({attempt}/{policy.max_attempts}): {url}")
+                with tracer.span('retry_sleep', endpoint=endpoint, delay=delay, status=status):
+                    time.sleep(delay)
+        except RequestError as e:
+            UPSTREAM_ERRORS.labels(endpoint, host, type(e).__name__).inc()
+            raise
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        """使用当前线程的会话（和代理池中的代理）发送一次请求"""
+        proxy = None
+        if self.proxy_pool is not None:
+            proxy = self.proxy_pool.acquire()
+            kwargs['proxies'] = proxy.proxies
 
+        started = time.monotonic()
+        try:
+            with tracer.span('http', method=method, endpoint=self._endpoint(url)) as span, \
+                    self.session_pool.checkout() as session:
+                response = session.request(method, url, **kwargs)
+                span.set(status=response.status_code)
+                # 保存Cookies
+                self._save_cookies()
+        except Exception:
+            if proxy is not None:
+                self.proxy_pool.release(proxy, False)
+            raise
+
+        if proxy is not None:
+            self._bind_proxy(response, proxy, started, kwargs.get('stream', False))
+        return response
+
+    def _bind_proxy(self, response: requests.Response, proxy, started: float, stream: bool):
+        """记录代理的请求结果，流式响应在关闭时才归还代理的并发名额"""
+        success = response.status_code not in self.PROXY_FAILURE_STATUSES
+        latency = time.monotonic() - started
+        if not stream:
+            self.proxy_pool.release(proxy, success, latency)
+            return
+
+        original_close = response.close
+        released = []
+
+        def close():
+            try:
+                original_close()
+            finally:
+                if not released:
+                    released.append(True)
+                    self.proxy_pool.release(proxy, success, latency)
+
+        response.close = close
+
+    @_with_session
     def parse_url(self, url: str) -> Optional[str]:
         """解析抖音URL，支持短链接"""
         try:
-            if 'v.douyin.com' in url:
+            if url.startswith(self.short_url_base) or 'v.douyin.com' in url:
                 response = self._make_request('HEAD', url, allow_redirects=True)
-                if not response:
+                if response.status_code >= 400:
                     return None
                 url = response.url
             
@@ -192,12 +411,13 @@ class DouyinDownloader:
             match = re.search(r'user/([^/?]+)', url)
             if match:
                 user_id = match.group(1)
-                return f"https://www.douyin.com/user/{user_id}"
+                return f"{self.base_url}/user/{user_id}"
             return None
         except Exception as e:
             logger.error(f"解析URL失败: {str(e)}")
             return None
 
+    @traced('init_session')
     def _init_user_session(self, user_url: str) -> bool:
         """初始化用户会话，获取必要的cookies和参数
         
@@ -206,6 +426,9 @@ class DouyinDownloader:
             
         Returns:
             bool: 是否初始化成功
+
+        Raises:
+            RequestError: 请求失败
         """
         try:
             # 访问主页获取初始cookies
@@ -214,7 +437,7 @@ class DouyinDownloader:
                 'Accept-Language': 'zh-CN,zh;q=0.9',
                 'Cache-Control': 'max-age=0',
                 'Connection': 'keep-alive',
-                'Host': 'www.douyin.com',
+                'Host': urllib.parse.urlsplit(self.base_url).netloc,
                 'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
                 'Sec-Ch-Ua-Mobile': '?0',
                 'Sec-Ch-Ua-Platform': '"Windows"',
@@ -226,22 +449,22 @@ class DouyinDownloader:
                 'User-Agent': self.user_agent
             }
             
-            response = self._make_request('GET', 'https://www.douyin.com/', headers=headers)
-            if not response or response.status_code != 200:
+            response = self._make_request('GET', f"{self.base_url}/", headers=headers)
+            if response.status_code != 200:
                 logger.error("访问主页失败")
                 return False
                 
             # 添加随机延迟
-            time.sleep(random.uniform(1, 3))
+            self._throttle()
             
             # 访问用户页面
             headers.update({
-                'Referer': 'https://www.douyin.com/',
+                'Referer': f"{self.base_url}/",
                 'Sec-Fetch-Site': 'same-origin'
             })
             
             response = self._make_request('GET', user_url, headers=headers)
-            if not response or response.status_code != 200:
+            if response.status_code != 200:
                 logger.error("访问用户页面失败")
                 return False
             
@@ -260,12 +483,16 @@ class DouyinDownloader:
             
             return True
             
+        except RequestError:
+            raise
         except Exception as e:
             logger.error(f"初始化用户会话失败: {str(e)}")
             return False
 
+    @traced('get_user_info')
+    @_with_session
     def get_user_info(self, url: str) -> Optional[Dict]:
-        """获取用户信息"""
+        """获取用户信息，请求失败（熔断、限流、封禁等）时抛出 RequestError"""
         try:
             # 初始化用户会话
             if not self._init_user_session(url):
@@ -274,106 +501,126 @@ class DouyinDownloader:
             
             # 获取用户页面
             response = self._make_request('GET', url)
-            if not response or response.status_code != 200:
-                logger.error(f"获取用户页面失败: {response.status_code if response else 'No response'}")
+            if response.status_code != 200:
+                logger.error(f"获取用户页面失败: {response.status_code}")
                 return None
 
-            # 保存响应内容用于调试
-            debug_file = Path("data/logs/debug_response.html")
-            debug_file.write_text(response.text, encoding='utf-8')
-            logger.info(f"已保存调试响应到: {debug_file}")
-
             # 解析页面
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            # 尝试不同的数据提取方法
-            user_info = None
-            
-            # 方法1: 查找RENDER_DATA脚本
-            render_data = soup.find('script', id='RENDER_DATA')
-            if render_data:
-                try:
-                    # RENDER_DATA可能是base64编码的
-                    data_str = render_data.string
-                    if data_str:
-                        # 尝试base64解码
-                        try:
-                            data_str = base64.b64decode(data_str).decode('utf-8')
-                        except:
-                            pass
-                        data = json.loads(data_str)
-                        logger.debug(f"RENDER_DATA解析结果: {data}")
-                        
-                        # 遍历所有可能包含用户信息的字段
-                        for key, value in data.items():
-                            if isinstance(value, dict):
-                                user_data = value.get('user') or value.get('userInfo')
-                                if user_data:
-                                    user_info = {
-                                        'user_id': user_data.get('uid') or user_data.get('id'),
-                                        'nickname': user_data.get('nickname'),
-                                        'signature': user_data.get('signature'),
-                                        'following_count': user_data.get('following_count'),
-                                        'follower_count': user_data.get('follower_count'),
-                                        'liked_count': user_data.get('total_favorited')
-                                    }
-                                    break
-                except Exception as e:
-                    logger.error(f"解析RENDER_DATA失败: {str(e)}")
-
-            # 方法2: 查找用户信息相关的其他脚本
-            if not user_info:
-                for script in soup.find_all('script'):
-                    if script.string and 'userInfo' in script.string:
-                        try:
-                            # 使用正则提取JSON数据
-                            match = re.search(r'window\._SSR_HYDRATED_DATA\s*=\s*({.+?})</script>', script.string)
-                            if match:
-                                data = json.loads(match.group(1))
-                                user_data = data.get('userInfo', {})
-                                user_info = {
-                                    'user_id': user_data.get('uid') or user_data.get('id'),
-                                    'nickname': user_data.get('nickname'),
-                                    'signature': user_data.get('signature'),
-                                    'following_count': user_data.get('following_count'),
-                                    'follower_count': user_data.get('follower_count'),
-                                    'liked_count': user_data.get('total_favorited')
-                                }
-                                break
-                        except Exception as e:
-                            logger.error(f"解析脚本数据失败: {str(e)}")
-                            continue
-
-            # 方法3: 从URL中提取用户ID
-            if not user_info:
-                user_id = re.search(r'user/([^/?]+)', url)
-                if user_id:
-                    user_info = {
-                        'user_id': user_id.group(1),
-                        'nickname': 'Unknown',
-                        'signature': '',
-                        'following_count': 0,
-                        'follower_count': 0,
-                        'liked_count': 0
-                    }
-                    logger.warning("仅从URL提取到用户ID，其他信息未获取")
+            user_info = self._parse_user_page(response.text, url)
+            # 按采样率保存页面用于调试，解析失败的页面按出错采样率保存
+            self.debug_capture.capture('user_page', response.content, error=not user_info, suffix='.html')
 
             if user_info:
-                logger.info(f"成功获取用户信息: {user_info}")
+                logger.info("成功获取用户信息: {}", user_info)
                 return user_info
             else:
                 logger.error("无法从页面提取用户信息")
                 return None
 
+        except RequestError:
+            raise
         except Exception as e:
             logger.exception(f"获取用户信息失败: {str(e)}")
             return None
 
+    @traced('parse_user_page', profile=True)
+    def _parse_user_page(self, html: str, url: str) -> Optional[Dict]:
+        """从用户主页HTML中提取用户信息，依次尝试RENDER_DATA、SSR数据，最后从URL中提取用户ID"""
+        # bs4和lxml只有解析用户主页时才用到，导入较慢，推迟到第一次解析时
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, 'lxml')
+
+        # 尝试不同的数据提取方法
+        user_info = None
+
+        # 方法1: 查找RENDER_DATA脚本
+        render_data = soup.find('script', id='RENDER_DATA')
+        if render_data:
+            try:
+                # RENDER_DATA可能是base64编码的
+                data_str = render_data.string
+                if data_str:
+                    # 尝试base64解码
+                    try:
+                        data_str = base64.b64decode(data_str).decode('utf-8')
+                    except:
+                        pass
+                    data = json.loads(data_str)
+                    logger.debug("RENDER_DATA解析结果: {}", data)
+
+                    # 遍历所有可能包含用户信息的字段
+                    for key, value in data.items():
+                        if isinstance(value, dict):
+                            user_data = value.get('user') or value.get('userInfo')
+                            if user_data:
+                                user_info = self._build_user_info(user_data)
+                                break
+            except Exception as e:
+                logger.error(f"解析RENDER_DATA失败: {str(e)}")
+
+        # 方法2: 查找用户信息相关的其他脚本
+        if not user_info:
+            for script in soup.find_all('script'):
+                if script.string and 'userInfo' in script.string:
+                    try:
+                        # 使用正则提取JSON数据
+                        match = re.search(r'window\._SSR_HYDRATED_DATA\s*=\s*({.+?})</script>', script.string)
+                        if match:
+                            data = json.loads(match.group(1))
+                            user_data = data.get('userInfo', {})
+                            user_info = self._build_user_info(user_data)
+                            break
+                    except Exception as e:
+                        logger.error(f"解析脚本数据失败: {str(e)}")
+                        continue
+
+        # 方法3: 从URL中提取用户ID
+        if not user_info:
+            user_id = re.search(r'user/([^/?]+)', url)
+            if user_id:
+                user_info = {
+                    'user_id': user_id.group(1),
+                    'nickname': 'Unknown',
+                    'avatar': '',
+                    'signature': '',
+                    'following_count': 0,
+                    'follower_count': 0,
+                    'liked_count': 0
+                }
+                logger.warning("仅从URL提取到用户ID，其他信息未获取")
+
+        return user_info
+
+    @staticmethod
+    def _build_user_info(user_data: Dict) -> Dict:
+        """从页面数据中的用户字段构建用户信息"""
+        avatar = user_data.get('avatar_thumb') or user_data.get('avatar_larger') or {}
+        return {
+            'user_id': user_data.get('uid') or user_data.get('id'),
+            'nickname': user_data.get('nickname'),
+            'avatar': (avatar.get('url_list') or [''])[0],
+            'signature': user_data.get('signature'),
+            'following_count': user_data.get('following_count'),
+            'follower_count': user_data.get('follower_count'),
+            'liked_count': user_data.get('total_favorited')
+        }
+
+    @traced('video_list_page')
+    @_with_session
     def get_video_list(self, user_id: str, max_cursor: int = 0) -> Tuple[List[Dict], int]:
-        """获取视频列表"""
+        """获取视频列表
+
+        Returns:
+            Tuple[List[Dict], int]: (视频列表, 下一页游标)，游标为0表示没有更多视频
+
+        Raises:
+            RequestError: 请求失败、返回非200状态码或内容无法解析，避免被调用方当作没有更多视频
+        """
+        started = time.monotonic()
         try:
             # 使用新的API端点
-            api_url = f"https://www.douyin.com/aweme/v1/web/aweme/post/"
+            api_url = f"{self.base_url}/aweme/v1/web/aweme/post/"
             
             # 获取API参数
             params = self._get_api_params()
@@ -387,9 +634,9 @@ class DouyinDownloader:
                 'Accept-Language': 'zh-CN,zh;q=0.9',
                 'Cache-Control': 'no-cache',
                 'Connection': 'keep-alive',
-                'Host': 'www.douyin.com',
+                'Host': urllib.parse.urlsplit(self.base_url).netloc,
                 'Pragma': 'no-cache',
-                'Referer': f'https://www.douyin.com/user/{user_id}',
+                'Referer': f'{self.base_url}/user/{user_id}',
                 'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
                 'Sec-Ch-Ua-Mobile': '?0',
                 'Sec-Ch-Ua-Platform': '"Windows"',
@@ -400,69 +647,151 @@ class DouyinDownloader:
             }
             
             # 添加随机延迟
-            time.sleep(random.uniform(1, 3))
+            self._throttle()
             
-            # 保存请求信息用于调试
-            logger.debug(f"请求视频列表: {api_url}")
-            logger.debug(f"请求参数: {params}")
+            logger.debug("请求视频列表: {} 参数: {}", api_url, params)
             
             response = self._make_request('GET', api_url, params=params, headers=headers)
             
-            if not response or response.status_code != 200:
-                logger.error(f"获取视频列表失败: {response.status_code if response else 'No response'}")
-                # 保存响应内容用于调试
-                if response:
-                    debug_file = Path("data/logs/video_list_response.json")
-                    debug_file.write_text(response.text, encoding='utf-8')
-                    logger.info(f"已保存视频列表响应到: {debug_file}")
-                return [], 0
+            if response.status_code != 200:
+                self.debug_capture.capture('video_list', response.content, error=True, suffix='.json')
+                raise HTTPStatusError(f"获取视频列表失败: {response.status_code}", url=api_url,
+                                      status_code=response.status_code, attempts=1)
 
-            try:
-                data = response.json()
-            except json.JSONDecodeError as e:
-                logger.error(f"解析视频列表JSON失败: {str(e)}")
-                debug_file = Path("data/logs/video_list_response.json")
-                debug_file.write_text(response.text, encoding='utf-8')
-                logger.info(f"已保存视频列表响应到: {debug_file}")
-                return [], 0
-
-            videos = []
-            for item in data.get('aweme_list', []):
-                video_info = {
-                    'video_id': item.get('aweme_id'),
-                    'title': item.get('desc'),
-                    'cover': item.get('video', {}).get('cover', {}).get('url_list', [None])[0],
-                    'play_url': item.get('video', {}).get('play_addr', {}).get('url_list', [None])[0],
-                    'create_time': item.get('create_time'),
-                    'statistics': {
-                        'comment_count': item.get('statistics', {}).get('comment_count', 0),
-                        'digg_count': item.get('statistics', {}).get('digg_count', 0),
-                        'share_count': item.get('statistics', {}).get('share_count', 0)
-                    }
-                }
-                videos.append(video_info)
+            with tracer.span('parse_video_list', profile=True):
+                data = self._parse_json(response, api_url)
+                videos = [self._to_video_info(item) for item in data.get('aweme_list') or []]
 
             has_more = data.get('has_more', False)
             next_cursor = data.get('max_cursor', 0) if has_more else 0
             
-            logger.info(f"成功获取视频列表: {len(videos)} 个视频")
+            self.debug_capture.capture('video_list', response.content, suffix='.json')
+            logger.info("成功获取视频列表: {} 个视频", len(videos))
+            self._observe_video_list('ok', started, len(videos))
+            tracer.current().set(cursor=max_cursor, videos=len(videos))
             return videos, next_cursor
             
         except Exception as e:
-            logger.exception(f"获取视频列表失败: {str(e)}")
-            return [], 0
+            logger.error(f"获取视频列表失败: {str(e)}")
+            self._observe_video_list('error', started)
+            raise
+
+    def _parse_json(self, response: requests.Response, url: str) -> Dict:
+        """解析接口返回的JSON对象
 
-    def download_video(self, video_url: str, save_path: str) -> bool:
+        Raises:
+            ResponseParseError: 内容为空或不是JSON对象（常见于反爬返回的空响应）
+        """
+        try:
+            data = response.json()
+        except ValueError as e:
+            self.debug_capture.capture(self._endpoint(url), response.content, error=True, suffix='.json')
+            raise ResponseParseError(f"无法解析接口响应: {url} {str(e)}", url=url, status_code=response.status_code,
+                                     attempts=1) from e
+        if not isinstance(data, dict):
+            raise ResponseParseError(f"接口响应不是JSON对象: {url}", url=url, status_code=response.status_code,
+                                     attempts=1)
+        return data
+
+    @staticmethod
+    def _observe_video_list(result: str, started: float, count: int = 0):
+        """记录获取一页视频列表的指标"""
+        VIDEO_LIST_PAGES.labels(result).inc()
+        VIDEO_LIST_LATENCY.observe(time.monotonic() - started)
+        if count:
+            VIDEO_LIST_VIDEOS.inc(count)
+
+    @staticmethod
+    def _to_video_info(item: Dict) -> Dict:
+        """从接口返回的作品数据构建视频信息"""
+        return {
+            'video_id': item.get('aweme_id'),
+            'title': item.get('desc'),
+            'cover': item.get('video', {}).get('cover', {}).get('url_list', [None])[0],
+            'play_url': item.get('video', {}).get('play_addr', {}).get('url_list', [None])[0],
+            'duration': (item.get('video', {}).get('duration') or 0) // 1000,
+            'create_time': item.get('create_time'),
+            'statistics': {
+                'comment_count': item.get('statistics', {}).get('comment_count', 0),
+                'digg_count': item.get('statistics', {}).get('digg_count', 0),
+                'share_count': item.get('statistics', {}).get('share_count', 0)
+            }
+        }
+
+    @_with_session
+    def get_video_detail(self, video_id: str) -> Optional[Dict]:
+        """获取单个视频的详情（包含新签名的播放地址），用于重试失败的下载
+
+        Returns:
+            Optional[Dict]: 视频信息，字段同 get_video_list，视频已删除或不可见（响应中没有 aweme_detail）时为None
+
+        Raises:
+            RequestError: 请求失败、返回非200状态码或内容无法解析，调用方应稍后重试而不是当作视频不可用
+        """
+        api_url = f"{self.base_url}/aweme/v1/web/aweme/detail/"
+        params = self._get_api_params()
+        params['aweme_id'] = video_id
+        headers = {
+            'Accept': 'application/json, text/plain, */*',
+            'Accept-Language': 'zh-CN,zh;q=0.9',
+            'Referer': f'{self.base_url}/video/{video_id}',
+            'Sec-Fetch-Dest': 'empty',
+            'Sec-Fetch-Mode': 'cors',
+            'Sec-Fetch-Site': 'same-origin',
+            'User-Agent': self.user_agent
+        }
+
+        # 添加随机延迟
+        self._throttle()
+
+        response = self._make_request('GET', api_url, params=params, headers=headers)
+        if response.status_code != 200:
+            self.debug_capture.capture('video_detail', response.content, error=True, suffix='.json')
+            raise HTTPStatusError(f"获取视频详情失败 {video_id}: {response.status_code}", url=api_url,
+                                  status_code=response.status_code, attempts=1)
+        item = self._parse_json(response, api_url).get('aweme_detail')
+        if not item:
+            logger.warning(f"视频详情为空，可能已删除: {video_id}")
+            return None
+        return self._to_video_info(item)
+
+    def download_video(self, video_url: str, save_path: str, task_id: Optional[str] = None,
+                       priority: str = PRIORITY_INTERACTIVE, size: Optional[int] = None,
+                       segments: int = 1) -> bool:
         """下载视频
         
         Args:
             video_url: 视频URL
             save_path: 保存路径
+            task_id: 进度事件使用的任务ID，默认使用保存文件名
+            priority: 带宽优先级类别（interactive/incremental/backfill）
+            size: 预先探测到的文件大小（字节）
+            segments: 分段数，大于1且已知文件大小时按Range分段并发下载
             
         Returns:
             bool: 是否下载成功
         """
+        return self._try_download(video_url, save_path, task_id, priority, size, segments) is None
+
+    @traced('download')
+    @_with_session
+    def _try_download(self, video_url: str, save_path: str, task_id: Optional[str] = None,
+                      priority: str = PRIORITY_INTERACTIVE, size: Optional[int] = None,
+                      segments: int = 1) -> Optional[Exception]:
+        """下载视频，参数同 download_video
+
+        Returns:
+            Optional[Exception]: 成功时为None，失败时为导致失败的异常（用于归类失败原因）
+        """
+        task_id = task_id or os.path.basename(save_path)
+        temp_path = save_path + '.part'
+        started = time.monotonic()
+        active = ACTIVE_TRANSFERS.labels(priority)
+        active.inc()
         try:
+            if not video_url:
+                raise DownloadError("没有播放地址", REASON_NO_URL)
+
             # 创建保存目录
             save_dir = os.path.dirname(save_path)
             if save_dir:
@@ -482,52 +811,208 @@ class DouyinDownloader:
             }
             
             # 添加随机延迟
-            time.sleep(random.uniform(1, 3))
+            self._throttle()
             
-            # 获取视频内容
-            response = self._make_request('GET', video_url, stream=True, headers=headers)
-            if not response or response.status_code not in [200, 206]:
-                logger.error(f"下载视频失败: {response.status_code if response else 'No response'}")
-                return False
+            if segments > 1 and size:
+                # 大文件按Range分段并发下载
+                total_size = size
+                downloaded_size = self._download_segmented(video_url, temp_path, size, segments, headers,
+                                                           priority, task_id, save_path)
+            else:
+                # 获取视频内容
+                response = self._make_request('GET', video_url, stream=True, headers=headers)
+                if response.status_code not in [200, 206]:
+                    response.close()
+                    raise DownloadError(f"下载视频失败: {response.status_code}", status_reason(response.status_code))
 
-            # 获取文件大小
-            total_size = int(response.headers.get('content-length', 0))
-            block_size = 1024 * 1024  # 1MB
-            downloaded_size = 0
-            
-            # 保存视频
-            with open(save_path, 'wb') as f:
-                for data in response.iter_content(block_size):
-                    downloaded_size += len(data)
-                    f.write(data)
-                    # 打印下载进度
-                    if total_size > 0:
-                        progress = (downloaded_size / total_size) * 100
-                        logger.debug(f"下载进度: {progress:.1f}%")
+                # 获取文件大小
+                total_size = int(response.headers.get('content-length', 0))
+                block_size = 1024 * 1024  # 1MB
+                downloaded_size = 0
+                transferred = DOWNLOAD_BYTES.labels(priority)
+                shaped = 0.0
+                started_at = time.monotonic()
+                progress_bus.publish(task_id, EVENT_STARTED, total=total_size, path=save_path)
+
+                # 保存视频，先写入临时文件，校验通过后再改名，避免残缺文件被当作已下载
+                with response, open(temp_path, 'wb') as f:
+                    for data in response.iter_content(block_size):
+                        downloaded_size += len(data)
+                        f.write(data)
+                        transferred.inc(len(data))
+                        # 按优先级类别占用共享带宽，超出分配的速率时在这里等待
+                        shaped += self.bandwidth.consume(len(data), priority)
+                        # 发布下载进度（总线内部限流）
+                        progress_bus.progress(task_id, downloaded_size, total_size, started_at)
+                tracer.current().set(bandwidth_wait=round(shaped, 3))
 
             # 验证文件大小
-            if total_size > 0 and os.path.getsize(save_path) != total_size:
-                logger.error(f"文件大小不匹配: 期望 {total_size}，实际 {os.path.getsize(save_path)}")
-                return False
+            if total_size > 0 and downloaded_size != total_size:
+                raise DownloadError(f"文件大小不匹配: 期望 {total_size}，实际 {downloaded_size}",
+                                    REASON_SIZE_MISMATCH)
 
-            logger.info(f"视频下载完成: {save_path}")
-            return True
+            os.replace(temp_path, save_path)
+            logger.info("视频下载完成: {}", save_path)
+            progress_bus.finish(task_id, EVENT_COMPLETED, downloaded=downloaded_size, total=total_size, path=save_path)
+            DOWNLOADS.labels('success').inc()
+            DOWNLOAD_LATENCY.labels(priority).observe(time.monotonic() - started)
+            tracer.current().set(bytes=downloaded_size, priority=priority, outcome='ok')
+            return None
             
         except Exception as e:
             logger.error(f"下载视频失败: {str(e)}")
-            if os.path.exists(save_path):
+            reason = classify_failure(e)
+            progress_bus.finish(task_id, EVENT_FAILED, error=str(e), reason=reason)
+            DOWNLOADS.labels('failed').inc()
+            DOWNLOAD_FAILURES.labels(reason).inc()
+            tracer.current().set(priority=priority, outcome='failed', reason=reason)
+            if os.path.exists(temp_path):
                 try:
-                    os.remove(save_path)
-                    logger.info(f"已删除失败的下载文件: {save_path}")
+                    os.remove(temp_path)
+                    logger.info(f"已删除失败的下载文件: {temp_path}")
                 except:
                     pass
-            return False
+            return e
+        finally:
+            active.dec()
+
+    def _download_segmented(self, video_url: str, temp_path: str, size: int, segments: int, headers: Dict,
+                            priority: str, task_id: str, save_path: str) -> int:
+        """把文件按Range分成多段并发下载到同一个临时文件，各段共用当前线程的会话
+
+        Returns:
+            int: 下载的总字节数
+        """
+        session = self.session
+        block_size = 1024 * 1024  # 1MB
+        step = -(-size // segments)
+        ranges = [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+        lock = threading.Lock()
+        counter = {'downloaded': 0}
+        transferred = DOWNLOAD_BYTES.labels(priority)
+        started_at = time.monotonic()
+        progress_bus.publish(task_id, EVENT_STARTED, total=size, path=save_path, segments=len(ranges))
+
+        # 预先分配文件大小，各段写入自己的区间
+        with open(temp_path, 'wb') as f:
+            f.truncate(size)
+
+        @traced('segment')
+        def fetch(byte_range: Tuple[int, int]) -> int:
+            start, end = byte_range
+            with self.session_pool.bind(session):
+                response = self._make_request('GET', video_url, stream=True,
+                                              headers={**headers, 'Range': f'bytes={start}-{end}'})
+            received = 0
+            with response, open(temp_path, 'r+b') as f:
+                if response.status_code != 206:
+                    raise HTTPStatusError(f"分段请求未返回206: {response.status_code}", url=video_url,
+                                          status_code=response.status_code)
+                f.seek(start)
+                for data in response.iter_content(block_size):
+                    received += len(data)
+                    f.write(data)
+                    transferred.inc(len(data))
+                    self.bandwidth.consume(len(data), priority)
+                    with lock:
+                        counter['downloaded'] += len(data)
+                        downloaded = counter['downloaded']
+                    progress_bus.progress(task_id, downloaded, size, started_at)
+            tracer.current().set(bytes=received)
+            if received != end - start + 1:
+                raise HTTPStatusError(f"分段大小不匹配: {start}-{end} 实际 {received}", url=video_url)
+            return received
+
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix='segment') as executor:
+            return sum(executor.map(fetch, ranges))
+
+    def prepare_user_download(self, user_url: str) -> Tuple[Dict, Path]:
+        """解析用户URL、获取用户信息并创建下载目录
+        
+        Args:
+            user_url: 用户主页URL
+            
+        Returns:
+            Tuple[Dict, Path]: (用户信息, 下载目录)
+        """
+        # 解析用户URL
+        user_url = self.parse_url(user_url)
+        if not user_url:
+            raise Exception("无效的用户URL")
+        
+        # 获取用户信息
+        user_info = self.get_user_info(user_url)
+        if not user_info:
+            raise Exception("获取用户信息失败")
+        
+        # 创建下载目录
+        download_dir = self.download_root / user_info['nickname']
+        download_dir.mkdir(parents=True, exist_ok=True)
+        return user_info, download_dir
+
+    def download_one_video(self, video: Dict, download_dir: Path, priority: str = PRIORITY_BACKFILL) -> Dict:
+        """下载单个视频，已存在的文件会被跳过
+        
+        Args:
+            video: get_video_list 返回的视频信息
+            download_dir: 下载目录
+            priority: 带宽优先级类别，默认按批量补全处理
+            
+        Returns:
+            Dict: 下载结果，字段同 download_all_videos，失败时还包含 reason（失败原因代码）
+        """
+        result = {
+            'video_id': video['video_id'],
+            'title': video['title'] or f"video_{video['video_id']}"
+        }
+        
+        save_path = str(video_save_path(video, download_dir))
+        
+        # 检查是否已下载
+        if os.path.exists(save_path):
+            result.update({
+                'status': 'skipped',
+                'error': '文件已存在',
+                'path': save_path
+            })
+        else:
+            # 下载视频
+            logger.info("开始下载视频: {}", result['title'])
+            error = self._try_download(video['play_url'], save_path, task_id=video['video_id'], priority=priority,
+                                       size=video.get('size'), segments=video.get('segments', 1))
+            if error is None:
+                result.update({
+                    'status': 'success',
+                    'path': save_path
+                })
+            else:
+                result.update({
+                    'status': 'failed',
+                    'error': f"下载失败: {str(error)}",
+                    'reason': classify_failure(error)
+                })
+
+        # 记录或清除失败台账
+        if self.failure_ledger is not None:
+            if result['status'] == 'failed':
+                self.failure_ledger.record(video, download_dir, result['reason'], result['error'])
+            else:
+                self.failure_ledger.resolve(video['video_id'])
+        return result
 
-    def download_all_videos(self, user_url: str) -> List[Dict]:
+    @traced('crawl_user')
+    @_with_session
+    def download_all_videos(self, user_url: str, ledger=None, node_id: Optional[str] = None,
+                            planner=None) -> List[Dict]:
         """下载用户所有视频
         
         Args:
             user_url: 用户主页URL
+            ledger: 共享工作台账（可选），设置后每个视频下载前先领取租约，
+                已完成或被其他节点持有的视频会被跳过
+            node_id: 领取租约使用的节点ID
+            planner: 下载规划器（可选），设置后先获取全部视频列表并探测大小，
+                按规划的顺序和方式下载，磁盘空间不足的视频会被推迟
             
         Returns:
             List[Dict]: 下载结果列表，每个字典包含:
@@ -538,61 +1023,22 @@ class DouyinDownloader:
                 - path: 保存路径 (如果成功)
         """
         try:
-            # 解析用户URL
-            user_url = self.parse_url(user_url)
-            if not user_url:
-                raise Exception("无效的用户URL")
-            
-            # 获取用户信息
-            user_info = self.get_user_info(user_url)
-            if not user_info:
-                raise Exception("获取用户信息失败")
-            
-            # 创建下载目录
-            download_dir = Path("data/downloads") / user_info['nickname']
-            download_dir.mkdir(parents=True, exist_ok=True)
+            user_info, download_dir = self.prepare_user_download(user_url)
             
             # 获取所有视频
             results = []
             has_more = True
             max_cursor = 0
+            pending = []
             
             while has_more:
                 videos, next_cursor = self.get_video_list(user_info['user_id'], max_cursor)
                 
-                for video in videos:
-                    result = {
-                        'video_id': video['video_id'],
-                        'title': video['title'] or f"video_{video['video_id']}"
-                    }
-                    
-                    # 构建保存路径
-                    save_name = f"{result['title']}_{video['video_id']}.mp4"
-                    save_name = re.sub(r'[\\/:*?"<>|]', '_', save_name)  # 替换非法字符
-                    save_path = str(download_dir / save_name)
-                    
-                    # 检查是否已下载
-                    if os.path.exists(save_path):
-                        result.update({
-                            'status': 'skipped',
-                            'error': '文件已存在',
-                            'path': save_path
-                        })
-                    else:
-                        # 下载视频
-                        logger.info(f"开始下载视频: {result['title']}")
-                        if self.download_video(video['play_url'], save_path):
-                            result.update({
-                                'status': 'success',
-                                'path': save_path
-                            })
-                        else:
-                            result.update({
-                                'status': 'failed',
-                                'error': '下载失败'
-                            })
-                    
-                    results.append(result)
+                if planner is not None:
+                    pending.extend(videos)
+                else:
+                    for video in videos:
+                        results.append(self._download_claimed(video, download_dir, user_url, ledger, node_id))
                 
                 # 检查是否还有更多视频
                 if next_cursor == 0 or next_cursor == max_cursor:
@@ -601,7 +1047,11 @@ class DouyinDownloader:
                 
                 # 添加延迟，避免请求过快
                 if has_more:
-                    time.sleep(random.uniform(1, 3))
+                    self._throttle()
+
+            if planner is not None:
+                results.extend(self._download_planned(pending, planner, user_info, download_dir, user_url,
+                                                      ledger, node_id))
             
             return results
             
@@ -609,6 +1059,62 @@ class DouyinDownloader:
             logger.exception(f"批量下载失败: {str(e)}")
             raise 
 
+    def _download_planned(self, videos: List[Dict], planner, user_info: Dict, download_dir: Path, user_url: str,
+                          ledger=None, node_id: Optional[str] = None) -> List[Dict]:
+        """按下载规划依次下载，并以 user:<用户ID> 为任务ID发布整体进度和剩余时间
+
+        只有下载成功的视频计入已完成字节数，失败或跳过的视频从待下载总量中扣除，剩余时间只按实际要传输的字节估算
+        """
+        plan = planner.prepare(videos, download_dir)
+        task_id = f"user:{user_info['user_id']}"
+        started_at = time.monotonic()
+        done_bytes = 0
+        expected_bytes = plan.total_bytes
+        progress_bus.publish(task_id, EVENT_STARTED, total=plan.total_bytes, **plan.to_dict())
+
+        results = []
+        for video in plan.videos:
+            result = self._download_claimed(video, download_dir, user_url, ledger, node_id)
+            results.append(result)
+            if video.get('on_disk'):
+                continue
+            if result['status'] == 'success':
+                done_bytes += video.get('size') or 0
+            else:
+                expected_bytes -= video.get('size') or 0
+            progress_bus.progress(task_id, done_bytes, expected_bytes, started_at)
+        for video in plan.deferred:
+            results.append({
+                'video_id': video['video_id'],
+                'title': video['title'] or f"video_{video['video_id']}",
+                'status': 'skipped',
+                'error': '磁盘空间不足，已推迟'
+            })
+        progress_bus.finish(task_id, EVENT_COMPLETED, downloaded=done_bytes, total=plan.total_bytes)
+        return results
+
+    def _download_claimed(self, video: Dict, download_dir: Path, user_url: str, ledger=None,
+                          node_id: Optional[str] = None) -> Dict:
+        """下载单个视频，设置了工作台账时先领取租约并回写结果"""
+        if ledger is None:
+            return self.download_one_video(video, download_dir)
+
+        key = f"video:{video['video_id']}"
+        if not ledger.try_acquire(key, node_id, payload={'user_url': user_url}):
+            return {
+                'video_id': video['video_id'],
+                'title': video['title'] or f"video_{video['video_id']}",
+                'status': 'skipped',
+                'error': '已完成或由其他节点处理'
+            }
+
+        result = self.download_one_video(video, download_dir)
+        if result['status'] == 'failed':
+            ledger.fail(key, node_id, result.get('error'))
+        else:
+            ledger.complete(key, node_id, result={'path': result.get('path')})
+        return result
+
     def _get_api_params(self) -> Dict[str, str]:
         """获取API请求需要的特殊参数
         
@@ -663,4 +1169,20 @@ class DouyinDownloader:
             return params
         except Exception as e:
             logger.error(f"获取API参数失败: {str(e)}")
-            return {} 
\ No newline at end of file
+            return {} 
+
+
+def create_downloader(**kwargs) -> DouyinDownloader:
+    """按配置类创建下载器，供命令行入口使用
+
+    站点地址和Cookies文件与Web服务相同，可以用 DOUYIN_BASE_URL、DOUYIN_SHORT_URL_BASE、COOKIES_FILE 环境变量覆盖
+
+    Args:
+        **kwargs: 传给 DouyinDownloader 的其他参数
+    """
+    from app.config.settings import Config
+
+    downloader = DouyinDownloader(base_url=Config.DOUYIN_BASE_URL, short_url_base=Config.DOUYIN_SHORT_URL_BASE,
+                                  **kwargs)
+    downloader.cookies_file = Path(Config.COOKIES_FILE)
+    return downloader
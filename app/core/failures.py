@@ -0,0 +1,282 @@
+"""
+下载失败台账模块
+把下载失败的视频持久化到SQLite，记录失败原因代码和尝试次数。
+视频播放地址带签名会过期，重试时只为失败的视频重新获取详情拿到新地址，不需要重新抓取整个账号。
+
+命令行用法:
+    python -m app.core.failures stats
+    python -m app.core.failures retry --limit 100 --workers 4
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from app.core.resilience import (BlockedError, CircuitOpenError, HTTPStatusError, NetworkError, RateLimitedError,
+                                 RequestError)
+from app.utils.log import add_logging_arguments, setup_cli_logging
+
+# 失败原因代码
+REASON_URL_EXPIRED = 'url_expired'  # 播放地址签名过期或失效（403/404/410）
+REASON_RATE_LIMITED = 'rate_limited'  # 被限流或目标域名已熔断
+REASON_NETWORK = 'network'  # 连接失败、超时、传输中断
+REASON_HTTP_ERROR = 'http_error'  # 其他错误状态码
+REASON_SIZE_MISMATCH = 'size_mismatch'  # 文件大小与声明不符
+REASON_NO_URL = 'no_url'  # 没有播放地址
+REASON_UNAVAILABLE = 'unavailable'  # 视频已删除或不可见，详情接口没有返回该视频
+REASON_DISK = 'disk'  # 本地写入失败
+REASON_UNKNOWN = 'unknown'
+
+# 失败记录状态
+STATUS_FAILED = 'failed'  # 等待重试
+STATUS_RESOLVED = 'resolved'  # 重试成功
+STATUS_ABANDONED = 'abandoned'  # 达到最大尝试次数
+
+
+class DownloadError(Exception):
+    """下载失败，reason 为失败原因代码"""
+
+    def __init__(self, message: str, reason: str = REASON_UNKNOWN):
+        super().__init__(message)
+        self.reason = reason
+
+
+def classify_failure(error: Optional[BaseException]) -> str:
+    """把下载过程中的异常归类为失败原因代码"""
+    # 只查看台账的命令行不需要requests，推迟到归类时导入
+    import requests
+
+    if isinstance(error, DownloadError):
+        return error.reason
+    if isinstance(error, (RateLimitedError, CircuitOpenError)):
+        return REASON_RATE_LIMITED
+    if isinstance(error, BlockedError):
+        return REASON_URL_EXPIRED
+    if isinstance(error, HTTPStatusError):
+        return REASON_URL_EXPIRED if error.status_code in (404, 410) else REASON_HTTP_ERROR
+    if isinstance(error, (NetworkError, requests.RequestException)):
+        return REASON_NETWORK
+    if isinstance(error, RequestError):
+        return REASON_HTTP_ERROR
+    if isinstance(error, OSError):
+        return REASON_DISK
+    return REASON_UNKNOWN
+
+
+def status_reason(status_code: int) -> str:
+    """下载请求返回错误状态码时的失败原因"""
+    return REASON_URL_EXPIRED if status_code in (403, 404, 410) else REASON_HTTP_ERROR
+
+
+class FailureLedger:
+    """基于SQLite的下载失败台账"""
+
+    def __init__(self, path: str = 'data/failures.db', max_attempts: int = 5):
+        """初始化失败台账
+
+        Args:
+            path: 数据库文件路径
+            max_attempts: 最大尝试次数，达到后不再自动重试
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._init_db()
+
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA busy_timeout = 30000')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        """创建数据表"""
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS failures (
+                video_id TEXT PRIMARY KEY,
+                video TEXT NOT NULL,
+                download_dir TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'failed',
+                first_failed_at REAL,
+                last_failed_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_failures_status ON failures (status, last_failed_at)')
+
+    def record(self, video: Dict, download_dir, reason: str, error: Optional[str] = None) -> int:
+        """记录一次下载失败，返回累计尝试次数，达到最大尝试次数时标记为放弃
+
+        Args:
+            video: get_video_list 返回的视频信息
+            download_dir: 下载目录
+            reason: 失败原因代码
+            error: 错误信息
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('''
+                INSERT INTO failures (video_id, video, download_dir, reason, error, attempts, status,
+                                      first_failed_at, last_failed_at)
+                VALUES (?, ?, ?, ?, ?, 1, 'failed', ?, ?)
+                ON CONFLICT (video_id) DO UPDATE SET
+                    video = excluded.video, download_dir = excluded.download_dir, reason = excluded.reason,
+                    error = excluded.error, attempts = attempts + 1, status = 'failed',
+                    last_failed_at = excluded.last_failed_at
+            ''', (video['video_id'], json.dumps(video, ensure_ascii=False), str(download_dir), reason, error,
+                  now, now))
+            attempts = conn.execute('SELECT attempts FROM failures WHERE video_id = ?',
+                                    (video['video_id'],)).fetchone()['attempts']
+            if attempts >= self.max_attempts:
+                conn.execute("UPDATE failures SET status = 'abandoned' WHERE video_id = ?", (video['video_id'],))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return attempts
+
+    def resolve(self, video_id: str) -> bool:
+        """标记失败记录已解决，没有记录时返回False"""
+        cursor = self._conn().execute(
+            "UPDATE failures SET status = 'resolved' WHERE video_id = ? AND status != 'resolved'", (video_id,))
+        return cursor.rowcount == 1
+
+    def pending(self, limit: int = 100, reasons: Optional[Iterable[str]] = None) -> List[Dict]:
+        """待重试的失败记录，尝试次数少、失败时间早的排在前面
+
+        Args:
+            limit: 最多返回条数
+            reasons: 只返回这些原因代码的记录
+        """
+        sql = "SELECT * FROM failures WHERE status = 'failed'"
+        params = []
+        if reasons:
+            reasons = list(reasons)
+            sql += f" AND reason IN ({','.join('?' * len(reasons))})"
+            params.extend(reasons)
+        sql += ' ORDER BY attempts, last_failed_at LIMIT ?'
+        rows = self._conn().execute(sql, (*params, limit)).fetchall()
+        return [self._to_item(row) for row in rows]
+
+    def get(self, video_id: str) -> Optional[Dict]:
+        """获取单条失败记录"""
+        row = self._conn().execute('SELECT * FROM failures WHERE video_id = ?', (video_id,)).fetchone()
+        return self._to_item(row) if row else None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """按状态和原因统计记录数"""
+        rows = self._conn().execute(
+            'SELECT status, reason, COUNT(*) AS count FROM failures GROUP BY status, reason').fetchall()
+        result: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            result.setdefault(row['status'], {})[row['reason']] = row['count']
+        return result
+
+    def retry(self, downloader, limit: int = 100, workers: int = 4,
+              reasons: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """批量重试失败的视频：先重新获取视频详情拿到新的播放地址，再下载
+
+        Args:
+            downloader: 下载器实例
+            limit: 本批最多重试条数
+            workers: 并发数
+            reasons: 只重试这些原因代码的记录
+
+        Returns:
+            Dict[str, int]: 本批 success/failed/unavailable 数量
+        """
+        items = self.pending(limit, reasons)
+        summary = {'success': 0, 'failed': 0, 'unavailable': 0}
+        if not items:
+            return summary
+        session_pool = getattr(downloader, 'session_pool', None)
+        if session_pool is not None:
+            session_pool.ensure_size(workers)
+
+        def retry_one(item: Dict) -> str:
+            video = item['video']
+            try:
+                fresh = downloader.get_video_detail(item['video_id'])
+            except Exception as e:
+                self.record(video, item['download_dir'], classify_failure(e), str(e))
+                return 'failed'
+            if not fresh or not fresh.get('play_url'):
+                self.record(video, item['download_dir'], REASON_UNAVAILABLE, '视频详情不可用')
+                return 'unavailable'
+            # 沿用原标题，保持文件名不变
+            fresh['title'] = video.get('title') or fresh.get('title')
+            result = downloader.download_one_video(fresh, Path(item['download_dir']))
+            # 下载器设置了失败台账时已自动记录，这里只处理未设置的情况
+            if getattr(downloader, 'failure_ledger', None) is not self:
+                if result['status'] == 'failed':
+                    self.record(fresh, item['download_dir'], result.get('reason', REASON_UNKNOWN),
+                                result.get('error'))
+                else:
+                    self.resolve(item['video_id'])
+            return 'failed' if result['status'] == 'failed' else 'success'
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='retry') as executor:
+            for outcome in executor.map(retry_one, items):
+                summary[outcome] += 1
+        logger.info(f"失败重试完成: {summary}")
+        return summary
+
+    def close(self):
+        """关闭当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _to_item(row: sqlite3.Row) -> Dict:
+        """数据库行转换为字典"""
+        item = dict(row)
+        item['video'] = json.loads(item['video'])
+        return item
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='下载失败台账')
+    parser.add_argument('--db', default='data/failures.db', help='失败台账数据库路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='按状态和原因统计失败记录')
+    retry_parser = subparsers.add_parser('retry', help='重新获取播放地址并重试失败的视频')
+    retry_parser.add_argument('--limit', type=int, default=100, help='本批最多重试条数')
+    retry_parser.add_argument('--workers', type=int, default=4, help='并发数')
+    retry_parser.add_argument('--reason', action='append', help='只重试指定原因代码，可重复')
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    setup_cli_logging(args)
+
+    ledger = FailureLedger(args.db)
+    if args.command == 'stats':
+        print(json.dumps(ledger.stats(), ensure_ascii=False, indent=2))
+        return
+
+    from app.core.downloader import create_downloader
+    downloader = create_downloader(session_pool_size=args.workers, failure_ledger=ledger)
+    summary = ledger.retry(downloader, limit=args.limit, workers=args.workers, reasons=args.reason)
+    print(json.dumps({'retry': summary, 'stats': ledger.stats()}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+"""
+共享工作台账模块
+多个抓取节点（或同一台机器上的多个进程）通过台账领取用户和视频的租约，租约带心跳和过期时间，
+节点崩溃后租约过期，其他节点可以接手未完成的工作，已完成的工作不会被重复下载。
+默认实现基于SQLite，数据库文件放在共享卷上即可在多台机器间使用（需要共享卷支持文件锁）。
+"""
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from loguru import logger
+
+# 工作项状态
+STATUS_PENDING = 'pending'
+STATUS_LEASED = 'leased'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# 工作项类型
+KIND_CREATOR = 'creator'
+KIND_VIDEO = 'video'
+
+
+class BaseLedger(ABC):
+    """工作台账接口，其他存储后端实现这些方法即可替换SQLite"""
+
+    @abstractmethod
+    def add(self, keys: Iterable[str], kind: str = KIND_CREATOR, payloads: Optional[Dict[str, Dict]] = None) -> int:
+        """登记工作项，已存在的工作项保持不变，返回新增数量"""
+
+    @abstractmethod
+    def acquire(self, owner: str, kind: str = KIND_CREATOR, limit: int = 1) -> List[Dict]:
+        """领取最多 limit 个待处理或租约已过期的工作项"""
+
+    @abstractmethod
+    def try_acquire(self, key: str, owner: str, kind: str = KIND_VIDEO, payload: Optional[Dict] = None) -> bool:
+        """领取指定工作项（不存在时先登记），已完成或被其他节点持有时返回False"""
+
+    @abstractmethod
+    def heartbeat(self, owner: str, keys: Iterable[str]) -> int:
+        """续期租约，返回成功续期的数量"""
+
+    @abstractmethod
+    def complete(self, key: str, owner: str, result: Optional[Dict] = None) -> bool:
+        """标记工作项完成"""
+
+    @abstractmethod
+    def fail(self, key: str, owner: str, error: str) -> bool:
+        """标记工作项失败，未达到最大尝试次数时放回待处理"""
+
+    @abstractmethod
+    def release(self, key: str, owner: str) -> bool:
+        """主动释放租约，工作项放回待处理"""
+
+    @abstractmethod
+    def stats(self, kind: Optional[str] = None) -> Dict[str, int]:
+        """各状态的工作项数量"""
+
+
+class SQLiteLedger(BaseLedger):
+    """基于SQLite的工作台账"""
+
+    def __init__(self, path: str = 'data/ledger.db', lease_seconds: float = 60, max_attempts: int = 3,
+                 heartbeat_interval: Optional[float] = None):
+        """初始化台账
+
+        Args:
+            path: 数据库文件路径
+            lease_seconds: 租约时长（秒），超过该时间未续期的租约可被其他节点接手
+            max_attempts: 单个工作项的最大尝试次数
+            heartbeat_interval: 后台心跳间隔（秒），默认为租约时长的三分之一
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.heartbeat_interval = heartbeat_interval or lease_seconds / 3
+
+        self._local = threading.local()
+        # 本实例持有的租约 {key: owner}，由后台心跳线程统一续期
+        self._held: Dict[str, str] = {}
+        self._held_lock = threading.Lock()
+        self._heartbeat_thread = None
+        self._stop = threading.Event()
+
+        self._init_db()
+
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA busy_timeout = 30000')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        """创建数据表"""
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS work_items (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                result TEXT,
+                updated_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_work_items_kind_status ON work_items (kind, status, lease_expires)')
+
+    def add(self, keys: Iterable[str], kind: str = KIND_CREATOR, payloads: Optional[Dict[str, Dict]] = None) -> int:
+        payloads = payloads or {}
+        now = time.time()
+        rows = [(key, kind, json.dumps(payloads.get(key), ensure_ascii=False), now) for key in keys]
+        conn = self._conn()
+        before = conn.total_changes
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT OR IGNORE INTO work_items (key, kind, payload, updated_at) VALUES (?, ?, ?, ?)', rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return conn.total_changes - before
+
+    def acquire(self, owner: str, kind: str = KIND_CREATOR, limit: int = 1) -> List[Dict]:
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('''
+                SELECT * FROM work_items
+                WHERE kind = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                ORDER BY attempts, updated_at
+                LIMIT ?
+            ''', (kind, now, limit)).fetchall()
+            for row in rows:
+                if row['status'] == STATUS_LEASED:
+                    logger.warning(f"接手过期租约: {row['key']} (原节点 {row['owner']})")
+                conn.execute('''
+                    UPDATE work_items SET status = 'leased', owner = ?, lease_expires = ?,
+                        attempts = attempts + 1, updated_at = ?
+                    WHERE key = ?
+                ''', (owner, now + self.lease_seconds, now, row['key']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        items = [self._to_item(row, owner) for row in rows]
+        self._hold([item['key'] for item in items], owner)
+        return items
+
+    def try_acquire(self, key: str, owner: str, kind: str = KIND_VIDEO, payload: Optional[Dict] = None) -> bool:
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT OR IGNORE INTO work_items (key, kind, payload, updated_at) VALUES (?, ?, ?, ?)',
+                         (key, kind, json.dumps(payload, ensure_ascii=False), now))
+            cursor = conn.execute('''
+                UPDATE work_items SET status = 'leased', owner = ?, lease_expires = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE key = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+            ''', (owner, now + self.lease_seconds, now, key, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        acquired = cursor.rowcount == 1
+        if acquired:
+            self._hold([key], owner)
+        return acquired
+
+    def heartbeat(self, owner: str, keys: Iterable[str]) -> int:
+        keys = list(keys)
+        if not keys:
+            return 0
+        now = time.time()
+        conn = self._conn()
+        placeholders = ','.join('?' * len(keys))
+        cursor = conn.execute(f'''
+            UPDATE work_items SET lease_expires = ?, updated_at = ?
+            WHERE owner = ? AND status = 'leased' AND key IN ({placeholders})
+        ''', (now + self.lease_seconds, now, owner, *keys))
+        return cursor.rowcount
+
+    def complete(self, key: str, owner: str, result: Optional[Dict] = None) -> bool:
+        return self._finish(key, owner, STATUS_DONE, result=result)
+
+    def fail(self, key: str, owner: str, error: str) -> bool:
+        return self._finish(key, owner, STATUS_FAILED, error=error)
+
+    def release(self, key: str, owner: str) -> bool:
+        return self._finish(key, owner, STATUS_PENDING)
+
+    def stats(self, kind: Optional[str] = None) -> Dict[str, int]:
+        now = time.time()
+        sql = '''
+            SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'expired' ELSE status END AS state,
+                   COUNT(*) AS count
+            FROM work_items
+        '''
+        params = [now]
+        if kind:
+            sql += ' WHERE kind = ?'
+            params.append(kind)
+        sql += ' GROUP BY state'
+        return {row['state']: row['count'] for row in self._conn().execute(sql, params)}
+
+    def close(self):
+        """停止心跳线程并关闭当前线程的连接"""
+        self._stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join(timeout=self.heartbeat_interval + 1)
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _finish(self, key: str, owner: str, status: str, error: Optional[str] = None,
+                result: Optional[Dict] = None) -> bool:
+        """结束租约，只有当前持有者可以操作"""
+        self._unhold(key)
+        now = time.time()
+        if status == STATUS_FAILED:
+            # 未达到最大尝试次数时放回待处理，等待重试
+            sql = '''
+                UPDATE work_items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    owner = NULL, lease_expires = NULL, error = ?, updated_at = ?
+                WHERE key = ? AND owner = ? AND status = 'leased'
+            '''
+            params = (self.max_attempts, error, now, key, owner)
+        else:
+            sql = '''
+                UPDATE work_items SET status = ?, owner = NULL, lease_expires = NULL,
+                    result = COALESCE(?, result), updated_at = ?
+                WHERE key = ? AND owner = ? AND status = 'leased'
+            '''
+            params = (status, json.dumps(result, ensure_ascii=False) if result is not None else None, now, key, owner)
+        cursor = self._conn().execute(sql, params)
+        if cursor.rowcount != 1:
+            logger.warning(f"租约已失效，无法更新工作项: {key}")
+            return False
+        return True
+
+    def _to_item(self, row: sqlite3.Row, owner: str) -> Dict:
+        """把数据行转换为工作项字典"""
+        return {
+            'key': row['key'],
+            'kind': row['kind'],
+            'payload': json.loads(row['payload']) if row['payload'] else None,
+            'attempts': row['attempts'] + 1,
+            'owner': owner
+        }
+
+    def _hold(self, keys: List[str], owner: str):
+        """登记本实例持有的租约并确保心跳线程运行"""
+        if not keys:
+            return
+        with self._held_lock:
+            for key in keys:
+                self._held[key] = owner
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='ledger-heartbeat',
+                                                          daemon=True)
+                self._heartbeat_thread.start()
+
+    def _unhold(self, key: str):
+        with self._held_lock:
+            self._held.pop(key, None)
+
+    def _heartbeat_loop(self):
+        """定期续期本实例持有的所有租约"""
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._held_lock:
+                by_owner: Dict[str, List[str]] = {}
+                for key, owner in self._held.items():
+                    by_owner.setdefault(owner, []).append(key)
+            for owner, keys in by_owner.items():
+                try:
+                    renewed = self.heartbeat(owner, keys)
+                    if renewed < len(keys):
+                        logger.warning(f"部分租约续期失败: {len(keys) - renewed}/{len(keys)}")
+                except Exception as e:
+                    logger.error(f"租约心跳失败: {str(e)}")
+
+
+class LedgerWorker:
+    """按台账领取用户并下载的工作节点"""
+
+    def __init__(self, ledger: BaseLedger, downloader, node_id: str, poll_interval: float = 5.0):
+        """初始化工作节点
+
+        Args:
+            ledger: 共享台账
+            downloader: 下载器实例
+            node_id: 节点ID，各节点需唯一（如 主机名-进程号）
+            poll_interval: 其他节点仍持有租约时的轮询间隔（秒）
+        """
+        self.ledger = ledger
+        self.downloader = downloader
+        self.node_id = node_id
+        self.poll_interval = poll_interval
+
+    def add_creators(self, user_urls: Iterable[str]) -> int:
+        """登记用户主页URL，返回新增数量"""
+        user_urls = list(user_urls)
+        keys = [f"{KIND_CREATOR}:{url}" for url in user_urls]
+        payloads = {key: {'user_url': url} for key, url in zip(keys, user_urls)}
+        return self.ledger.add(keys, KIND_CREATOR, payloads)
+
+    def run(self, max_creators: Optional[int] = None, wait_for_others: bool = True) -> List[Dict]:
+        """循环领取用户并下载，直到台账中没有可处理的用户
+
+        Args:
+            max_creators: 最多处理的用户数
+            wait_for_others: 其他节点仍持有租约时是否等待，以便在其崩溃后接手
+
+        Returns:
+            List[Dict]: 本节点处理的用户及下载结果
+        """
+        processed = []
+        while max_creators is None or len(processed) < max_creators:
+            items = self.ledger.acquire(self.node_id, KIND_CREATOR, limit=1)
+            if not items:
+                stats = self.ledger.stats(KIND_CREATOR)
+                if wait_for_others and (stats.get(STATUS_LEASED) or stats.get('expired')):
+                    time.sleep(self.poll_interval)
+                    continue
+                break
+
+            item = items[0]
+            user_url = item['payload']['user_url']
+            try:
+                results = self.downloader.download_all_videos(user_url, ledger=self.ledger, node_id=self.node_id)
+                summary = {status: sum(1 for r in results if r['status'] == status)
+                           for status in ('success', 'failed', 'skipped')}
+                self.ledger.complete(item['key'], self.node_id, result=summary)
+                processed.append({'user_url': user_url, 'results': results})
+            except Exception as e:
+                logger.error(f"用户下载失败 {user_url}: {str(e)}")
+                self.ledger.fail(item['key'], self.node_id, str(e))
+                processed.append({'user_url': user_url, 'error': str(e)})
+        return processed
@@ -0,0 +1,148 @@
+"""
+视频元数据探测模块
+只通过Range请求读取MP4文件开头（moov在文件末尾时再读取末尾）的少量字节，
+解析出时长、分辨率和码率，无需下载整个视频即可为大量视频补全元数据。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.core.planner import CONTENT_RANGE_RE
+from app.core.resilience import HTTPStatusError
+from app.utils.mp4 import BOX_HEADER_MAX, MP4FormatError, parse_moov, read_box_header
+
+
+class MetadataProbe:
+    """基于Range请求的MP4元数据探测器"""
+
+    # 探测请求头，Range由每次请求单独设置
+    PROBE_HEADERS = {
+        'Accept': '*/*',
+        'Accept-Encoding': 'identity',
+        'Referer': 'https://www.douyin.com/'
+    }
+
+    def __init__(self, downloader, workers: int = 8, head_bytes: int = 64 * 1024,
+                 max_moov_bytes: int = 8 * 1024 * 1024, max_requests: int = 8):
+        """初始化探测器
+
+        Args:
+            downloader: 下载器实例，探测请求复用其会话、重试策略和熔断器
+            workers: 并发探测数
+            head_bytes: 每次读取的字节数，通常足以包含文件开头的 ftyp 和 moov
+            max_moov_bytes: moov 超过该大小时放弃解析
+            max_requests: 单个视频最多发出的请求数
+        """
+        self.downloader = downloader
+        self.workers = workers
+        self.head_bytes = head_bytes
+        self.max_moov_bytes = max_moov_bytes
+        self.max_requests = max_requests
+
+    def probe(self, url: str) -> Optional[Dict]:
+        """探测单个视频的元数据
+
+        沿顶层box逐个跳过（mdat只读取头部），直到找到moov，moov不在已读取的范围内时再按需读取
+
+        Returns:
+            Optional[Dict]: duration（秒）、width、height、rotation、size（字节）、bitrate（比特/秒），
+                找不到moov时返回None
+
+        Raises:
+            RequestError: 请求失败
+            MP4FormatError: 文件结构无法解析
+        """
+        window, total = self._fetch(url, 0, self.head_bytes - 1, None)
+        requests_made = 1
+        window_start = 0
+        offset = 0
+        while total is None or offset < total:
+            local = offset - window_start
+            header = read_box_header(window, local)
+            needs_fetch = header is None
+            if header is not None:
+                box_type, header_size, size = header
+                if size == -1:
+                    # 大小为0的box延伸到文件末尾，后面不会再有moov
+                    if box_type != b'moov' or total is None:
+                        return None
+                    size = total - offset
+                if box_type == b'moov':
+                    if size > self.max_moov_bytes:
+                        raise MP4FormatError(f"moov过大: {size}")
+                    needs_fetch = local + size > len(window)
+                    if not needs_fetch:
+                        return self._describe(parse_moov(window, local + header_size, local + size), total)
+                else:
+                    offset += size
+                    continue
+
+            if requests_made >= self.max_requests:
+                logger.warning(f"读取MP4头部的请求次数超过上限: {url}")
+                return None
+            # moov 不完整时读取整个moov，否则读取下一个box开始的一段
+            length = size if header is not None else self.head_bytes
+            window, total = self._fetch(url, offset, offset + max(length, BOX_HEADER_MAX) - 1, total)
+            requests_made += 1
+            window_start = offset
+            if len(window) < 8:
+                return None
+        return None
+
+    def enrich(self, videos: List[Dict]) -> List[Dict]:
+        """并发探测视频元数据并写入视频字典
+
+        补全 duration（原值为空或0时，单位秒）、width、height、bitrate 字段，探测失败的视频保持原样
+        """
+        targets = [v for v in videos if v.get('play_url') and not v.get('width')]
+        if not targets:
+            return videos
+
+        def probe_one(video: Dict) -> Optional[Dict]:
+            try:
+                return self.probe(video['play_url'])
+            except Exception as e:
+                logger.warning(f"探测视频元数据失败 {video.get('video_id')}: {str(e)}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='metadata') as executor:
+            for video, meta in zip(targets, executor.map(probe_one, targets)):
+                if not meta:
+                    continue
+                if not video.get('duration') and meta.get('duration'):
+                    video['duration'] = int(round(meta['duration']))
+                for key in ('width', 'height', 'bitrate'):
+                    if meta.get(key) is not None:
+                        video[key] = meta[key]
+        return videos
+
+    def _fetch(self, url: str, start: int, end: int, total: Optional[int]) -> Tuple[bytes, Optional[int]]:
+        """读取 [start, end] 字节范围，返回 (数据, 文件总大小)"""
+        if total is not None:
+            end = min(end, total - 1)
+        headers = dict(self.PROBE_HEADERS, Range=f'bytes={start}-{end}')
+        response = self.downloader._make_request('GET', url, stream=True, headers=headers)
+        with response:
+            if response.status_code == 206:
+                match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+                return response.content, int(match.group(1)) if match else total
+            if response.status_code == 200 and start == 0:
+                # 服务器忽略了Range，只读取需要的部分后断开
+                data = bytearray()
+                for chunk in response.iter_content(64 * 1024):
+                    data.extend(chunk)
+                    if len(data) > end:
+                        break
+                length = response.headers.get('Content-Length')
+                return bytes(data[:end + 1]), int(length) if length and length.isdigit() else total
+            raise HTTPStatusError(f"读取MP4头部失败: {response.status_code}", url=url,
+                                  status_code=response.status_code)
+
+    @staticmethod
+    def _describe(meta: Dict, total: Optional[int]) -> Dict:
+        """补充文件大小和平均码率"""
+        meta['size'] = total
+        duration = meta.get('duration')
+        meta['bitrate'] = int(total * 8 / duration) if total and duration else None
+        return meta
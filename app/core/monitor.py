@@ -0,0 +1,316 @@
+"""
+用户监控模块
+长时间运行，按每个用户的发布频率自适应调整轮询间隔：活跃用户缩短间隔，长期不更新的用户逐步退避。
+调度使用按下次到期时间排序的优先队列，发现的新视频直接交给下载流程。
+
+命令行用法（Ctrl+C 结束）:
+    python -m app.core.monitor MS4wLjABAAAAxxx MS4wLjABAAAAyyy --min-interval 300 --rate 5
+"""
+import argparse
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+from app.core.downloader import DouyinDownloader, create_downloader
+from app.utils.bandwidth import PRIORITY_INCREMENTAL
+from app.utils.log import add_logging_arguments, setup_cli_logging
+from app.utils.rate_limiter import RateLimiter
+
+
+class CreatorSchedule:
+    """单个用户的轮询状态"""
+
+    def __init__(self, user_id: str, interval: float, download_dir: Optional[Path] = None):
+        self.user_id = user_id
+        self.interval = interval
+        # 为空时在首次下载前按用户昵称解析
+        self.download_dir = download_dir
+        self.next_due = 0.0
+        self.baseline_done = False
+        self.latest_create_time = 0
+        self.avg_post_gap = None  # 发布间隔的指数移动平均（秒）
+        self.polls = 0
+        self.new_videos = 0
+        self.failures = 0
+        self.seen_ids = set()
+        self._seen_order = deque()
+
+    def remember(self, video_ids: List[str], limit: int = 200):
+        """记录已见过的视频ID，最多保留 limit 个"""
+        for video_id in video_ids:
+            if video_id in self.seen_ids:
+                continue
+            self.seen_ids.add(video_id)
+            self._seen_order.append(video_id)
+            if len(self._seen_order) > limit:
+                self.seen_ids.discard(self._seen_order.popleft())
+
+    def to_dict(self) -> Dict:
+        """导出轮询状态"""
+        return {
+            'user_id': self.user_id,
+            'interval': round(self.interval, 1),
+            'next_due_in': round(max(self.next_due - time.monotonic(), 0), 1),
+            'avg_post_gap': round(self.avg_post_gap, 1) if self.avg_post_gap else None,
+            'polls': self.polls,
+            'new_videos': self.new_videos,
+            'failures': self.failures
+        }
+
+
+class CreatorMonitor:
+    """自适应轮询的用户监控器"""
+
+    def __init__(self, downloader: DouyinDownloader, min_interval: float = 300, max_interval: float = 86400,
+                 initial_interval: float = 1800, backoff: float = 1.5, gap_fraction: float = 0.25,
+                 max_workers: int = 4, download_workers: int = 4, rate_limiter: Optional[RateLimiter] = None,
+                 on_new_videos: Optional[Callable[[CreatorSchedule, List[Dict]], None]] = None,
+                 download_existing: bool = False, max_pages: int = 5):
+        """初始化监控器
+
+        Args:
+            downloader: 共享的下载器实例
+            min_interval: 最短轮询间隔（秒）
+            max_interval: 最长轮询间隔（秒）
+            initial_interval: 新加入用户的初始轮询间隔（秒）
+            backoff: 没有新视频时间隔的放大倍数
+            gap_fraction: 轮询间隔取平均发布间隔的比例
+            max_workers: 同时轮询的用户数
+            download_workers: 下载新视频的线程数
+            rate_limiter: 共享限速器
+            on_new_videos: 发现新视频时的回调，默认直接下载
+            download_existing: 首次轮询时是否下载已有视频，默认只记录为基线
+            max_pages: 单次轮询最多翻页数（短时间内发布大量视频时继续翻页）
+        """
+        self.downloader = downloader
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = initial_interval
+        self.backoff = backoff
+        self.gap_fraction = gap_fraction
+        self.max_workers = max_workers
+        self.download_workers = download_workers
+        self.on_new_videos = on_new_videos or self._download_new_videos
+        self.download_existing = download_existing
+        self.max_pages = max_pages
+        if rate_limiter is not None:
+            self.downloader.rate_limiter = rate_limiter
+        # 轮询线程和下载线程都需要独占一个会话
+        session_pool = getattr(self.downloader, 'session_pool', None)
+        if session_pool is not None:
+            session_pool.ensure_size(max_workers + download_workers)
+
+        self.creators: Dict[str, CreatorSchedule] = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._download_pool = None
+
+    def add_creator(self, user_id: str, download_dir: Optional[Path] = None, due_in: Optional[float] = None):
+        """加入监控用户
+
+        Args:
+            user_id: 用户 sec_user_id
+            download_dir: 新视频保存目录，默认与批量下载相同，为下载器的 download_root/<昵称>
+            due_in: 首次轮询延迟（秒），默认在初始间隔内随机分散
+        """
+        with self._cond:
+            if user_id in self.creators:
+                return
+            creator = CreatorSchedule(user_id, self.initial_interval, download_dir)
+            self.creators[user_id] = creator
+            delay = random.uniform(0, min(self.initial_interval, 60)) if due_in is None else due_in
+            self._push(creator, time.monotonic() + delay)
+
+    def remove_creator(self, user_id: str):
+        """移除监控用户，已在队列中的条目会在到期时被忽略"""
+        with self._cond:
+            self.creators.pop(user_id, None)
+
+    def run(self, max_polls: Optional[int] = None):
+        """运行监控循环，直到调用 stop() 或达到 max_polls 次轮询
+
+        Args:
+            max_polls: 最多轮询次数，用于测试和一次性运行
+        """
+        self._stop.clear()
+        slots = threading.Semaphore(self.max_workers)
+        polls = 0
+        self._download_pool = ThreadPoolExecutor(max_workers=self.download_workers, thread_name_prefix='monitor-dl')
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='monitor') as executor:
+            while not self._stop.is_set() and (max_polls is None or polls < max_polls):
+                creator = self._next_due()
+                if creator is None:
+                    continue
+                slots.acquire()
+                polls += 1
+                executor.submit(self._poll_and_reschedule, creator, slots)
+        self._download_pool.shutdown(wait=True)
+        self._download_pool = None
+
+    def stop(self):
+        """停止监控循环"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def schedule(self) -> List[Dict]:
+        """按下次到期时间返回所有用户的轮询状态"""
+        with self._cond:
+            creators = sorted(self.creators.values(), key=lambda c: c.next_due)
+            return [creator.to_dict() for creator in creators]
+
+    def poll(self, creator: CreatorSchedule) -> List[Dict]:
+        """轮询一个用户，返回新发现的视频（按发布时间从新到旧）"""
+        new_videos = []
+        cursor = 0
+        for _ in range(self.max_pages):
+            videos, next_cursor = self.downloader.get_video_list(creator.user_id, cursor)
+            fresh = [v for v in videos if v['video_id'] not in creator.seen_ids
+                     and (v.get('create_time') or 0) >= creator.latest_create_time]
+            new_videos.extend(fresh)
+            # 整页都是新视频时继续翻页，否则说明已经接上上次看到的位置
+            if not creator.baseline_done or len(fresh) < len(videos) or not videos:
+                break
+            if next_cursor == 0 or next_cursor == cursor:
+                break
+            cursor = next_cursor
+
+        creator.polls += 1
+        creator.remember([v['video_id'] for v in new_videos])
+        self._update_post_gap(creator, new_videos)
+
+        if not creator.baseline_done:
+            creator.baseline_done = True
+            if not self.download_existing:
+                return []
+        creator.new_videos += len(new_videos)
+        return new_videos
+
+    def next_interval(self, creator: CreatorSchedule, found_new: bool) -> float:
+        """根据轮询结果计算下次轮询间隔"""
+        if found_new:
+            interval = creator.interval / 2
+            if creator.avg_post_gap:
+                interval = min(interval, creator.avg_post_gap * self.gap_fraction)
+        else:
+            interval = creator.interval * self.backoff
+            # 距最近一次发布越久越不可能马上更新
+            if creator.latest_create_time:
+                idle = time.time() - creator.latest_create_time
+                interval = max(interval, idle * self.gap_fraction)
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _poll_and_reschedule(self, creator: CreatorSchedule, slots: threading.Semaphore):
+        """在工作线程中轮询用户并重新排期"""
+        try:
+            # 先确定下载目录再轮询，解析失败按轮询失败退避，不会丢掉这次发现的新视频
+            if creator.download_dir is None and self.on_new_videos == self._download_new_videos:
+                self._resolve_download_dir(creator)
+            new_videos = self.poll(creator)
+            creator.failures = 0
+            if new_videos:
+                logger.info(f"发现新视频: {creator.user_id} {len(new_videos)} 个")
+                self.on_new_videos(creator, new_videos)
+            creator.interval = self.next_interval(creator, bool(new_videos))
+        except Exception as e:
+            creator.failures += 1
+            creator.interval = min(creator.interval * self.backoff, self.max_interval)
+            logger.error(f"轮询用户失败 {creator.user_id}: {str(e)}")
+        finally:
+            slots.release()
+            # 加入少量抖动，避免大量用户在同一时刻到期
+            delay = creator.interval * random.uniform(0.9, 1.1)
+            with self._cond:
+                if creator.user_id in self.creators:
+                    self._push(creator, time.monotonic() + delay)
+
+    def _update_post_gap(self, creator: CreatorSchedule, videos: List[Dict]):
+        """根据新视频的发布时间更新平均发布间隔"""
+        times = sorted({v.get('create_time') for v in videos if v.get('create_time')})
+        if creator.latest_create_time:
+            times = [t for t in times if t > creator.latest_create_time]
+            times.insert(0, creator.latest_create_time)
+        for prev, cur in zip(times, times[1:]):
+            gap = cur - prev
+            creator.avg_post_gap = gap if creator.avg_post_gap is None else 0.7 * creator.avg_post_gap + 0.3 * gap
+        if times:
+            creator.latest_create_time = max(creator.latest_create_time, times[-1])
+
+    def _resolve_download_dir(self, creator: CreatorSchedule):
+        """按用户昵称解析并创建下载目录，与批量下载使用同一目录"""
+        user_url = f"{self.downloader.base_url}/user/{creator.user_id}"
+        _, creator.download_dir = self.downloader.prepare_user_download(user_url)
+
+    def _download_new_videos(self, creator: CreatorSchedule, videos: List[Dict]):
+        """默认的新视频处理：按增量优先级提交到下载线程池"""
+        if creator.download_dir is None:
+            self._resolve_download_dir(creator)
+        creator.download_dir.mkdir(parents=True, exist_ok=True)
+        for video in videos:
+            if self._download_pool is not None:
+                self._download_pool.submit(self.downloader.download_one_video, video, creator.download_dir,
+                                           priority=PRIORITY_INCREMENTAL)
+            else:
+                self.downloader.download_one_video(video, creator.download_dir, priority=PRIORITY_INCREMENTAL)
+
+    def _push(self, creator: CreatorSchedule, due: float):
+        """把用户放入优先队列，调用方需持有锁"""
+        creator.next_due = due
+        heapq.heappush(self._heap, (due, next(self._seq), creator.user_id))
+        self._cond.notify()
+
+    def _next_due(self) -> Optional[CreatorSchedule]:
+        """等待并取出下一个到期的用户，被唤醒但没有到期用户时返回None"""
+        with self._cond:
+            if not self._heap:
+                self._cond.wait(1.0)
+                return None
+            due, _, user_id = self._heap[0]
+            wait = due - time.monotonic()
+            if wait > 0:
+                self._cond.wait(min(wait, 1.0))
+                return None
+            heapq.heappop(self._heap)
+            creator = self.creators.get(user_id)
+            # 已移除或重复排期的条目直接丢弃
+            if creator is None or creator.next_due != due:
+                return None
+            return creator
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='监控用户新作品')
+    parser.add_argument('sec_user_ids', nargs='+', help='用户 sec_user_id')
+    parser.add_argument('--min-interval', type=float, default=300, help='最短轮询间隔（秒）')
+    parser.add_argument('--max-interval', type=float, default=86400, help='最长轮询间隔（秒）')
+    parser.add_argument('--rate', type=float, default=5, help='上游请求速率（次/秒）')
+    parser.add_argument('--download-existing', action='store_true', help='首次轮询时同时下载已有视频')
+    parser.add_argument('--download-root', default='data/downloads', help='下载根目录')
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    setup_cli_logging(args)
+
+    monitor = CreatorMonitor(create_downloader(download_root=args.download_root), min_interval=args.min_interval,
+                             max_interval=args.max_interval, rate_limiter=RateLimiter(rate=args.rate),
+                             download_existing=args.download_existing)
+    for sec_user_id in args.sec_user_ids:
+        monitor.add_creator(sec_user_id)
+    try:
+        monitor.run()
+    except KeyboardInterrupt:
+        monitor.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,18 @@
 负责处理和验证抖音用户主页URL，支持长短链接的解析
 """
 import re
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, Optional, Tuple
 import requests
 from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from app.utils.cache import TTLCache
+
+# 预编译的链接正则
+USER_URL_RE = re.compile(r'https?://(?:www\.)?douyin\.com/user/([^/?]+)')
+SHORT_URL_RE = re.compile(r'https?://v\.douyin\.com/([^/?]+)')
+TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
 
 
 class URLParser:
@@ -13,16 +22,53 @@ class URLParser:
     
     # 抖音URL正则表达式
     DOUYIN_URL_PATTERNS = [
-        r'https?://(?:www\.)?douyin\.com/user/([^/?]+)',  # 标准用户主页
-        r'https?://v\.douyin\.com/([^/?]+)',              # 短链接
+        USER_URL_RE.pattern,   # 标准用户主页
+        SHORT_URL_RE.pattern,  # 短链接
     ]
 
-    def __init__(self):
-        """初始化解析器"""
+    # 用户验证只读取页面开头的字节数
+    PROBE_BYTES = 16 * 1024
+
+    # 页面返回200时表示用户不存在的特征文本
+    USER_NOT_FOUND_MARKERS = ('用户不存在', '该账号已注销', '账号已被封禁', '该用户暂时无法访问')
+
+    # 用户验证结果缓存时间（秒）
+    VALIDATION_POSITIVE_TTL = 600
+    VALIDATION_NEGATIVE_TTL = 60
+
+    # 默认站点地址和短链接地址前缀
+    BASE_URL = 'https://www.douyin.com'
+    SHORT_URL_BASE = 'https://v.douyin.com'
+
+    def __init__(self, max_workers: int = 16, cache_ttl: float = 3600, base_url: Optional[str] = None,
+                 short_url_base: Optional[str] = None):
+        """初始化解析器
+
+        Args:
+            max_workers: 批量解析时并发展开短链接的线程数，同时决定连接池大小
+            cache_ttl: 短链接展开结果的缓存时间（秒）
+            base_url: 站点地址，指向本地替身服务器时标准主页URL也改用该地址
+            short_url_base: 短链接地址前缀
+        """
+        self.max_workers = max_workers
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        self.short_url_base = (short_url_base or self.SHORT_URL_BASE).rstrip('/')
+        # 除抖音链接外，同时识别配置的站点地址和短链接地址
+        self.user_url_res = [USER_URL_RE]
+        self.short_url_res = [SHORT_URL_RE]
+        if self.base_url != self.BASE_URL:
+            self.user_url_res.insert(0, re.compile(re.escape(self.base_url) + r'/user/([^/?]+)'))
+        if self.short_url_base != self.SHORT_URL_BASE:
+            self.short_url_res.insert(0, re.compile(re.escape(self.short_url_base) + r'/([^/?]+)'))
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         })
+        self._short_url_cache = TTLCache(ttl=cache_ttl, max_size=100000)
+        self._validation_cache = TTLCache(ttl=self.VALIDATION_POSITIVE_TTL, max_size=100000)
 
     def parse_url(self, url: str) -> Optional[str]:
         """
@@ -35,42 +81,120 @@ class URLParser:
             Optional[str]: 解析后的标准URL，解析失败返回None
         """
         try:
-            # 1. 验证URL格式
-            if not self._is_valid_url(url):
+            # 1. 离线标准化
+            kind, value = self.normalize_url(url)
+            if kind is None:
                 logger.error(f"无效的URL格式: {url}")
                 return None
+            if kind == 'user':
+                return value
 
-            # 2. 处理短链接
-            if 'v.douyin.com' in url:
-                url = self._expand_short_url(url)
-                if not url:
-                    return None
-
-            # 3. 提取用户ID
-            user_id = self._extract_user_id(url)
-            if not user_id:
-                logger.error(f"无法提取用户ID: {url}")
+            # 2. 展开短链接并提取用户ID
+            expanded = self._expand_short_url_cached(value)
+            if not expanded:
                 return None
-
-            # 4. 返回标准化URL
-            return f"https://www.douyin.com/user/{user_id}"
+            return self._to_user_url(expanded)
 
         except Exception as e:
             logger.error(f"URL解析失败: {str(e)}")
             return None
 
+    def parse_urls(self, urls: Iterable[str], max_workers: Optional[int] = None) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        批量解析抖音URL
+        先离线标准化并去重，标准主页链接立即返回，剩余短链接按短链接码去重后并发展开
+        
+        Args:
+            urls: 输入的URL列表
+            max_workers: 并发展开短链接的线程数，默认使用实例配置
+            
+        Yields:
+            Tuple[str, Optional[str]]: (输入URL, 解析后的标准URL)，每个不同的输入只产出一次，
+            短链接结果按完成顺序产出
+        """
+        seen = set()
+        pending = {}
+        for raw in urls:
+            url = (raw or '').strip()
+            if url in seen:
+                continue
+            seen.add(url)
+
+            kind, value = self.normalize_url(url)
+            if kind is None:
+                yield raw, None
+            elif kind == 'user':
+                yield raw, value
+            else:
+                cached = self._short_url_cache.get(value)
+                if cached is not None:
+                    yield raw, self._to_user_url(cached)
+                else:
+                    pending.setdefault(value, []).append(raw)
+
+        if not pending:
+            return
+
+        workers = min(max_workers or self.max_workers, len(pending))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='short-url')
+        futures = {executor.submit(self._expand_short_url_cached, short_url): short_url
+                   for short_url in pending}
+        try:
+            for future in as_completed(futures):
+                try:
+                    expanded = future.result()
+                except Exception as e:
+                    logger.error(f"短链接请求失败: {str(e)}")
+                    expanded = None
+                result = self._to_user_url(expanded) if expanded else None
+                for raw in pending[futures[future]]:
+                    yield raw, result
+        finally:
+            # 调用方提前停止迭代（如客户端断开）时取消尚未开始的展开，不等待进行中的请求
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def normalize_url(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        离线标准化URL，不发起网络请求
+        
+        Returns:
+            Tuple[Optional[str], Optional[str]]: ('user', 标准主页URL)、('short', 标准短链接)
+            或 (None, None) 表示无效URL
+        """
+        url = (url or '').strip()
+        for pattern in self.user_url_res:
+            match = pattern.match(url)
+            if match:
+                return 'user', f"{self.base_url}/user/{match.group(1)}"
+        for pattern in self.short_url_res:
+            match = pattern.match(url)
+            if match:
+                return 'short', f"{self.short_url_base}/{match.group(1)}/"
+        return None, None
+
     def _is_valid_url(self, url: str) -> bool:
         """
         验证URL是否符合抖音链接格式
         """
-        return any(re.match(pattern, url) for pattern in self.DOUYIN_URL_PATTERNS)
+        return any(pattern.match(url) for pattern in self.user_url_res + self.short_url_res)
+
+    def _expand_short_url_cached(self, short_url: str) -> Optional[str]:
+        """
+        展开短链接，成功结果会被缓存
+        """
+        expanded = self._short_url_cache.get(short_url)
+        if expanded is None:
+            expanded = self._expand_short_url(short_url)
+            if expanded:
+                self._short_url_cache.set(short_url, expanded)
+        return expanded
 
     def _expand_short_url(self, short_url: str) -> Optional[str]:
         """
         展开短链接为完整URL
         """
         try:
-            response = self.session.head(short_url, allow_redirects=True)
+            response = self.session.head(short_url, allow_redirects=True, timeout=10)
             if response.status_code == 200:
                 return response.url
             logger.error(f"短链接展开失败: {response.status_code}")
@@ -79,30 +203,93 @@ class URLParser:
             logger.error(f"短链接请求失败: {str(e)}")
             return None
 
+    def _to_user_url(self, url: str) -> Optional[str]:
+        """
+        把展开后的URL转换为标准用户主页URL
+        """
+        user_id = self._extract_user_id(url)
+        if not user_id:
+            logger.error(f"无法提取用户ID: {url}")
+            return None
+        return f"{self.base_url}/user/{user_id}"
+
     def _extract_user_id(self, url: str) -> Optional[str]:
         """
         从URL中提取用户ID
         """
-        for pattern in self.DOUYIN_URL_PATTERNS:
-            match = re.match(pattern, url)
+        for pattern in self.user_url_res + self.short_url_res:
+            match = pattern.match(url)
             if match:
                 return match.group(1)
         return None
 
-    def validate_user_exists(self, url: str) -> Tuple[bool, Optional[str]]:
+    def validate_user_exists(self, url: str, mode: str = 'probe') -> Tuple[bool, Optional[str]]:
         """
         验证用户是否存在
         
+        Args:
+            url: 标准用户主页URL
+            mode: 验证方式，'probe' 只读取页面开头几KB，'full' 下载完整页面
+        
         Returns:
             Tuple[bool, Optional[str]]: (是否存在, 错误信息)
         """
+        cached = self._validation_cache.get(url)
+        if cached is not None:
+            return cached
+
         try:
-            response = self.session.get(url)
-            if response.status_code == 200:
-                return True, None
-            elif response.status_code == 404:
-                return False, "用户不存在"
+            if mode == 'full':
+                response = self.session.get(url, timeout=10)
+                status, head = response.status_code, response.content.decode('utf-8', errors='ignore')
             else:
-                return False, f"请求失败: {response.status_code}"
+                status, head = self._probe_page(url)
         except Exception as e:
-            return False, f"验证失败: {str(e)}" 
\ No newline at end of file
+            return False, f"验证失败: {str(e)}"
+
+        if status in (200, 206):
+            if self._is_missing_user_page(head):
+                result = (False, "用户不存在")
+            else:
+                result = (True, None)
+        elif status == 404:
+            result = (False, "用户不存在")
+        else:
+            # 其他状态码可能是临时错误，不缓存
+            return False, f"请求失败: {status}"
+
+        ttl = self.VALIDATION_POSITIVE_TTL if result[0] else self.VALIDATION_NEGATIVE_TTL
+        self._validation_cache.set(url, result, ttl)
+        return result
+
+    def _probe_page(self, url: str) -> Tuple[int, str]:
+        """
+        以Range请求流式读取页面开头，读够 PROBE_BYTES 后立即关闭连接
+        
+        Returns:
+            Tuple[int, str]: (状态码, 页面开头的文本)
+        """
+        headers = {'Range': f'bytes=0-{self.PROBE_BYTES - 1}'}
+        response = self.session.get(url, headers=headers, stream=True, timeout=10)
+        try:
+            if response.status_code not in (200, 206):
+                return response.status_code, ''
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(4096):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.PROBE_BYTES:
+                    break
+            head = b''.join(chunks).decode('utf-8', errors='ignore')
+            return response.status_code, head
+        finally:
+            response.close()
+
+    def _is_missing_user_page(self, html: str) -> bool:
+        """
+        判断返回200的页面是否为用户不存在的错误页，优先只检查<title>
+        """
+        match = TITLE_RE.search(html)
+        text = match.group(1) if match else html
+        return any(marker in text for marker in self.USER_NOT_FOUND_MARKERS)
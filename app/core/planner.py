@@ -0,0 +1,174 @@
+"""
+下载规划模块
+下载前并发探测视频大小（只请求第一个字节，读取Content-Range/Content-Length和Accept-Ranges），
+据此按从小到大排序、大文件改用分段下载、按磁盘剩余空间决定是否准入，并为剩余时间估算提供总字节数。
+目标文件已存在的视频下载时会被跳过，不占用磁盘预算，也不计入总字节数。
+"""
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from loguru import logger
+
+from app.core.downloader import video_save_path
+
+CONTENT_RANGE_RE = re.compile(r'bytes\s+\d+-\d+/(\d+)')
+
+ORDER_SHORTEST = 'shortest'
+ORDER_ORIGINAL = 'original'
+
+
+def parse_probe_response(response: requests.Response) -> Tuple[Optional[int], bool]:
+    """从探测响应中解析文件大小和是否支持Range请求
+
+    Returns:
+        Tuple[Optional[int], bool]: (文件字节数，未知时为None；是否支持Range)
+    """
+    if response.status_code == 206:
+        match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+        return (int(match.group(1)) if match else None), True
+    if response.status_code == 200:
+        length = response.headers.get('Content-Length')
+        accept_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        return (int(length) if length and length.isdigit() else None), accept_ranges
+    return None, False
+
+
+class DownloadPlan:
+    """规划结果"""
+
+    def __init__(self, videos: List[Dict], deferred: List[Dict], free_bytes: Optional[int]):
+        self.videos = videos  # 准入的视频，按下载顺序排列
+        self.deferred = deferred  # 因磁盘空间不足推迟的视频
+        self.free_bytes = free_bytes
+        # 需要传输的总字节数，不含目标文件已存在的视频
+        self.total_bytes = sum(v.get('size') or 0 for v in videos if not v.get('on_disk'))
+        self.unknown = sum(1 for v in videos if v.get('size') is None and not v.get('on_disk'))
+        self.on_disk = sum(1 for v in videos if v.get('on_disk'))
+
+    def to_dict(self) -> Dict:
+        """导出规划摘要"""
+        return {
+            'videos': len(self.videos),
+            'deferred': len(self.deferred),
+            'segmented': sum(1 for v in self.videos if v.get('segments', 1) > 1),
+            'total_bytes': self.total_bytes,
+            'unknown_size': self.unknown,
+            'on_disk': self.on_disk,
+            'free_bytes': self.free_bytes
+        }
+
+
+class DownloadPlanner:
+    """基于文件大小的下载规划器"""
+
+    # 探测请求头，只请求第一个字节
+    PROBE_HEADERS = {
+        'Accept': '*/*',
+        'Accept-Encoding': 'identity',
+        'Range': 'bytes=0-0',
+        'Referer': 'https://www.douyin.com/'
+    }
+
+    def __init__(self, downloader, probe_workers: int = 8, order: str = ORDER_SHORTEST,
+                 segment_threshold: int = 64 * 1024 * 1024, segments: int = 4,
+                 disk_reserve: int = 512 * 1024 * 1024):
+        """初始化规划器
+
+        Args:
+            downloader: 下载器实例，探测请求复用其会话、重试策略和熔断器
+            probe_workers: 并发探测数
+            order: 下载顺序，shortest 为从小到大（大小未知的排在最后），original 为保持接口顺序
+            segment_threshold: 达到该大小且支持Range的文件使用分段下载（字节）
+            segments: 分段数
+            disk_reserve: 磁盘需要保留的剩余空间（字节）
+        """
+        if order not in (ORDER_SHORTEST, ORDER_ORIGINAL):
+            raise ValueError(f"未知的下载顺序: {order}")
+        self.downloader = downloader
+        self.probe_workers = probe_workers
+        self.order = order
+        self.segment_threshold = segment_threshold
+        self.segments = segments
+        self.disk_reserve = disk_reserve
+
+    def probe_size(self, url: str) -> Dict:
+        """探测单个视频的大小
+
+        Returns:
+            Dict: {'size': 字节数或None, 'accept_ranges': 是否支持Range}
+        """
+        if not url:
+            return {'size': None, 'accept_ranges': False}
+        try:
+            response = self.downloader._make_request('GET', url, stream=True, headers=self.PROBE_HEADERS)
+            with response:
+                size, accept_ranges = parse_probe_response(response)
+        except Exception as e:
+            logger.warning(f"探测视频大小失败: {str(e)}")
+            size, accept_ranges = None, False
+        return {'size': size, 'accept_ranges': accept_ranges}
+
+    def probe(self, videos: List[Dict]) -> List[Dict]:
+        """并发探测视频大小，结果写入每个视频的 size 和 accept_ranges 字段"""
+        pending = [v for v in videos if 'size' not in v]
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.probe_workers, thread_name_prefix='probe') as executor:
+                for video, info in zip(pending, executor.map(lambda v: self.probe_size(v.get('play_url')), pending)):
+                    video.update(info)
+        return videos
+
+    def plan(self, videos: List[Dict], download_dir: Path) -> DownloadPlan:
+        """根据探测结果排序、选择下载方式并按磁盘剩余空间准入
+
+        目标文件已存在的视频标记 on_disk，直接准入，不扣除磁盘预算
+
+        Args:
+            videos: 已探测大小的视频列表
+            download_dir: 下载目录
+
+        Returns:
+            DownloadPlan: 规划结果
+        """
+        ordered = list(videos)
+        if self.order == ORDER_SHORTEST:
+            ordered.sort(key=lambda v: (v.get('size') is None, v.get('size') or 0))
+
+        free = self._free_bytes(download_dir)
+        budget = None if free is None else free - self.disk_reserve
+        admitted, deferred = [], []
+        for video in ordered:
+            size = video.get('size')
+            video['on_disk'] = video_save_path(video, download_dir).exists()
+            if size is not None and budget is not None and not video['on_disk']:
+                if size > budget:
+                    deferred.append(video)
+                    continue
+                budget -= size
+            large = size is not None and size >= self.segment_threshold and video.get('accept_ranges')
+            video['segments'] = self.segments if large else 1
+            admitted.append(video)
+
+        plan = DownloadPlan(admitted, deferred, free)
+        if deferred:
+            logger.warning(f"磁盘剩余空间不足，推迟 {len(deferred)} 个视频")
+        logger.info(f"下载规划: {plan.to_dict()}")
+        return plan
+
+    def prepare(self, videos: List[Dict], download_dir: Path) -> DownloadPlan:
+        """探测并规划"""
+        return self.plan(self.probe(videos), download_dir)
+
+    @staticmethod
+    def _free_bytes(download_dir: Path) -> Optional[int]:
+        """下载目录所在磁盘的剩余空间，目录不存在时向上查找"""
+        path = Path(download_dir)
+        while not path.exists() and path != path.parent:
+            path = path.parent
+        try:
+            return shutil.disk_usage(path).free
+        except OSError:
+            return None
@@ -0,0 +1,188 @@
+"""
+下载进度事件总线
+下载循环把进度、状态变化和错误发布到总线，SSE等订阅者按事件序号从环形缓冲区读取。
+发布端只做一次追加，唤醒订阅者的工作交给后台分发线程，订阅者再多也不会拖慢下载线程。
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Iterator, List, Optional
+
+# 事件类型
+EVENT_STARTED = 'started'
+EVENT_PROGRESS = 'progress'
+EVENT_COMPLETED = 'completed'
+EVENT_FAILED = 'failed'
+EVENT_CREATOR = 'creator'
+
+
+class ProgressBus:
+    """进度事件总线"""
+
+    def __init__(self, capacity: int = 4096, min_interval: float = 0.5, max_tasks: int = 1024):
+        """初始化事件总线
+
+        Args:
+            capacity: 环形缓冲区保留的事件数量，落后太多的订阅者会跳过最旧的事件
+            min_interval: 同一任务两次字节进度事件之间的最小间隔（秒）
+            max_tasks: 保留最新状态的任务数量上限
+        """
+        self.min_interval = min_interval
+        self.max_tasks = max_tasks
+
+        # 发布端收件箱，仅由分发线程消费
+        self._inbox = deque()
+        self._wakeup = threading.Event()
+
+        # 订阅端读取的环形缓冲区
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+        # 每个任务的最新事件和上次进度发布时间
+        self._latest: "OrderedDict[str, Dict]" = OrderedDict()
+        self._last_emit: Dict[str, float] = {}
+        self._emit_lock = threading.Lock()
+
+        self._dispatcher = None
+        self._dispatcher_lock = threading.Lock()
+
+    def publish(self, task_id: str, event_type: str, **data) -> None:
+        """发布事件，仅追加到收件箱，不阻塞调用方
+
+        Args:
+            task_id: 任务ID
+            event_type: 事件类型 (started/progress/completed/failed)
+            **data: 事件附带数据
+        """
+        event = {'task_id': task_id, 'type': event_type, 'time': time.time()}
+        event.update(data)
+        self._inbox.append(event)
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+        if self._dispatcher is None:
+            self._start_dispatcher()
+
+    def progress(self, task_id: str, downloaded: int, total: int = 0, started_at: Optional[float] = None) -> bool:
+        """发布字节进度，按 min_interval 限流，完成时总会发布
+
+        Returns:
+            bool: 是否实际发布了事件
+        """
+        now = time.monotonic()
+        finished = total > 0 and downloaded >= total
+        with self._emit_lock:
+            last = self._last_emit.get(task_id, 0.0)
+            if not finished and now - last < self.min_interval:
+                return False
+            self._last_emit[task_id] = now
+
+        data = {'downloaded': downloaded, 'total': total}
+        if total > 0:
+            data['percent'] = round(downloaded / total * 100, 1)
+        if started_at:
+            elapsed = now - started_at
+            if elapsed > 0:
+                data['speed'] = int(downloaded / elapsed)
+                if total > 0 and data['speed'] > 0:
+                    data['eta'] = round(max(total - downloaded, 0) / data['speed'], 1)
+        self.publish(task_id, EVENT_PROGRESS, **data)
+        return True
+
+    def finish(self, task_id: str, event_type: str, **data) -> None:
+        """发布终态事件并清理该任务的限流状态"""
+        with self._emit_lock:
+            self._last_emit.pop(task_id, None)
+        self.publish(task_id, event_type, **data)
+
+    def snapshot(self, task_id: Optional[str] = None) -> List[Dict]:
+        """获取任务的最新事件
+
+        Args:
+            task_id: 任务ID，为空时返回所有任务
+
+        Returns:
+            List[Dict]: 最新事件列表
+        """
+        with self._cond:
+            if task_id is not None:
+                event = self._latest.get(task_id)
+                return [event] if event else []
+            return list(self._latest.values())
+
+    def subscribe(self, task_id: Optional[str] = None, last_id: Optional[int] = None,
+                  timeout: float = 15.0, max_age: Optional[float] = None) -> Iterator[Optional[Dict]]:
+        """订阅事件流
+
+        Args:
+            task_id: 只接收指定任务的事件，为空时接收全部
+            last_id: 从该序号之后开始读取，为空时只接收新事件
+            timeout: 等待新事件的超时时间，超时时产出 None 供调用方发送心跳
+            max_age: 订阅的最长时长（秒），到期后结束迭代，为空时不限
+
+        Yields:
+            Optional[Dict]: 事件字典，超时时为 None
+        """
+        cursor = self._seq if last_id is None else last_id
+        deadline = time.monotonic() + max_age if max_age else None
+        while True:
+            wait = timeout
+            if deadline is not None:
+                wait = min(timeout, deadline - time.monotonic())
+                if wait <= 0:
+                    return
+            with self._cond:
+                if self._seq <= cursor:
+                    self._cond.wait(wait)
+                batch = self._read_after(cursor)
+
+            if not batch:
+                yield None
+                continue
+
+            cursor = batch[-1]['id']
+            for event in batch:
+                if task_id is None or event['task_id'] == task_id:
+                    yield event
+
+    def _read_after(self, cursor: int) -> List[Dict]:
+        """读取序号大于 cursor 的事件，调用方需持有锁"""
+        if not self._events or self._seq <= cursor:
+            return []
+        first_id = self._events[0]['id']
+        start = max(cursor + 1 - first_id, 0)
+        return list(itertools.islice(self._events, start, None))
+
+    def _start_dispatcher(self):
+        """启动后台分发线程"""
+        with self._dispatcher_lock:
+            if self._dispatcher is not None:
+                return
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='progress-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch_loop(self):
+        """把收件箱中的事件编号后放入环形缓冲区并唤醒订阅者"""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._inbox:
+                continue
+            with self._cond:
+                while self._inbox:
+                    event = self._inbox.popleft()
+                    self._seq += 1
+                    event['id'] = self._seq
+                    self._events.append(event)
+
+                    task_id = event['task_id']
+                    self._latest[task_id] = event
+                    self._latest.move_to_end(task_id)
+                    if len(self._latest) > self.max_tasks:
+                        self._latest.popitem(last=False)
+                self._cond.notify_all()
+
+
+# 全局进度总线
+progress_bus = ProgressBus()
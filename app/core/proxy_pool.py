@@ -0,0 +1,188 @@
+"""
+代理池模块
+在多个代理之间分配请求：按成功率和延迟给代理打分，连续失败的代理进入隔离期并指数退避，
+每个代理限制同时进行的请求数，并提供每个代理的统计信息。
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from loguru import logger
+
+
+class NoProxyAvailable(Exception):
+    """在超时时间内没有可用代理"""
+
+
+class ProxyStats:
+    """单个代理的状态和统计"""
+
+    def __init__(self, url: str, max_concurrency: int):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.inflight = 0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None  # 响应时间的指数移动平均（秒）
+        self.quarantined_until = 0.0
+        self.quarantine_count = 0
+        self.probation = False  # 隔离期结束后的试用状态，再失败一次立即重新隔离
+
+    @property
+    def proxies(self) -> Dict[str, str]:
+        """requests 使用的代理配置"""
+        return {'http': self.url, 'https': self.url}
+
+    def available(self, now: float) -> bool:
+        """是否可以分配新请求"""
+        return self.quarantined_until <= now and self.inflight < self.max_concurrency
+
+    def score(self) -> float:
+        """综合得分：平滑后的成功率除以延迟惩罚"""
+        success_rate = (self.successes + 1) / (self.successes + self.failures + 2)
+        latency = self.latency if self.latency is not None else 1.0
+        return success_rate / (1.0 + latency)
+
+    def to_dict(self) -> Dict:
+        """导出统计信息"""
+        now = time.monotonic()
+        total = self.successes + self.failures
+        return {
+            'url': self.url,
+            'inflight': self.inflight,
+            'max_concurrency': self.max_concurrency,
+            'successes': self.successes,
+            'failures': self.failures,
+            'success_rate': round(self.successes / total, 3) if total else None,
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'score': round(self.score(), 4),
+            'quarantined': self.quarantined_until > now,
+            'quarantine_remaining': round(max(self.quarantined_until - now, 0), 1),
+            'quarantine_count': self.quarantine_count
+        }
+
+
+class ProxyPool:
+    """带健康评分和并发限制的代理池"""
+
+    def __init__(self, proxy_urls: List[str], max_concurrency: int = 4, failure_threshold: int = 3,
+                 quarantine_base: float = 30, quarantine_max: float = 600, acquire_timeout: float = 60):
+        """初始化代理池
+
+        Args:
+            proxy_urls: 代理地址列表，如 http://127.0.0.1:7890
+            max_concurrency: 每个代理同时进行的最大请求数
+            failure_threshold: 连续失败多少次后进入隔离期
+            quarantine_base: 首次隔离时长（秒），之后每次翻倍
+            quarantine_max: 最长隔离时长（秒）
+            acquire_timeout: 默认等待可用代理的超时时间（秒）
+        """
+        if not proxy_urls:
+            raise ValueError("代理列表不能为空")
+        self.max_concurrency = max_concurrency
+        self.failure_threshold = failure_threshold
+        self.quarantine_base = quarantine_base
+        self.quarantine_max = quarantine_max
+        self.acquire_timeout = acquire_timeout
+        self._proxies: Dict[str, ProxyStats] = {}
+        self._cond = threading.Condition()
+        for url in proxy_urls:
+            self.add(url)
+
+    def add(self, url: str, max_concurrency: Optional[int] = None):
+        """加入代理"""
+        with self._cond:
+            if url not in self._proxies:
+                limit = self.max_concurrency if max_concurrency is None else max_concurrency
+                self._proxies[url] = ProxyStats(url, limit)
+                self._cond.notify_all()
+
+    def remove(self, url: str):
+        """移除代理，进行中的请求不受影响"""
+        with self._cond:
+            self._proxies.pop(url, None)
+
+    def acquire(self, timeout: Optional[float] = None) -> ProxyStats:
+        """领取一个代理并占用其并发名额，没有可用代理时阻塞等待
+
+        在可用代理中按得分加权随机选择，得分高的代理承担更多请求，同时避免所有请求集中到同一个代理
+
+        Raises:
+            NoProxyAvailable: 超时仍没有可用代理
+        """
+        deadline = time.monotonic() + (self.acquire_timeout if timeout is None else timeout)
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                candidates = [p for p in self._proxies.values() if p.available(now)]
+                if candidates:
+                    proxy = random.choices(candidates, weights=[p.score() for p in candidates])[0]
+                    if proxy.quarantined_until and proxy.quarantined_until <= now:
+                        # 隔离期结束，进入试用
+                        proxy.quarantined_until = 0.0
+                        proxy.probation = True
+                        logger.info(f"代理结束隔离，开始试用: {proxy.url}")
+                    proxy.inflight += 1
+                    return proxy
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise NoProxyAvailable("没有可用的代理")
+                # 所有代理都被隔离时，等到最早的隔离期结束
+                quarantined = [p.quarantined_until for p in self._proxies.values() if p.quarantined_until > now]
+                wait = min([remaining] + [until - now for until in quarantined])
+                self._cond.wait(max(wait, 0.01))
+
+    def release(self, proxy: ProxyStats, success: bool, latency: Optional[float] = None):
+        """归还代理并记录请求结果
+
+        Args:
+            proxy: acquire 返回的代理
+            success: 请求是否成功
+            latency: 响应时间（秒）
+        """
+        with self._cond:
+            proxy.inflight = max(proxy.inflight - 1, 0)
+            if success:
+                proxy.successes += 1
+                proxy.consecutive_failures = 0
+                proxy.probation = False
+                proxy.quarantine_count = 0
+                if latency is not None:
+                    proxy.latency = latency if proxy.latency is None else 0.8 * proxy.latency + 0.2 * latency
+            else:
+                proxy.failures += 1
+                proxy.consecutive_failures += 1
+                if proxy.probation or proxy.consecutive_failures >= self.failure_threshold:
+                    self._quarantine(proxy)
+            self._cond.notify_all()
+
+    @contextmanager
+    def use(self, timeout: Optional[float] = None) -> Iterator[ProxyStats]:
+        """领取代理的上下文管理器，块内抛出异常记为失败，否则记为成功"""
+        proxy = self.acquire(timeout)
+        started = time.monotonic()
+        try:
+            yield proxy
+        except Exception:
+            self.release(proxy, False)
+            raise
+        self.release(proxy, True, time.monotonic() - started)
+
+    def stats(self) -> List[Dict]:
+        """每个代理的统计信息，按得分从高到低排列"""
+        with self._cond:
+            proxies = sorted(self._proxies.values(), key=lambda p: p.score(), reverse=True)
+            return [proxy.to_dict() for proxy in proxies]
+
+    def _quarantine(self, proxy: ProxyStats):
+        """隔离代理，调用方需持有锁"""
+        duration = min(self.quarantine_base * (2 ** proxy.quarantine_count), self.quarantine_max)
+        proxy.quarantined_until = time.monotonic() + duration
+        proxy.quarantine_count += 1
+        proxy.consecutive_failures = 0
+        proxy.probation = False
+        logger.warning(f"代理进入隔离期 {duration:.0f} 秒: {proxy.url}")
@@ -0,0 +1,235 @@
+"""
+请求容错模块
+提供重试策略（全抖动指数退避、遵守Retry-After）、按域名的熔断器，以及请求失败时抛出的异常类型。
+接口请求和CDN视频传输使用不同的重试策略；域名持续失败时熔断器直接拒绝请求，冷却后放行少量探测请求。
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+
+
+class RequestError(Exception):
+    """请求失败的基类"""
+
+    def __init__(self, message: str, url: Optional[str] = None, status_code: Optional[int] = None,
+                 attempts: int = 0):
+        super().__init__(message)
+        self.url = url
+        self.status_code = status_code
+        self.attempts = attempts
+
+
+class NetworkError(RequestError):
+    """连接失败、超时等网络错误，重试后仍未成功"""
+
+
+class HTTPStatusError(RequestError):
+    """服务器持续返回错误状态码"""
+
+
+class RateLimitedError(HTTPStatusError):
+    """请求被限流（429），retry_after 为服务器要求的等待时间（秒）"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, **kwargs):
+        super().__init__(message, **kwargs)
+        self.retry_after = retry_after
+
+
+class BlockedError(HTTPStatusError):
+    """请求被拒绝（403），通常是访问身份被封禁或视频签名过期，重试没有意义"""
+
+
+class ResponseParseError(RequestError):
+    """服务器返回200但内容无法解析，例如反爬返回的空响应，稍后重试可能恢复"""
+
+
+class CircuitOpenError(RequestError):
+    """域名处于熔断状态，请求未发出"""
+
+    def __init__(self, message: str, host: str, retry_in: float, **kwargs):
+        super().__init__(message, **kwargs)
+        self.host = host
+        self.retry_in = retry_in
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After响应头，支持秒数和HTTP日期两种格式，返回需要等待的秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """重试策略"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 retry_statuses=(429, 500, 502, 503, 504), breaker_statuses=(403, 429),
+                 max_retry_after: float = 60.0):
+        """初始化重试策略
+
+        Args:
+            max_attempts: 最多尝试次数（含第一次）
+            base_delay: 退避基准时长（秒）
+            max_delay: 单次退避上限（秒）
+            retry_statuses: 需要重试的状态码
+            breaker_statuses: 除5xx外计入域名熔断的状态码
+            max_retry_after: 最多愿意等待的Retry-After时长（秒），超过时放弃重试
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.breaker_statuses = frozenset(breaker_statuses)
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时长，全抖动：在 [0, min(上限, 基准 * 2^attempt)] 内均匀随机"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def should_retry(self, status_code: int) -> bool:
+        """状态码是否需要重试"""
+        return status_code in self.retry_statuses
+
+    def is_host_failure(self, status_code: int) -> bool:
+        """状态码是否说明域名不健康（限流、封禁或服务器错误）"""
+        return status_code >= 500 or status_code in self.breaker_statuses
+
+
+# 接口请求：失败多半是风控或限流，少量重试即可，退避时间长一些
+API_RETRY_POLICY = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=30.0, max_retry_after=60.0)
+# CDN传输：失败多为节点抖动，重试更积极；403通常是单个视频签名过期，不重试也不计入熔断
+CDN_RETRY_POLICY = RetryPolicy(max_attempts=4, base_delay=0.5, max_delay=10.0,
+                               retry_statuses=(408, 429, 500, 502, 503, 504), breaker_statuses=(429,),
+                               max_retry_after=30.0)
+
+
+class CircuitBreaker:
+    """单个域名的熔断器
+
+    连续失败达到阈值后打开，打开期间直接拒绝请求；冷却时间过后进入半开状态，
+    只放行有限个探测请求，探测成功则关闭，失败则重新打开并延长冷却时间
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, host: str, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 max_recovery_timeout: float = 600.0, half_open_max: int = 1):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.half_open_max = half_open_max
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """检查是否放行请求
+
+        Raises:
+            CircuitOpenError: 熔断器打开，或半开状态下探测名额已用完
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN and now >= self.opened_until:
+                self.state = self.HALF_OPEN
+                self._probes = 0
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and self._probes < self.half_open_max:
+                self._probes += 1
+                return
+            self.rejected += 1
+            retry_in = max(self.opened_until - now, 0.0)
+        raise CircuitOpenError(f"域名已熔断: {self.host}", host=self.host, retry_in=retry_in)
+
+    def record_success(self):
+        """记录成功，半开状态下关闭熔断器"""
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self.trips = 0
+
+    def release(self):
+        """放弃一次已放行的请求而不记录结果，半开状态下归还探测名额"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_failure(self, cooldown: Optional[float] = None):
+        """记录失败
+
+        Args:
+            cooldown: 服务器明确要求的等待时间（秒），设置后立即打开熔断器至少这么久
+        """
+        with self._lock:
+            self.consecutive_failures += 1
+            if (self.state == self.HALF_OPEN or cooldown is not None
+                    or self.consecutive_failures >= self.failure_threshold):
+                self._open(cooldown)
+
+    def _open(self, cooldown: Optional[float]):
+        """打开熔断器，调用方需持有锁"""
+        duration = min(self.recovery_timeout * (2 ** self.trips), self.max_recovery_timeout)
+        if cooldown is not None:
+            duration = max(duration, cooldown)
+        self.state = self.OPEN
+        self.opened_until = time.monotonic() + duration
+        self.trips += 1
+        self.consecutive_failures = 0
+
+    def to_dict(self) -> Dict:
+        """导出熔断器状态"""
+        with self._lock:
+            return {
+                'host': self.host,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'open_remaining': round(max(self.opened_until - time.monotonic(), 0), 1),
+                'trips': self.trips,
+                'rejected': self.rejected
+            }
+
+
+class CircuitBreakerRegistry:
+    """按域名管理熔断器"""
+
+    def __init__(self, **breaker_kwargs):
+        """初始化
+
+        Args:
+            **breaker_kwargs: 传给每个 CircuitBreaker 的参数
+        """
+        self._breaker_kwargs = breaker_kwargs
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str) -> CircuitBreaker:
+        """获取域名对应的熔断器，不存在时创建"""
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(host, CircuitBreaker(host, **self._breaker_kwargs))
+        return breaker
+
+    def stats(self) -> List[Dict]:
+        """所有域名的熔断器状态"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [breaker.to_dict() for breaker in breakers]
+
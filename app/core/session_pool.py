@@ -0,0 +1,145 @@
+"""
+会话池模块
+维护多个请求会话，每个会话有固定的User-Agent和独立的Cookies（即一个访问身份），
+工作线程独占地借出和归还会话，避免多线程修改同一个会话的请求头。
+会话在第一次需要时才创建，只用到一个会话的短任务不会为其余会话付出创建开销。
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Hashable, Iterator, List, Optional
+
+import requests
+
+
+class SessionPool:
+    """线程安全的会话池"""
+
+    def __init__(self, factory: Callable[[], requests.Session], size: int = 4, max_affinity: int = 10000):
+        """初始化会话池
+
+        Args:
+            factory: 创建会话的函数，在持有会话池锁时调用
+            size: 会话数量上限
+            max_affinity: 最多记录的亲和键数量
+        """
+        if size < 1:
+            raise ValueError("会话池大小至少为1")
+        self._factory = factory
+        self._capacity = 0
+        # 已创建的会话
+        self.sessions: List[requests.Session] = []
+        # 空闲会话，后归还的先借出，保持连接处于热状态
+        self._idle: List[requests.Session] = []
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        # 亲和键到会话的映射，同一个键尽量使用同一个身份
+        self._affinity: "OrderedDict[Hashable, requests.Session]" = OrderedDict()
+        self._max_affinity = max_affinity
+        self.ensure_size(size)
+
+    @property
+    def size(self) -> int:
+        """会话数量上限"""
+        return self._capacity
+
+    @property
+    def busy(self) -> int:
+        """已借出的会话数量"""
+        with self._cond:
+            return len(self.sessions) - len(self._idle)
+
+    def ensure_size(self, size: int):
+        """把会话数量上限扩充到至少 size 个，新会话在需要时才创建"""
+        with self._cond:
+            self._capacity = max(self._capacity, size)
+            self._cond.notify_all()
+
+    def primary(self) -> requests.Session:
+        """第一个会话（主身份），还没有会话时立即创建"""
+        with self._cond:
+            if not self.sessions:
+                self._idle.append(self._create())
+            return self.sessions[0]
+
+    def _create(self) -> requests.Session:
+        """创建新会话，调用方需持有锁"""
+        session = self._factory()
+        self.sessions.append(session)
+        return session
+
+    def current(self) -> Optional[requests.Session]:
+        """当前线程借出的会话"""
+        return getattr(self._local, 'session', None)
+
+    @contextmanager
+    def checkout(self, affinity: Optional[Hashable] = None, timeout: Optional[float] = None) -> Iterator[requests.Session]:
+        """独占地借出一个会话，块结束时归还
+
+        当前线程已经借出会话时直接复用，因此可以嵌套调用
+
+        Args:
+            affinity: 亲和键（如用户URL），同一个键优先借出上次使用的会话，让Cookies保持一致
+            timeout: 等待空闲会话的超时时间（秒），为空时一直等待
+
+        Raises:
+            TimeoutError: 超时仍没有空闲会话
+        """
+        held = self.current()
+        if held is not None:
+            yield held
+            return
+
+        session = self._acquire(affinity, timeout)
+        self._local.session = session
+        try:
+            yield session
+        finally:
+            self._local.session = None
+            with self._cond:
+                self._idle.append(session)
+                self._cond.notify()
+
+    @contextmanager
+    def bind(self, session: requests.Session) -> Iterator[requests.Session]:
+        """让当前线程临时使用指定会话（通常是父线程借出的会话），不占用空闲会话
+
+        用于同一个下载任务派生的辅助线程（如分段下载）共用父线程的访问身份
+        """
+        previous = self.current()
+        self._local.session = session
+        try:
+            yield session
+        finally:
+            self._local.session = previous
+
+    def _acquire(self, affinity: Optional[Hashable], timeout: Optional[float]) -> requests.Session:
+        """取出空闲会话"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._idle and len(self.sessions) >= self._capacity:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("没有空闲的会话")
+                self._cond.wait(remaining)
+
+            # 优先复用空闲会话，没有空闲会话且未达到上限时才创建
+            if not self._idle:
+                self._idle.append(self._create())
+
+            session = None
+            if affinity is not None:
+                preferred = self._affinity.get(affinity)
+                if preferred is not None and preferred in self._idle:
+                    session = preferred
+                    self._idle.remove(preferred)
+            if session is None:
+                session = self._idle.pop()
+
+            if affinity is not None:
+                self._affinity[affinity] = session
+                self._affinity.move_to_end(affinity)
+                if len(self._affinity) > self._max_affinity:
+                    self._affinity.popitem(last=False)
+            return session
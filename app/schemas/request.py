@@ -12,4 +12,20 @@ class URLSchema(Schema):
 class DownloadSchema(Schema):
     """下载请求Schema"""
     video_id = fields.String(required=True)
-    save_path = fields.String(required=False) 
\ No newline at end of file
+    save_path = fields.String(required=False)
+
+
+class BatchURLSchema(Schema):
+    """批量URL解析请求Schema"""
+    urls = fields.List(fields.String(), required=True,
+                       validate=validate.Length(min=1, max=10000, error="URL数量需在1到10000之间"))
+
+
+class BandwidthSchema(Schema):
+    """带宽整形设置Schema，未提供的字段保持不变"""
+    rate = fields.Float(allow_none=True, validate=validate.Range(min=0, min_inclusive=False,
+                                                                 error="速率上限必须大于0"))
+    weights = fields.Dict(keys=fields.String(), values=fields.Float(
+        validate=validate.Range(min=0, min_inclusive=False, error="权重必须大于0")))
+    caps = fields.Dict(keys=fields.String(), values=fields.Float(
+        allow_none=True, validate=validate.Range(min=0, min_inclusive=False, error="速率上限必须大于0")))
@@ -28,6 +28,9 @@ class VideoSchema(Schema):
     cover = fields.String(required=True)
     play_url = fields.String(required=True)
     duration = fields.Integer(required=True)
+    width = fields.Integer(required=False, allow_none=True)
+    height = fields.Integer(required=False, allow_none=True)
+    bitrate = fields.Integer(required=False, allow_none=True)
     create_time = fields.DateTime(required=True)
     like_count = fields.Integer(required=True)
     comment_count = fields.Integer(required=True)
@@ -0,0 +1,241 @@
+"""
+带宽整形工具
+所有下载线程共享一个全局字节速率上限，按优先级类别加权公平分配带宽：
+有数据在传的类别按权重分摊总速率，空闲类别的份额让给其他类别；每个类别还可以单独设置上限，运行时可调整。
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+# 优先级类别
+PRIORITY_INTERACTIVE = 'interactive'  # 接口触发的单个下载，用户在等待
+PRIORITY_INCREMENTAL = 'incremental'  # 监控发现的新视频
+PRIORITY_BACKFILL = 'backfill'  # 整个账号的批量补全
+
+DEFAULT_WEIGHTS = {
+    PRIORITY_INTERACTIVE: 8,
+    PRIORITY_INCREMENTAL: 4,
+    PRIORITY_BACKFILL: 1
+}
+
+
+class _ClassState:
+    """单个优先级类别的令牌状态
+
+    reserved 是累计预留的字节数，credited 是按当前速率累计发放的字节数，
+    预留位置不超过 credited 时对应的线程才能继续，因此同一类别内先到先得
+    """
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.cap = None
+        self.rate = float('inf')
+        self.reserved = 0.0
+        self.credited = 0.0
+        self.updated = time.monotonic()
+        self.last_seen = 0.0
+        self.bytes = 0
+
+    def refill(self, now: float, burst: float):
+        """按当前速率发放令牌，空闲时最多积累 burst 字节"""
+        if self.rate != float('inf'):
+            self.credited = min(self.credited + (now - self.updated) * self.rate, self.reserved + burst)
+        self.updated = now
+
+
+class BandwidthShaper:
+    """多线程共享的带宽整形器"""
+
+    def __init__(self, rate: Optional[float] = None, weights: Optional[Dict[str, float]] = None,
+                 caps: Optional[Dict[str, float]] = None, burst_seconds: float = 0.5,
+                 idle_after: float = 1.0, max_sleep: float = 0.25):
+        """初始化带宽整形器
+
+        Args:
+            rate: 全局速率上限（字节/秒），为空时不限制
+            weights: 各优先级类别的权重，默认 interactive:incremental:backfill = 8:4:1
+            caps: 各优先级类别的速率上限（字节/秒）
+            burst_seconds: 允许的突发量，按该类别速率的秒数计算
+            idle_after: 类别超过该时间（秒）没有数据时视为空闲，其份额让给其他类别
+            max_sleep: 单次睡眠上限（秒），速率变化后等待中的线程最迟在该时间后按新速率计算
+        """
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self.idle_after = idle_after
+        self.max_sleep = max_sleep
+        self._classes: Dict[str, _ClassState] = {
+            name: _ClassState(weight) for name, weight in {**DEFAULT_WEIGHTS, **(weights or {})}.items()
+        }
+        for name, cap in (caps or {}).items():
+            self._state(name).cap = cap
+        self._active = frozenset()
+        self._lock = threading.Lock()
+        with self._lock:
+            self._rebalance(time.monotonic())
+
+    @property
+    def enabled(self) -> bool:
+        """是否设置了任何速率上限"""
+        return self.rate is not None or any(state.cap is not None for state in self._classes.values())
+
+    def consume(self, nbytes: int, priority: str = PRIORITY_BACKFILL) -> float:
+        """登记已传输（或即将传输）的字节数，超出该类别当前速率时阻塞等待
+
+        Args:
+            nbytes: 字节数
+            priority: 优先级类别
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        if not self.enabled:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(priority)
+            state.last_seen = now
+            state.bytes += nbytes
+            self._update_active(now)
+            state.refill(now, state.rate * self.burst_seconds)
+            state.reserved += nbytes
+            position = state.reserved
+            if state.rate == float('inf'):
+                state.credited = state.reserved
+                return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                state.last_seen = now
+                self._update_active(now)
+                state.refill(now, state.rate * self.burst_seconds)
+                if state.rate == float('inf'):
+                    state.credited = max(state.credited, position)
+                missing = position - state.credited
+                if missing <= 0:
+                    return waited
+                wait = min(missing / state.rate, self.max_sleep)
+            time.sleep(wait)
+            waited += wait
+
+    def set_rate(self, rate: Optional[float]) -> None:
+        """运行时调整全局速率上限，为空时不限制"""
+        with self._lock:
+            self.rate = rate
+            self._rebalance(time.monotonic())
+
+    def set_cap(self, priority: str, cap: Optional[float]) -> None:
+        """运行时调整某个类别的速率上限，为空时不单独限制"""
+        with self._lock:
+            self._state(priority).cap = cap
+            self._rebalance(time.monotonic())
+
+    def set_weight(self, priority: str, weight: float) -> None:
+        """运行时调整某个类别的权重"""
+        if weight <= 0:
+            raise ValueError("权重必须大于0")
+        with self._lock:
+            self._state(priority).weight = weight
+            self._rebalance(time.monotonic())
+
+    def configure(self, weights: Optional[Dict[str, float]] = None,
+                  caps: Optional[Dict[str, Optional[float]]] = None) -> None:
+        """运行时批量调整权重和上限，只校验一次、重新分配一次，未指定的类别保持不变
+
+        Args:
+            weights: 各类别的权重
+            caps: 各类别的速率上限（字节/秒），值为空时取消该类别的上限
+
+        Raises:
+            ValueError: 权重或上限不大于0，此时不做任何修改
+        """
+        weights, caps = weights or {}, caps or {}
+        if any(weight <= 0 for weight in weights.values()):
+            raise ValueError("权重必须大于0")
+        if any(cap is not None and cap <= 0 for cap in caps.values()):
+            raise ValueError("速率上限必须大于0")
+        with self._lock:
+            for name, weight in weights.items():
+                self._state(name).weight = weight
+            for name, cap in caps.items():
+                self._state(name).cap = cap
+            self._rebalance(time.monotonic())
+
+    def stats(self) -> Dict[str, Dict]:
+        """各类别当前分配的速率和累计字节数"""
+        with self._lock:
+            self._update_active(time.monotonic())
+            return {
+                name: {
+                    'weight': state.weight,
+                    'cap': state.cap,
+                    'rate': None if state.rate == float('inf') else round(state.rate, 1),
+                    'active': name in self._active,
+                    'bytes': state.bytes
+                }
+                for name, state in self._classes.items()
+            }
+
+    def _state(self, priority: str) -> _ClassState:
+        """获取类别状态，未知类别按权重1创建，调用方需持有锁"""
+        state = self._classes.get(priority)
+        if state is None:
+            state = self._classes[priority] = _ClassState(1)
+        return state
+
+    def _update_active(self, now: float):
+        """活跃类别变化时重新分配速率，调用方需持有锁"""
+        active = frozenset(
+            name for name, state in self._classes.items()
+            if now - state.last_seen < self.idle_after or state.reserved > state.credited
+        )
+        if active != self._active:
+            self._active = active
+            self._rebalance(now)
+
+    def _rebalance(self, now: float):
+        """按权重在活跃类别之间分配全局速率，调用方需持有锁
+
+        受单独上限约束的类别只拿到上限，剩余的速率继续在其他类别之间按权重分配；
+        没有活跃类别时按全部类别计算，让第一个到来的请求立即拿到合适的速率
+        """
+        for state in self._classes.values():
+            state.refill(now, state.rate * self.burst_seconds)
+
+        names = set(self._active) or set(self._classes)
+        rates = {}
+        remaining = self.rate
+        while names:
+            total_weight = sum(self._classes[name].weight for name in names)
+            capped = set()
+            for name in names:
+                state = self._classes[name]
+                share = float('inf') if remaining is None else remaining * state.weight / total_weight
+                if state.cap is not None and state.cap < share:
+                    rates[name] = state.cap
+                    capped.add(name)
+            if not capped:
+                for name in names:
+                    state = self._classes[name]
+                    rates[name] = float('inf') if remaining is None else remaining * state.weight / total_weight
+                break
+            names -= capped
+            if remaining is not None:
+                remaining = max(remaining - sum(rates[name] for name in capped), 0.0)
+
+        for name, state in self._classes.items():
+            if name in rates:
+                state.rate = rates[name]
+            else:
+                # 空闲类别按加入后能拿到的份额预设速率，下次活跃时会重新分配
+                share = float('inf') if self.rate is None else self.rate * state.weight / (
+                    state.weight + sum(self._classes[n].weight for n in self._active))
+                state.rate = share if state.cap is None else min(share, state.cap)
+            if state.rate <= 0:
+                state.rate = 1.0
+
+
+# 全局带宽整形器，默认不限速
+bandwidth_shaper = BandwidthShaper()
@@ -0,0 +1,163 @@
+"""
+缓存工具
+提供线程安全的短时缓存和请求合并，避免同一资源的并发请求重复访问上游
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# 未命中标记
+_MISSING = object()
+
+
+class TTLCache:
+    """带过期时间和容量上限的LRU缓存"""
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 1024):
+        """初始化缓存
+
+        Args:
+            ttl: 默认过期时间（秒）
+            max_size: 最多缓存的条目数，超出时淘汰最久未使用的条目
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，过期条目视为未命中"""
+        value = self.peek(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存但不计入命中统计"""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """写入缓存
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 过期时间（秒），默认使用实例的 ttl
+        """
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """删除缓存条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class _Call:
+    """进行中的上游调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """请求合并：同一个键的并发调用只执行一次，其余调用等待并共享结果"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """执行或等待同键调用
+
+        Args:
+            key: 合并键
+            fn: 实际执行的函数
+
+        Returns:
+            函数返回值，异常会传播给所有等待者
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+def cached_call(cache: TTLCache, flight: SingleFlight, key: Hashable, fn: Callable[[], Any],
+                ttl: Optional[float] = None, cache_none: bool = False) -> Any:
+    """先查缓存，未命中时合并并发调用并写回缓存
+
+    上游调用抛出的异常会传给所有等待者但不写入缓存，失败必须以异常表示，
+    不能用空结果代替，否则失败会被当作正常结果缓存 ttl 秒
+
+    Args:
+        cache: 缓存实例
+        flight: 请求合并实例
+        key: 缓存键
+        fn: 上游调用
+        ttl: 过期时间（秒）
+        cache_none: 是否缓存 None 结果
+
+    Returns:
+        缓存值或上游调用结果
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    def load():
+        # 等待期间其他调用可能已写入缓存
+        value = cache.peek(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = fn()
+        if value is not None or cache_none:
+            cache.set(key, value, ttl)
+        return value
+
+    return flight.do(key, load)
@@ -0,0 +1,170 @@
+"""
+调试抓取工具
+按采样率把上游响应保存到磁盘，便于排查页面结构变化和接口报错。
+默认关闭；开启后请求线程只做采样判断并把响应放入有界队列，由后台线程写文件，
+队列满时直接丢弃，不会阻塞请求。目录按环形缓冲保留最新的文件，文件数和总字节数都有上限。
+"""
+import queue
+import random
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Optional, Tuple, Union
+
+from loguru import logger
+
+from app.utils.metrics import metrics
+
+DEBUG_CAPTURES = metrics.counter('debug_captures_total', '调试抓取次数', ('result',))
+
+
+class DebugCapture:
+    """采样保存上游响应的环形缓冲"""
+
+    def __init__(self, directory: Union[str, Path] = 'data/logs/captures', sample_rate: float = 0.0,
+                 error_sample_rate: float = 0.0, max_files: int = 50, max_bytes: int = 20 * 1024 * 1024,
+                 max_body_bytes: int = 2 * 1024 * 1024, queue_size: int = 64):
+        """初始化调试抓取
+
+        Args:
+            directory: 保存目录
+            sample_rate: 正常响应的采样率（0-1），0 表示不保存
+            error_sample_rate: 出错响应的采样率（0-1），0 表示不保存
+            max_files: 目录中最多保留的文件数
+            max_bytes: 目录中最多保留的总字节数
+            max_body_bytes: 单个响应最多保存的字节数，超出部分截断
+            queue_size: 等待写入的响应数上限，超出时丢弃新的响应
+        """
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.error_sample_rate = error_sample_rate
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_body_bytes = max_body_bytes
+        self._queue: "queue.Queue[Tuple[str, bytes]]" = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._sequence = 0
+        # 目录中已有的文件（按写入顺序），由写入线程维护
+        self._files: Deque[Tuple[Path, int]] = deque()
+        self._total_bytes = 0
+        self._stats = {'written': 0, 'dropped': 0, 'evicted': 0}
+
+    @property
+    def enabled(self) -> bool:
+        """是否开启了任何采样"""
+        return self.sample_rate > 0 or self.error_sample_rate > 0
+
+    def configure(self, directory: Union[str, Path, None] = None, sample_rate: Optional[float] = None,
+                  error_sample_rate: Optional[float] = None, max_files: Optional[int] = None,
+                  max_bytes: Optional[int] = None):
+        """运行时调整参数，未指定的参数保持不变"""
+        with self._lock:
+            if directory is not None and Path(directory) != self.directory:
+                if self._thread is not None:
+                    raise RuntimeError("写入线程启动后不能修改保存目录")
+                self.directory = Path(directory)
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if error_sample_rate is not None:
+                self.error_sample_rate = error_sample_rate
+            if max_files is not None:
+                self.max_files = max_files
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+
+    def capture(self, kind: str, body: Union[bytes, str], error: bool = False, suffix: str = '.txt') -> bool:
+        """按采样率保存一个响应
+
+        Args:
+            kind: 响应类别，用作文件名的一部分，例如 user_page
+            body: 响应内容，传入 response.content 可以避免未采中时的解码开销
+            error: 是否为出错的响应，按 error_sample_rate 采样
+            suffix: 文件扩展名
+
+        Returns:
+            bool: 是否放入了写入队列
+        """
+        rate = self.error_sample_rate if error else self.sample_rate
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return False
+
+        if isinstance(body, str):
+            body = body.encode('utf-8', errors='replace')
+        name = self._next_name(kind + ('-error' if error else ''), suffix)
+        try:
+            self._queue.put_nowait((name, body[:self.max_body_bytes]))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._ensure_writer()
+        return True
+
+    def flush(self):
+        """等待队列中的响应全部写入"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stats(self) -> Dict[str, int]:
+        """写入、丢弃和淘汰的文件数，以及当前保留的文件数和字节数"""
+        with self._lock:
+            return dict(self._stats, files=len(self._files), bytes=self._total_bytes)
+
+    def _next_name(self, kind: str, suffix: str) -> str:
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{sequence:06d}-{kind}{suffix}"
+
+    def _count(self, result: str):
+        DEBUG_CAPTURES.labels(result).inc()
+        with self._lock:
+            self._stats[result] += 1
+
+    def _ensure_writer(self):
+        """第一次采中时启动写入线程"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='debug-capture', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # 接上之前运行留下的文件，文件名以时间开头，按名称排序即写入顺序
+        for path in sorted(self.directory.iterdir()):
+            if path.is_file():
+                self._files.append((path, path.stat().st_size))
+                self._total_bytes += path.stat().st_size
+        self._evict()
+
+        while True:
+            name, body = self._queue.get()
+            try:
+                path = self.directory / name
+                path.write_bytes(body)
+                self._files.append((path, len(body)))
+                self._total_bytes += len(body)
+                self._count('written')
+                self._evict()
+            except Exception as e:
+                logger.error("保存调试响应失败: {}", e)
+            finally:
+                self._queue.task_done()
+
+    def _evict(self):
+        """删除最旧的文件，直到文件数和总字节数都不超过上限"""
+        while self._files and (len(self._files) > self.max_files or self._total_bytes > self.max_bytes):
+            path, size = self._files.popleft()
+            self._total_bytes -= size
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self._count('evicted')
+
+
+# 全局调试抓取实例，默认关闭
+debug_capture = DebugCapture()
@@ -0,0 +1,47 @@
+"""
+日志配置
+loguru默认的输出在调用线程中同步写入，终端或磁盘变慢时会拖慢工作线程。
+这里的输出都使用入队写入（enqueue=True）：调用线程只把记录放入队列，由后台线程写终端和文件。
+消息请使用 logger.debug("...: {}", value) 的参数形式，日志级别未开启时不会格式化。
+Web服务由 create_app 配置，命令行入口通过 add_logging_arguments 和 setup_cli_logging 配置。
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import Optional, Union
+
+from loguru import logger
+
+LOG_FORMAT = ('<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | '
+              '{thread.name} | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>')
+
+
+def setup_logging(level: str = 'INFO', log_dir: Union[str, Path, None] = None, enqueue: bool = True,
+                  rotation: str = '50 MB', retention: Optional[int] = 10, diagnose: bool = False):
+    """替换loguru的默认输出
+
+    Args:
+        level: 最低日志级别
+        log_dir: 日志目录，设置后同时写入 app.log 并按大小轮转
+        enqueue: 是否由后台线程写出
+        rotation: 日志文件的轮转条件
+        retention: 保留的轮转文件数
+        diagnose: 异常日志是否附带变量值，开销较大且可能输出敏感数据，默认关闭
+    """
+    logger.remove()
+    logger.add(sys.stderr, level=level, format=LOG_FORMAT, enqueue=enqueue, diagnose=diagnose)
+    if log_dir is not None:
+        logger.add(Path(log_dir) / 'app.log', level=level, format=LOG_FORMAT, enqueue=enqueue, diagnose=diagnose,
+                   rotation=rotation, retention=retention, encoding='utf-8')
+
+
+def add_logging_arguments(parser: argparse.ArgumentParser):
+    """为命令行入口添加 --log-level 和 --log-dir 参数"""
+    parser.add_argument('--log-level', default=os.environ.get('LOG_LEVEL') or 'INFO', help='最低日志级别')
+    parser.add_argument('--log-dir', type=Path, help='日志目录，设置后同时写入 app.log')
+
+
+def setup_cli_logging(args: argparse.Namespace):
+    """按 add_logging_arguments 添加的参数配置日志，命令行入口在开始工作前调用"""
+    setup_logging(args.log_level, args.log_dir)
@@ -0,0 +1,312 @@
+"""
+运行指标
+提供计数器、仪表和直方图，按Prometheus文本格式导出。
+热路径上只做一次字典查找和一次加锁的累加，带标签的子指标首次使用时创建并缓存，
+调用方可以预先取出子指标复用，省去每次的标签查找。
+"""
+import bisect
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Prometheus文本格式的Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 默认的耗时直方图分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 视频传输耗时分桶（秒）
+TRANSFER_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _escape(value: str) -> str:
+    """转义标签值"""
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value: float) -> str:
+    """格式化样本值"""
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """格式化标签"""
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class _CounterChild:
+    """一组标签对应的计数器"""
+
+    __slots__ = ('_value', '_lock')
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """增加计数"""
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class _GaugeChild(_CounterChild):
+    """一组标签对应的仪表"""
+
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        """减少数值"""
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float) -> None:
+        """设置数值"""
+        with self._lock:
+            self._value = float(value)
+
+
+class _HistogramChild:
+    """一组标签对应的直方图"""
+
+    __slots__ = ('_buckets', '_counts', '_sum', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """记录一次观测值"""
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """各分桶的累计计数和观测值总和"""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+
+class _Metric(ABC):
+    """指标基类，按标签值缓存子指标"""
+
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> object:
+        """获取标签值对应的子指标"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际传入 {key}")
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """创建一个子指标"""
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def samples(self) -> Iterable[str]:
+        """导出样本行"""
+        for values, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """没有标签时直接增加计数"""
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """可增可减的仪表"""
+
+    metric_type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[str]:
+        names = self.labelnames + ('le',)
+        for values, child in self._items():
+            cumulative, total = child.snapshot()
+            for bound, count in zip(self.buckets + (math.inf,), cumulative):
+                yield f"{self.name}_bucket{_format_labels(names, values + (_format_value(bound),))} {count}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative[-1]}"
+
+
+class _CallbackMetric:
+    """导出时才调用回调取值的指标，用于已有的统计（缓存命中数、连接池占用等）"""
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Union[float, Dict]],
+                 metric_type: str = 'gauge', labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[str]:
+        result = self.callback()
+        if not isinstance(result, dict):
+            result = {(): result}
+        for values, value in result.items():
+            if value is None:
+                continue
+            values = values if isinstance(values, tuple) else (values,)
+            labels = _format_labels(self.labelnames, tuple(str(v) for v in values))
+            yield f"{self.name}{labels} {_format_value(float(value))}"
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标只创建一次"""
+
+    def __init__(self, namespace: str = 'douyin'):
+        """初始化注册表
+
+        Args:
+            namespace: 指标名前缀
+        """
+        self.namespace = namespace
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """获取或创建计数器"""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """获取或创建仪表"""
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """获取或创建直方图"""
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_callback(self, name: str, documentation: str, callback: Callable[[], Union[float, Dict]],
+                          metric_type: str = 'gauge', labelnames: Sequence[str] = ()) -> None:
+        """注册导出时取值的指标，回调返回数值，或标签值元组到数值的映射，重复注册时替换回调
+
+        Args:
+            name: 指标名（不含前缀）
+            documentation: 说明
+            callback: 取值回调
+            metric_type: gauge 或 counter
+            labelnames: 标签名
+        """
+        full_name = self._full_name(name)
+        with self._lock:
+            self._metrics[full_name] = _CallbackMetric(full_name, documentation, callback, metric_type, labelnames)
+
+    def unregister(self, name: str) -> None:
+        """移除指标"""
+        with self._lock:
+            self._metrics.pop(self._full_name(name), None)
+
+    def get(self, name: str) -> Optional[object]:
+        """按名称（不含前缀）获取指标"""
+        return self._metrics.get(self._full_name(name))
+
+    def render(self) -> str:
+        """按Prometheus文本格式导出全部指标"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception:
+                # 回调出错时跳过该指标，不影响其余指标导出
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def _full_name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        full_name = self._full_name(name)
+        metric = self._metrics.get(full_name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(full_name)
+                if metric is None:
+                    metric = self._metrics[full_name] = cls(full_name, documentation, labelnames, **kwargs)
+        if not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"指标 {full_name} 已以不同的类型或标签注册")
+        return metric
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
@@ -0,0 +1,138 @@
+"""
+MP4头部解析工具
+纯Python解析MP4的box结构，从moov中的mvhd/tkhd/hdlr读取时长和分辨率，不依赖ffmpeg等外部工具。
+"""
+import math
+import struct
+from typing import Dict, Iterator, Optional, Tuple
+
+# box头部最大长度：4字节大小 + 4字节类型 + 8字节扩展大小
+BOX_HEADER_MAX = 16
+
+# 需要深入解析的容器box
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia'}
+
+
+class MP4FormatError(ValueError):
+    """MP4结构无法解析"""
+
+
+def read_box_header(data: bytes, offset: int = 0, end: Optional[int] = None) -> Optional[Tuple[bytes, int, int]]:
+    """读取 offset 处的box头部
+
+    Args:
+        data: 字节数据
+        offset: box起始位置
+        end: 所在容器的结束位置，大小为0的box延伸到这里；为空时表示未知
+
+    Returns:
+        Optional[Tuple[bytes, int, int]]: (类型, 头部长度, box总长度)，数据不足以读取头部时返回None，
+            大小为0且结束位置未知时总长度为-1
+    """
+    if offset + 8 > len(data):
+        return None
+    size, box_type = struct.unpack_from('>I4s', data, offset)
+    header = 8
+    if size == 1:
+        if offset + 16 > len(data):
+            return None
+        size = struct.unpack_from('>Q', data, offset + 8)[0]
+        header = 16
+    elif size == 0:
+        size = -1 if end is None else end - offset
+    if size != -1 and size < header:
+        raise MP4FormatError(f"box大小无效: {box_type!r} {size}")
+    return box_type, header, size
+
+
+def iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int, int, int]]:
+    """遍历 [start, end) 范围内完整的子box
+
+    Yields:
+        Tuple[bytes, int, int, int]: (类型, box起始位置, 内容起始位置, box结束位置)
+    """
+    end = len(data) if end is None else end
+    offset = start
+    while offset < end:
+        parsed = read_box_header(data, offset, end)
+        if parsed is None:
+            return
+        box_type, header, size = parsed
+        if size == -1 or offset + size > end:
+            return
+        yield box_type, offset, offset + header, offset + size
+        offset += size
+
+
+def _parse_mvhd(data: bytes, start: int) -> Dict:
+    """解析mvhd，返回影片时间刻度和时长"""
+    version = data[start]
+    if version == 1:
+        timescale, duration = struct.unpack_from('>IQ', data, start + 20)
+    else:
+        timescale, duration = struct.unpack_from('>II', data, start + 12)
+    return {'timescale': timescale, 'duration': duration}
+
+
+def _parse_tkhd(data: bytes, start: int) -> Dict:
+    """解析tkhd，返回轨道宽高（16.16定点数）和旋转角度"""
+    version = data[start]
+    # 跳过 version/flags、时间戳、track_id、保留字段、时长、保留字段、layer/alternate_group/volume/保留字段
+    offset = start + (4 + 8 + 8 + 4 + 4 + 8 if version == 1 else 4 + 4 + 4 + 4 + 4 + 4) + 8 + 8
+    matrix = struct.unpack_from('>9i', data, offset)
+    width, height = struct.unpack_from('>II', data, offset + 36)
+    rotation = int(round(math.degrees(math.atan2(matrix[1], matrix[0])))) % 360
+    return {'width': width / 65536, 'height': height / 65536, 'rotation': rotation}
+
+
+def _parse_trak(data: bytes, start: int, end: int) -> Dict:
+    """解析trak中的tkhd和hdlr"""
+    track = {}
+    for box_type, _, content, box_end in iter_boxes(data, start, end):
+        if box_type == b'tkhd':
+            track.update(_parse_tkhd(data, content))
+        elif box_type == b'mdia':
+            for sub_type, _, sub_content, _ in iter_boxes(data, content, box_end):
+                if sub_type == b'hdlr':
+                    track['handler'] = data[sub_content + 8:sub_content + 12].decode('latin-1')
+    return track
+
+
+def parse_moov(data: bytes, start: int = 0, end: Optional[int] = None) -> Dict:
+    """解析moov box的内容
+
+    Args:
+        data: 字节数据
+        start: moov内容起始位置（跳过box头部）
+        end: moov结束位置
+
+    Returns:
+        Dict: duration（秒，浮点数）、width、height（按旋转后的显示方向）、rotation，
+            没有视频轨道时不含宽高字段
+
+    Raises:
+        MP4FormatError: 缺少mvhd
+    """
+    movie = None
+    video_track = None
+    for box_type, _, content, box_end in iter_boxes(data, start, end):
+        if box_type == b'mvhd':
+            movie = _parse_mvhd(data, content)
+        elif box_type == b'trak':
+            track = _parse_trak(data, content, box_end)
+            is_video = track.get('handler') == 'vide' or (
+                'handler' not in track and track.get('width') and track.get('height'))
+            if is_video and video_track is None:
+                video_track = track
+    if movie is None:
+        raise MP4FormatError("moov中缺少mvhd")
+
+    result = {
+        'duration': movie['duration'] / movie['timescale'] if movie['timescale'] else None
+    }
+    if video_track:
+        width, height = int(video_track['width']), int(video_track['height'])
+        if video_track['rotation'] in (90, 270):
+            width, height = height, width
+        result.update({'width': width, 'height': height, 'rotation': video_track['rotation']})
+    return result
@@ -0,0 +1,57 @@
+"""
+限速工具
+提供多线程共享的令牌桶限速器
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """令牌桶限速器，多个线程共享同一请求速率"""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        """初始化限速器
+
+        Args:
+            rate: 每秒允许的请求数
+            burst: 允许的突发请求数
+        """
+        if rate <= 0:
+            raise ValueError("rate必须大于0")
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """获取令牌，不足时阻塞等待
+
+        令牌不足时先预留（余额记为负数）再睡眠，后到的线程排在其后，保证先来先服务
+
+        Args:
+            tokens: 需要的令牌数
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def set_rate(self, rate: float) -> None:
+        """运行时调整速率"""
+        if rate <= 0:
+            raise ValueError("rate必须大于0")
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.rate = rate
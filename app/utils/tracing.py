@@ -0,0 +1,396 @@
+"""
+分阶段耗时追踪
+在抓取流程的各个阶段（初始化会话、解析页面、翻页、等待、传输）记录耗时区间，
+一次运行的记录可以导出为Chrome trace（chrome://tracing、Perfetto可直接打开）。
+可选的采样分析器定时采集处于 profile 区间内的线程调用栈，用于分析CPU密集的解析路径。
+
+没有在记录时，span() 返回共享的空区间，开销只有一次属性判断。
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class _NullSpan:
+    """未在记录时使用的空区间"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs) -> None:
+        """空操作"""
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """一个耗时区间"""
+
+    __slots__ = ('name', 'args', 'tid', 'start_ns', 'end_ns', 'child_ns', 'profile', '_tracer', '_run', '_parent')
+
+    def __init__(self, tracer: 'Tracer', run: 'TraceRun', name: str, profile: bool, args: Dict):
+        self.name = name
+        self.args = args
+        self.profile = profile
+        self.tid = threading.get_ident()
+        self.start_ns = 0
+        self.end_ns = 0
+        self.child_ns = 0
+        self._tracer = tracer
+        self._run = run
+        self._parent = None
+
+    def set(self, **attrs) -> None:
+        """设置区间属性，如 bytes、status、outcome"""
+        self.args.update(attrs)
+
+    @property
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+    def __enter__(self):
+        stack = self._tracer._stack()
+        self._parent = stack[-1] if stack else None
+        stack.append(self)
+        if self.profile:
+            self._run._enter_profiled(self.tid)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        if self.profile:
+            self._run._exit_profiled(self.tid)
+        stack = self._tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if self._parent is not None:
+            self._parent.child_ns += self.duration_ns
+        if exc_type is not None:
+            self.args.setdefault('outcome', 'error')
+            self.args.setdefault('error', exc_type.__name__)
+        self._run._add(self)
+        return False
+
+
+class TraceRun:
+    """一次运行记录的区间和采样"""
+
+    def __init__(self, max_spans: int = 200000):
+        """初始化
+
+        Args:
+            max_spans: 最多保留的区间数，超出后丢弃并计数
+        """
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.samples: List[Tuple[int, int, Tuple[str, ...]]] = []
+        self.dropped = 0
+        self.started_ns = time.perf_counter_ns()
+        self.ended_ns: Optional[int] = None
+        self.thread_names: Dict[int, str] = {}
+        self._profiled: Dict[int, int] = {}
+        self.profiler: Optional['SamplingProfiler'] = None
+        self._lock = threading.Lock()
+
+    def _add(self, span: Span):
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self.spans.append(span)
+            if span.tid not in self.thread_names:
+                self.thread_names[span.tid] = threading.current_thread().name
+
+    def _enter_profiled(self, tid: int):
+        with self._lock:
+            self._profiled[tid] = self._profiled.get(tid, 0) + 1
+
+    def _exit_profiled(self, tid: int):
+        with self._lock:
+            count = self._profiled.get(tid, 0) - 1
+            if count > 0:
+                self._profiled[tid] = count
+            else:
+                self._profiled.pop(tid, None)
+
+    def profiled_threads(self) -> List[int]:
+        """当前处于 profile 区间内的线程"""
+        with self._lock:
+            return list(self._profiled)
+
+    def summary(self) -> Dict[str, Dict]:
+        """按区间名汇总：次数、总耗时、自身耗时（扣除子区间）、字节数和出错次数，按自身耗时降序"""
+        result = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'bytes': 0, 'errors': 0})
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            item = result[span.name]
+            item['count'] += 1
+            item['seconds'] += span.duration_ns / 1e9
+            item['self_seconds'] += (span.duration_ns - span.child_ns) / 1e9
+            item['bytes'] += span.args.get('bytes') or 0
+            item['errors'] += span.args.get('outcome') in ('error', 'failed')
+        for item in result.values():
+            item['seconds'] = round(item['seconds'], 6)
+            item['self_seconds'] = round(item['self_seconds'], 6)
+        return dict(sorted(result.items(), key=lambda pair: pair[1]['self_seconds'], reverse=True))
+
+    def to_chrome_trace(self) -> Dict:
+        """转换为Chrome trace格式，区间为完整事件（ph=X），采样放在 stackFrames/samples 中"""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            samples = list(self.samples)
+            thread_names = dict(self.thread_names)
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in thread_names.items()
+        ]
+        for span in spans:
+            events.append({
+                'name': span.name,
+                'cat': 'douyin',
+                'ph': 'X',
+                'ts': (span.start_ns - self.started_ns) / 1000,
+                'dur': span.duration_ns / 1000,
+                'pid': pid,
+                'tid': span.tid,
+                'args': {key: _jsonable(value) for key, value in span.args.items()}
+            })
+
+        # 调用栈按前缀树编号，每个采样引用叶子节点
+        stack_frames: Dict[str, Dict] = {}
+        frame_ids: Dict[Tuple[str, ...], str] = {}
+        trace_samples = []
+        for ts_ns, tid, stack in samples:
+            parent = None
+            for depth in range(1, len(stack) + 1):
+                prefix = stack[:depth]
+                frame_id = frame_ids.get(prefix)
+                if frame_id is None:
+                    frame_id = frame_ids[prefix] = str(len(frame_ids) + 1)
+                    frame = {'name': stack[depth - 1], 'category': 'python'}
+                    if parent is not None:
+                        frame['parent'] = parent
+                    stack_frames[frame_id] = frame
+                parent = frame_id
+            if parent is not None:
+                trace_samples.append({'cpu': 0, 'tid': tid, 'ts': (ts_ns - self.started_ns) / 1000,
+                                      'name': 'sample', 'sf': parent, 'weight': 1})
+
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms',
+                 'otherData': {'dropped_spans': self.dropped}}
+        if trace_samples:
+            trace['stackFrames'] = stack_frames
+            trace['samples'] = trace_samples
+        return trace
+
+    def export_chrome_trace(self, path) -> Path:
+        """导出Chrome trace文件"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_chrome_trace(), ensure_ascii=False), encoding='utf-8')
+        return path
+
+    def collapsed_stacks(self) -> Dict[str, int]:
+        """采样的折叠调用栈（flamegraph.pl / speedscope 格式），键为以分号连接的调用栈"""
+        with self._lock:
+            samples = list(self.samples)
+        return dict(Counter(';'.join(stack) for _, _, stack in samples))
+
+    def export_collapsed(self, path) -> Path:
+        """导出折叠调用栈文件，每行为“调用栈 次数”"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lines = [f"{stack} {count}" for stack, count in sorted(self.collapsed_stacks().items())]
+        path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        return path
+
+
+class SamplingProfiler:
+    """采样分析器：后台线程定时采集处于 profile 区间内的线程调用栈"""
+
+    def __init__(self, run: TraceRun, interval: float = 0.005, max_depth: int = 64, all_threads: bool = False):
+        """初始化
+
+        Args:
+            run: 写入采样的运行记录
+            interval: 采样间隔（秒）
+            max_depth: 调用栈最大深度
+            all_threads: 是否采样所有线程，默认只采样处于 profile 区间内的线程
+        """
+        self.run = run
+        self.interval = interval
+        self.max_depth = max_depth
+        self.all_threads = all_threads
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动采样线程"""
+        self._thread = threading.Thread(target=self._loop, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止采样"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            tids = frames.keys() if self.all_threads else self.run.profiled_threads()
+            now = time.perf_counter_ns()
+            samples = []
+            for tid in tids:
+                frame = frames.get(tid)
+                if frame is None or tid == own:
+                    continue
+                samples.append((now, tid, self._stack(frame)))
+            if samples:
+                with self.run._lock:
+                    self.run.samples.extend(samples)
+
+    def _stack(self, frame) -> Tuple[str, ...]:
+        """调用栈，从最外层到最内层"""
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+
+class Tracer:
+    """区间追踪器"""
+
+    def __init__(self):
+        self._run: Optional[TraceRun] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """是否正在记录"""
+        return self._run is not None
+
+    def span(self, name: str, profile: bool = False, **attrs):
+        """创建耗时区间，用作上下文管理器
+
+        Args:
+            name: 区间名（阶段名）
+            profile: 是否为CPU密集区间，开启采样分析时只采样处于这类区间内的线程
+            **attrs: 区间属性
+        """
+        run = self._run
+        if run is None:
+            return _NULL_SPAN
+        return Span(self, run, name, profile, attrs)
+
+    def current(self):
+        """当前线程最内层的区间，未在记录时返回空区间"""
+        if self._run is None:
+            return _NULL_SPAN
+        stack = self._stack()
+        return stack[-1] if stack else _NULL_SPAN
+
+    def start(self, profile: bool = False, interval: float = 0.005, max_spans: int = 200000) -> TraceRun:
+        """开始记录，同一时间只能有一次记录
+
+        Args:
+            profile: 是否同时开启采样分析
+            interval: 采样间隔（秒）
+            max_spans: 最多保留的区间数
+        """
+        with self._lock:
+            if self._run is not None:
+                raise RuntimeError("已经在记录中")
+            run = TraceRun(max_spans)
+            if profile:
+                run.profiler = SamplingProfiler(run, interval)
+            self._run = run
+        if run.profiler is not None:
+            run.profiler.start()
+        return run
+
+    def stop(self) -> Optional[TraceRun]:
+        """停止记录，返回本次的记录"""
+        with self._lock:
+            run, self._run = self._run, None
+        if run is not None:
+            if run.profiler is not None:
+                run.profiler.stop()
+            run.ended_ns = time.perf_counter_ns()
+        return run
+
+    def record(self, profile: bool = False, interval: float = 0.005, max_spans: int = 200000) -> '_Recording':
+        """在 with 块内记录，参数同 start
+
+        用法:
+            with tracer.record(profile=True) as run:
+                downloader.download_all_videos(url)
+            run.export_chrome_trace('data/traces/run.json')
+        """
+        return _Recording(self, profile, interval, max_spans)
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+class _Recording:
+    """tracer.record() 返回的上下文管理器"""
+
+    def __init__(self, tracer: Tracer, profile: bool, interval: float, max_spans: int):
+        self._tracer = tracer
+        self._args = (profile, interval, max_spans)
+
+    def __enter__(self) -> TraceRun:
+        return self._tracer.start(*self._args)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._tracer.stop()
+        return False
+
+
+def traced(name: Optional[str] = None, profile: bool = False) -> Callable:
+    """把函数执行过程记录为一个区间的装饰器，区间名默认为函数名"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if tracer._run is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name, profile=profile):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _jsonable(value):
+    """区间属性转换为可序列化的值"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+# 全局追踪器
+tracer = Tracer()
@@ -0,0 +1,4 @@
+"""
+离线基准测试
+包含模拟抖音站点和视频CDN的本地替身服务器，以及基于它的性能基准测试
+"""
@@ -0,0 +1,280 @@
+"""
+API压测工具
+并发请求 /parse、/user/<id>、/user/<id>/videos 和 /download，按路由统计吞吐量和尾延迟
+
+默认在进程内启动替身服务器和多线程的API服务；也可以用 --target 压测已经启动的服务（例如gunicorn），
+此时服务需要通过环境变量指向替身服务器，用户数与替身服务器保持一致：
+
+    python -m benchmarks.standin --port 8600 --cdn-port 8601 --users 200
+    DOUYIN_BASE_URL=http://127.0.0.1:8600 DOUYIN_SHORT_URL_BASE=http://127.0.0.1:8600/s \\
+        UPSTREAM_RATE_LIMIT=100000 COOKIES_FILE=/tmp/standin-cookies.pkl gunicorn -c gunicorn.conf.py
+    python -m benchmarks.loadgen --target http://127.0.0.1:5000/api/v1 --users 200
+"""
+import argparse
+import json
+import logging
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from benchmarks.standin import DouyinStandin, StandinUser, video_id
+from benchmarks.suite import percentile
+
+# 默认的路由请求比例
+DEFAULT_MIX = {'parse': 1, 'user': 2, 'videos': 4, 'download': 1}
+
+
+class RouteStats:
+    """单个路由的请求结果"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses = Counter()
+        self.errors = 0
+
+    def add(self, latency: float, status: Optional[int]):
+        """记录一次请求，status 为 None 表示连接失败或超时"""
+        self.latencies.append(latency)
+        self.statuses[str(status) if status is not None else 'error'] += 1
+        if status is None or status >= 400:
+            self.errors += 1
+
+    def merge(self, other: 'RouteStats'):
+        self.latencies.extend(other.latencies)
+        self.statuses.update(other.statuses)
+        self.errors += other.errors
+
+    def summary(self, elapsed: float) -> Dict:
+        """请求数、错误数、吞吐量和延迟分位数（毫秒）"""
+        def ms(fraction):
+            return round(percentile(self.latencies, fraction) * 1000, 3)
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'rps': round(len(self.latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+            'p50_ms': ms(0.5),
+            'p90_ms': ms(0.9),
+            'p99_ms': ms(0.99),
+            'max_ms': round(max(self.latencies, default=0) * 1000, 3),
+            'statuses': dict(self.statuses)
+        }
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """解析 parse=1,user=2 形式的路由比例"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"未知的路由: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_request(route: str, rng: random.Random, users: int, pages: int, page_size: int) -> Tuple[str, str, Optional[Dict]]:
+    """生成一个请求
+
+    用户ID、短链接码和视频ID按替身服务器的规则生成；/parse 提交抖音短链接，
+    服务端按配置的短链接地址展开
+
+    Returns:
+        Tuple[str, str, Optional[Dict]]: (方法, 相对路径, JSON请求体)
+    """
+    user = StandinUser(rng.randrange(users), [])
+    if route == 'parse':
+        return 'POST', '/parse', {'url': f"https://v.douyin.com/{user.short_code}/"}
+    if route == 'user':
+        return 'GET', f"/user/{user.sec_uid}", None
+    if route == 'videos':
+        return 'GET', f"/user/{user.sec_uid}/videos?cursor={rng.randrange(pages) * page_size}", None
+    return 'POST', '/download', {'video_id': video_id(user.index, rng.randrange(pages * page_size))}
+
+
+def run_load(target: str, users: int, duration: float = 10.0, concurrency: int = 16,
+             mix: Optional[Dict[str, float]] = None, rate: Optional[float] = None, pages: int = 2,
+             page_size: int = 20, timeout: float = 30.0, seed: int = 0) -> Dict:
+    """对API施压
+
+    Args:
+        target: API地址，例如 http://127.0.0.1:5000/api/v1
+        users: 替身服务器上的用户数，请求在这些用户间随机分布
+        duration: 施压时长（秒）
+        concurrency: 并发连接数
+        mix: 各路由的请求比例，默认 DEFAULT_MIX
+        rate: 目标总请求速率（次/秒）。指定时按固定节奏发出请求，延迟从计划发出时刻算起，
+            服务变慢时排队等待也计入延迟；不指定时每个连接收到响应后立即发下一个请求
+        pages: 视频列表请求的页数范围
+        page_size: 替身服务器的每页视频数
+        timeout: 单个请求的超时时间（秒）
+        seed: 随机种子
+
+    Returns:
+        Dict: 各路由和总体的请求数、错误数、吞吐量和延迟分位数
+    """
+    mix = mix or DEFAULT_MIX
+    routes = [name for name in mix if mix[name] > 0]
+    weights = [mix[name] for name in routes]
+    target = target.rstrip('/')
+    lock = threading.Lock()
+    sent = [0]
+    results: List[Dict[str, RouteStats]] = []
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def next_slot() -> Optional[float]:
+        """固定速率模式下领取下一个请求的计划发出时刻"""
+        with lock:
+            index = sent[0]
+            sent[0] += 1
+        planned = start + index / rate
+        return planned if planned < deadline else None
+
+    def worker(number: int):
+        rng = random.Random(seed * 1000 + number)
+        stats = {name: RouteStats() for name in routes}
+        session = requests.Session()
+        try:
+            while True:
+                if rate:
+                    planned = next_slot()
+                    if planned is None:
+                        break
+                    delay = planned - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                else:
+                    planned = time.perf_counter()
+                    if planned >= deadline:
+                        break
+                route = rng.choices(routes, weights)[0]
+                method, path, body = build_request(route, rng, users, pages, page_size)
+                try:
+                    response = session.request(method, target + path, json=body, timeout=timeout)
+                    status = response.status_code
+                except requests.RequestException:
+                    status = None
+                stats[route].add(time.perf_counter() - planned, status)
+        finally:
+            session.close()
+            with lock:
+                results.append(stats)
+
+    threads = [threading.Thread(target=worker, args=(number,), name=f'loadgen-{number}', daemon=True)
+               for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    merged = {name: RouteStats() for name in routes}
+    total = RouteStats()
+    for stats in results:
+        for name, route_stats in stats.items():
+            merged[name].merge(route_stats)
+            total.merge(route_stats)
+    return {
+        'config': {'target': target, 'users': users, 'duration': duration, 'concurrency': concurrency,
+                   'mix': mix, 'rate': rate},
+        'elapsed': round(elapsed, 3),
+        'routes': {name: merged[name].summary(elapsed) for name in routes},
+        'total': total.summary(elapsed)
+    }
+
+
+@contextmanager
+def local_service(users: int = 50, videos_per_user: int = 40, api_latency: float = 0.005,
+                  host: str = '127.0.0.1') -> Iterator[str]:
+    """在进程内启动替身服务器和多线程的API服务
+
+    API服务使用 create_app 创建，配置指向替身服务器，Cookies写入临时目录，上游请求不做随机等待
+
+    Yields:
+        str: API地址
+    """
+    from werkzeug.serving import make_server
+
+    from app import create_app
+    from app.api import routes
+    from app.config.settings import config
+
+    work_dir = Path(tempfile.mkdtemp(prefix='loadgen-'))
+    standin = DouyinStandin(users=users, videos_per_user=videos_per_user, api_latency=api_latency).start()
+
+    class LoadTestConfig(config['production']):
+        DOUYIN_BASE_URL = standin.base_url
+        DOUYIN_SHORT_URL_BASE = standin.short_url_base
+        COOKIES_FILE = work_dir / 'cookies.pkl'
+        UPSTREAM_RATE_LIMIT = 100000
+        LOG_LEVEL = 'WARNING'
+        LOG_DIR = None
+
+    # 请求日志会拖慢开发服务器
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    routes.reset_shared()
+    server = make_server(host, 0, create_app(LoadTestConfig), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='loadgen-api', daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_port}/api/v1"
+    finally:
+        server.shutdown()
+        thread.join()
+        standin.stop()
+        routes.reset_shared()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _print_results(results: Dict):
+    print(f"压测 {results['config']['target']}，耗时 {results['elapsed']} 秒，"
+          f"并发 {results['config']['concurrency']}")
+    # 中文表头按两个字符宽度对齐
+    print(f"   {'路由':<8}{'请求数':>5}{'错误':>4}{'吞吐(次/秒)':>9}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    rows = list(results['routes'].items()) + [('total', results['total'])]
+    for name, row in rows:
+        print(f"   {name:<10}{row['requests']:>8}{row['errors']:>6}{row['rps']:>12}"
+              f"{row['p50_ms']:>10}{row['p90_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='API压测')
+    parser.add_argument('--target', help='压测已启动的API服务，例如 http://127.0.0.1:5000/api/v1；默认在进程内启动')
+    parser.add_argument('--users', type=int, default=50, help='替身服务器上的用户数')
+    parser.add_argument('--duration', type=float, default=10, help='施压时长（秒）')
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help='并发连接数')
+    parser.add_argument('--rate', type=float, help='固定总请求速率（次/秒），默认不限')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='路由比例，例如 parse=1,user=2,videos=4,download=1')
+    parser.add_argument('--output', type=Path, help='把结果写入JSON文件')
+    args = parser.parse_args(argv)
+
+    from app.utils.log import setup_logging
+    setup_logging('WARNING')
+
+    options = dict(users=args.users, duration=args.duration, concurrency=args.concurrency,
+                   mix=args.mix, rate=args.rate)
+    if args.target:
+        results = run_load(args.target, **options)
+    else:
+        with local_service(users=args.users) as target:
+            results = run_load(target, **options)
+
+    _print_results(results)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    return 1 if results['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,521 @@
+"""
+抖音本地替身服务器
+模拟下载流程用到的站点接口，不访问真实网络：
+- 首页：下发 ttwid、msToken Cookies
+- 用户主页：包含base64编码的 RENDER_DATA 脚本，可填充无关内容模拟真实页面体积
+- /aweme/v1/web/aweme/post/：按 max_cursor 分页的作品列表
+- /aweme/v1/web/aweme/detail/：单个作品详情
+- /s/<代码>/：重定向到用户主页的短链接
+- 视频CDN（单独端口，相当于另一个域名）：支持Range请求，返回带有效MP4头部的视频，
+  可配置响应延迟、限速、按比例返回429和传输中途断开
+
+命令行用法:
+    python -m benchmarks.standin --users 3 --videos 100 --port 8900
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# 视频内容的填充块
+_FILLER = bytes(range(256)) * 256
+# 每次写出的字节数
+_CHUNK_SIZE = 64 * 1024
+# 封面图片内容
+_COVER = b'\xff\xd8\xff\xe0' + b'\0' * 2044
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    """构造MP4 box"""
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def mp4_header(duration: float, width: int = 1080, height: int = 1920) -> bytes:
+    """构造 ftyp + moov + mdat头部，mdat的长度由调用方写入的总大小决定"""
+    mvhd = _box(b'mvhd', struct.pack('>BxxxIIII', 0, 0, 0, 1000, int(duration * 1000)) + b'\0' * 80)
+    matrix = struct.pack('>9i', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+    tkhd = _box(b'tkhd', struct.pack('>BxxxIIIII', 0, 0, 0, 1, 0, 0) + b'\0' * 16 + matrix
+                + struct.pack('>II', width << 16, height << 16))
+    hdlr = _box(b'hdlr', b'\0' * 8 + b'vide' + b'\0' * 13)
+    moov = _box(b'moov', mvhd + _box(b'trak', tkhd + _box(b'mdia', hdlr)))
+    ftyp = _box(b'ftyp', b'isom\0\0\2\0isomiso2avc1mp41')
+    return ftyp + moov
+
+
+def video_id(user_index: int, number: int) -> str:
+    """替身服务器上第 user_index 个用户的第 number 个视频的ID"""
+    return str(7 * 10 ** 18 + user_index * 10 ** 8 + number)
+
+
+class StandinVideo:
+    """替身服务器上的一个视频"""
+
+    def __init__(self, video_id: str, index: int, size: int, duration: float, create_time: int):
+        self.video_id = video_id
+        self.index = index
+        self.duration = duration
+        self.create_time = create_time
+        self.header = mp4_header(duration)
+        # 文件至少能容纳头部和mdat头
+        self.size = max(size, len(self.header) + 8)
+        self.header += struct.pack('>I4s', self.size - len(self.header), b'mdat')
+
+    def read(self, start: int, end: int) -> bytes:
+        """读取 [start, end] 区间的内容"""
+        parts = []
+        if start < len(self.header):
+            parts.append(self.header[start:end + 1])
+            start = len(self.header)
+        while start <= end:
+            offset = (start - len(self.header)) % len(_FILLER)
+            piece = _FILLER[offset:offset + end - start + 1]
+            parts.append(piece)
+            start += len(piece)
+        return b''.join(parts)
+
+
+class StandinUser:
+    """替身服务器上的一个用户"""
+
+    def __init__(self, index: int, videos: List[StandinVideo]):
+        self.index = index
+        self.sec_uid = f"MS4wLjABAAAAstandin{index:06d}"
+        self.uid = str(10 ** 10 + index)
+        self.nickname = f"standin_user_{index}"
+        self.short_code = f"sd{index:04d}"
+        self.videos = videos
+
+
+class DouyinStandin:
+    """抖音本地替身服务器"""
+
+    def __init__(self, users: int = 1, videos_per_user: int = 40, page_size: int = 20,
+                 video_size: int = 256 * 1024, page_padding: int = 64 * 1024, api_latency: float = 0.0,
+                 cdn_latency: float = 0.0, cdn_rate: Optional[float] = None, api_rate_limit_every: int = 0,
+                 cdn_rate_limit_every: int = 0, retry_after: float = 0, disconnect_every: int = 0,
+                 host: str = '127.0.0.1', port: int = 0, cdn_port: int = 0, seed: int = 0):
+        """初始化替身服务器
+
+        Args:
+            users: 用户数
+            videos_per_user: 每个用户的视频数
+            page_size: 作品列表每页条数
+            video_size: 视频平均大小（字节），各视频在 0.5~1.5 倍之间随机
+            page_padding: 用户主页中填充的无关内容字节数，模拟真实页面的解析开销
+            api_latency: 站点接口的响应延迟（秒）
+            cdn_latency: CDN返回响应头前的延迟（秒）
+            cdn_rate: CDN单个连接的传输速率（字节/秒），None 表示不限速
+            api_rate_limit_every: 每 N 个作品接口请求返回一次429，0 表示不返回
+            cdn_rate_limit_every: 每 N 个CDN视频请求返回一次429，0 表示不返回
+            retry_after: 返回429时的 Retry-After（秒）
+            disconnect_every: 每 N 个CDN视频请求在传输一半时断开连接，0 表示不断开
+            host: 监听地址
+            port: 站点端口，0 表示随机
+            cdn_port: CDN端口，0 表示随机
+            seed: 随机种子，相同参数生成相同的数据
+        """
+        self.page_size = page_size
+        self.page_padding = page_padding
+        self.api_latency = api_latency
+        self.cdn_latency = cdn_latency
+        self.cdn_rate = cdn_rate
+        self.api_rate_limit_every = api_rate_limit_every
+        self.cdn_rate_limit_every = cdn_rate_limit_every
+        self.retry_after = retry_after
+        self.disconnect_every = disconnect_every
+        self.host = host
+
+        rng = random.Random(seed)
+        now = int(time.time())
+        self.users: List[StandinUser] = []
+        self._videos: Dict[str, StandinVideo] = {}
+        for index in range(users):
+            videos = []
+            for number in range(videos_per_user):
+                video = StandinVideo(
+                    video_id=video_id(index, number),
+                    index=number,
+                    size=int(video_size * rng.uniform(0.5, 1.5)),
+                    duration=round(rng.uniform(8, 60), 3),
+                    create_time=now - number * 3600
+                )
+                videos.append(video)
+                self._videos[video.video_id] = video
+            self.users.append(StandinUser(index, videos))
+        self._by_id = {key: user for user in self.users for key in (user.sec_uid, user.uid)}
+        self._by_code = {user.short_code: user for user in self.users}
+
+        self._lock = threading.Lock()
+        self._counters = {'api': 0, 'cdn': 0, 'disconnect': 0}
+        self.stats: Dict[str, int] = {}
+        self._servers = [self._make_server(port, _WebHandler), self._make_server(cdn_port, _CDNHandler)]
+        self._threads: List[threading.Thread] = []
+
+    def _make_server(self, port: int, handler) -> ThreadingHTTPServer:
+        server = _Server((self.host, port), handler)
+        server.standin = self
+        return server
+
+    @property
+    def base_url(self) -> str:
+        """站点地址"""
+        return f"http://{self.host}:{self._servers[0].server_port}"
+
+    @property
+    def cdn_url(self) -> str:
+        """CDN地址"""
+        return f"http://{self.host}:{self._servers[1].server_port}"
+
+    @property
+    def short_url_base(self) -> str:
+        """短链接地址前缀"""
+        return f"{self.base_url}/s"
+
+    def downloader_kwargs(self) -> Dict[str, str]:
+        """创建指向替身服务器的下载器所需的参数"""
+        return {'base_url': self.base_url, 'short_url_base': self.short_url_base}
+
+    def user_url(self, index: int = 0) -> str:
+        """用户主页地址"""
+        return f"{self.base_url}/user/{self.users[index].sec_uid}"
+
+    def short_url(self, index: int = 0) -> str:
+        """用户的短链接"""
+        return f"{self.short_url_base}/{self.users[index].short_code}/"
+
+    def start(self) -> 'DouyinStandin':
+        """在后台线程中启动服务器"""
+        for server in self._servers:
+            thread = threading.Thread(target=server.serve_forever, name='standin', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """停止服务器并释放端口，未启动时只释放端口"""
+        for server in self._servers:
+            if self._threads:
+                server.shutdown()
+            server.server_close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def __enter__(self) -> 'DouyinStandin':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def count(self, name: str, amount: int = 1):
+        """更新统计"""
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+
+    def inject(self, kind: str, every: int) -> bool:
+        """按请求序号判断本次请求是否注入故障"""
+        if every <= 0:
+            return False
+        with self._lock:
+            self._counters[kind] += 1
+            return self._counters[kind] % every == 0
+
+    def user_page(self, index: int = 0) -> str:
+        """用户主页HTML"""
+        return self._render_user_page(self.users[index])
+
+    def video_page(self, index: int = 0, cursor: int = 0, count: Optional[int] = None) -> Dict:
+        """作品列表接口的响应数据"""
+        return self._video_page(self.users[index], cursor, count or self.page_size)
+
+    def _render_user_page(self, user: StandinUser) -> str:
+        render_data = {
+            'app': {
+                'user': {
+                    'uid': user.uid,
+                    'sec_uid': user.sec_uid,
+                    'nickname': user.nickname,
+                    'avatar_thumb': {'url_list': [f"{self.cdn_url}/avatar/{user.uid}.jpeg"]},
+                    'signature': '替身服务器用户',
+                    'following_count': 10 + user.index,
+                    'follower_count': 1000 * (user.index + 1),
+                    'total_favorited': 5000 * (user.index + 1),
+                    'aweme_count': len(user.videos)
+                }
+            }
+        }
+        encoded = base64.b64encode(json.dumps(render_data, ensure_ascii=False).encode('utf-8')).decode('ascii')
+        # 填充与用户信息无关的脚本和节点，模拟真实页面的体积
+        filler_item = '{"id": 0, "type": "module", "payload": "' + 'x' * 200 + '"},'
+        filler = filler_item * max(self.page_padding // (len(filler_item) + 40), 0)
+        nodes = '<div class="item"><span>placeholder</span></div>' * max(self.page_padding // 400, 0)
+        return (
+            '<!DOCTYPE html><html><head><meta charset="utf-8"><title>' + user.nickname + '</title>'
+            '<script>window.__modules = [' + filler + '];</script></head><body>'
+            '<div id="root">' + nodes + '</div>'
+            '<script id="RENDER_DATA" type="application/json">' + encoded + '</script>'
+            '</body></html>'
+        )
+
+    def _video_item(self, video: StandinVideo) -> Dict:
+        return {
+            'aweme_id': video.video_id,
+            'desc': f"替身视频 {video.index} #基准测试",
+            'create_time': video.create_time,
+            'video': {
+                'play_addr': {'url_list': [f"{self.cdn_url}/video/{video.video_id}.mp4?sig={video.index}"]},
+                'cover': {'url_list': [f"{self.cdn_url}/cover/{video.video_id}.jpeg"]},
+                'duration': int(video.duration * 1000),
+                'width': 1080,
+                'height': 1920
+            },
+            'statistics': {
+                'comment_count': video.index * 3,
+                'digg_count': video.index * 10,
+                'share_count': video.index
+            }
+        }
+
+    def _video_page(self, user: StandinUser, cursor: int, count: int) -> Dict:
+        items = user.videos[cursor:cursor + count]
+        has_more = cursor + count < len(user.videos)
+        return {
+            'status_code': 0,
+            'aweme_list': [self._video_item(video) for video in items],
+            'has_more': 1 if has_more else 0,
+            'max_cursor': cursor + count if has_more else 0
+        }
+
+
+class _Server(ThreadingHTTPServer):
+    """替身服务器使用的HTTP服务器，压测时需要较大的连接队列"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # 客户端读够数据后提前关闭连接是正常情况，不打印异常
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """替身服务器请求处理的公共部分"""
+
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，关闭Nagle算法避免长连接上的延迟确认等待
+    disable_nagle_algorithm = True
+
+    @property
+    def standin(self) -> DouyinStandin:
+        return self.server.standin
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b'', content_type: str = 'text/plain; charset=utf-8',
+              headers: Optional[List[Tuple[str, str]]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers or []:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+            self.standin.count('bytes_sent', len(body))
+
+    def _send_json(self, data: Dict):
+        self._send(200, json.dumps(data, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def _rate_limited(self):
+        self.standin.count('rate_limited')
+        self._send(429, b'', headers=[('Retry-After', str(self.standin.retry_after))])
+
+
+class _WebHandler(_Handler):
+    """站点请求处理"""
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        standin = self.standin
+        parts = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        if standin.api_latency:
+            time.sleep(standin.api_latency)
+
+        if parts.path == '/':
+            standin.count('home')
+            self._send(200, b'<html><body>douyin</body></html>', 'text/html; charset=utf-8',
+                       [('Set-Cookie', f"ttwid=standin{random.randrange(10 ** 8)}; Path=/")])
+            return
+
+        match = re.match(r'^/s/([^/]+)/?$', parts.path)
+        if match:
+            standin.count('short_url')
+            user = standin._by_code.get(match.group(1))
+            if user is None:
+                self._send(404, b'not found')
+                return
+            self._send(302, b'', headers=[('Location', f"/user/{user.sec_uid}")])
+            return
+
+        match = re.match(r'^/user/([^/?]+)$', parts.path)
+        if match:
+            standin.count('user_page')
+            user = standin._by_id.get(match.group(1))
+            if user is None:
+                self._send(404, b'not found')
+                return
+            self._send(200, standin._render_user_page(user).encode('utf-8'), 'text/html; charset=utf-8', [
+                ('Set-Cookie', f"ttwid=standin{user.uid}; Path=/"),
+                ('Set-Cookie', 'msToken=standin-token; Path=/')
+            ])
+            return
+
+        if parts.path.startswith('/aweme/'):
+            if standin.inject('api', standin.api_rate_limit_every):
+                self._rate_limited()
+                return
+
+        if parts.path == '/aweme/v1/web/aweme/post/':
+            standin.count('video_list')
+            user = standin._by_id.get(query.get('sec_user_id', ''))
+            if user is None:
+                self._send_json({'status_code': 0, 'aweme_list': [], 'has_more': 0, 'max_cursor': 0})
+                return
+            cursor = int(query.get('max_cursor') or 0)
+            count = int(query.get('count') or standin.page_size)
+            self._send_json(standin._video_page(user, cursor, count))
+            return
+
+        if parts.path == '/aweme/v1/web/aweme/detail/':
+            standin.count('video_detail')
+            video = standin._videos.get(query.get('aweme_id', ''))
+            self._send_json({'status_code': 0, 'aweme_detail': standin._video_item(video) if video else None})
+            return
+
+        self._send(404, b'not found')
+
+
+class _CDNHandler(_Handler):
+    """视频CDN请求处理"""
+
+    def do_GET(self):
+        standin = self.standin
+        path = urllib.parse.urlsplit(self.path).path
+        if standin.cdn_latency:
+            time.sleep(standin.cdn_latency)
+
+        match = re.match(r'^/(cover|avatar)/', path)
+        if match:
+            standin.count('cover')
+            self._send(200, _COVER, 'image/jpeg')
+            return
+
+        match = re.match(r'^/video/(\d+)\.mp4$', path)
+        video = standin._videos.get(match.group(1)) if match else None
+        if video is None:
+            self._send(404, b'not found')
+            return
+        if standin.inject('cdn', standin.cdn_rate_limit_every):
+            self._rate_limited()
+            return
+
+        standin.count('video')
+        start, end, status = 0, video.size - 1, 200
+        byte_range = self._parse_range(video.size)
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{video.size}")
+        self.end_headers()
+
+        # 传输一半时断开连接
+        stop_at = end + 1
+        if end > start and standin.inject('disconnect', standin.disconnect_every):
+            standin.count('disconnects')
+            stop_at = start + (end - start + 1) // 2
+            self.close_connection = True
+        self._stream(video, start, stop_at)
+
+    def _parse_range(self, size: int) -> Optional[Tuple[int, int]]:
+        match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range') or '')
+        if not match or not (match.group(1) or match.group(2)):
+            return None
+        if match.group(1):
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else size - 1
+        else:
+            start, end = max(size - int(match.group(2)), 0), size - 1
+        return start, min(end, size - 1)
+
+    def _stream(self, video: StandinVideo, start: int, stop: int):
+        rate = self.standin.cdn_rate
+        position = start
+        try:
+            while position < stop:
+                chunk = video.read(position, min(position + _CHUNK_SIZE, stop) - 1)
+                self.wfile.write(chunk)
+                position += len(chunk)
+                if rate:
+                    time.sleep(len(chunk) / rate)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            self.standin.count('bytes_sent', position - start)
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口：前台运行替身服务器"""
+    parser = argparse.ArgumentParser(description='抖音本地替身服务器')
+    parser.add_argument('--users', type=int, default=3, help='用户数')
+    parser.add_argument('--videos', type=int, default=100, help='每个用户的视频数')
+    parser.add_argument('--video-size', type=int, default=1024 * 1024, help='视频平均大小（字节）')
+    parser.add_argument('--port', type=int, default=8900, help='站点端口')
+    parser.add_argument('--cdn-port', type=int, default=8901, help='CDN端口')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='站点接口延迟（秒）')
+    parser.add_argument('--cdn-latency', type=float, default=0.0, help='CDN响应延迟（秒）')
+    parser.add_argument('--cdn-rate', type=float, default=None, help='CDN单连接速率（字节/秒）')
+    parser.add_argument('--api-429-every', type=int, default=0, help='每N个作品接口请求返回一次429')
+    parser.add_argument('--cdn-429-every', type=int, default=0, help='每N个视频请求返回一次429')
+    parser.add_argument('--disconnect-every', type=int, default=0, help='每N个视频请求中途断开')
+    args = parser.parse_args(argv)
+
+    standin = DouyinStandin(
+        users=args.users, videos_per_user=args.videos, video_size=args.video_size, port=args.port,
+        cdn_port=args.cdn_port, api_latency=args.api_latency, cdn_latency=args.cdn_latency,
+        cdn_rate=args.cdn_rate, api_rate_limit_every=args.api_429_every,
+        cdn_rate_limit_every=args.cdn_429_every, disconnect_every=args.disconnect_every
+    )
+    with standin:
+        print(f"站点: {standin.base_url}")
+        print(f"CDN: {standin.cdn_url}")
+        for index in range(len(standin.users)):
+            print(f"用户 {index}: {standin.user_url(index)}  短链接: {standin.short_url(index)}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
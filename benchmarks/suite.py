@@ -0,0 +1,401 @@
+"""
+离线性能基准测试
+基于本地替身服务器运行下载和解析场景，统计吞吐量、P50/P99耗时和内存峰值，
+结果保存为JSON，可以与之前保存的基线对比找出性能回退。
+
+命令行用法:
+    python -m benchmarks.suite                       # 运行全部场景并保存结果
+    python -m benchmarks.suite --quick -s parse_user_page
+    python -m benchmarks.suite --baseline data/benchmarks/baseline.json --fail-on-regression
+"""
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.standin import DouyinStandin, StandinVideo
+
+# 项目根目录和默认的结果目录
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path('data/benchmarks')
+
+# 指标名后缀决定比较方向：越大越好或越小越好，其余指标只作记录
+HIGHER_IS_BETTER = ('_per_sec', '_mb_per_sec')
+LOWER_IS_BETTER = ('_ms', '_mb', '_seconds')
+
+# 已注册的场景
+SCENARIOS: Dict[str, Dict] = {}
+
+
+def scenario(name: str, standin: Optional[Dict] = None, quick_standin: Optional[Dict] = None,
+             memory: bool = True):
+    """注册基准测试场景
+
+    Args:
+        name: 场景名
+        standin: 替身服务器参数，None 表示场景不需要服务器
+        quick_standin: --quick 时覆盖的替身服务器参数
+        memory: 是否统计内存峰值，在子进程中运行的场景统计本进程内存没有意义
+    """
+    def decorator(func: Callable[['BenchContext'], Dict]):
+        SCENARIOS[name] = {'func': func, 'standin': standin, 'quick_standin': quick_standin or {},
+                           'memory': memory}
+        return func
+    return decorator
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """按最近秩计算分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def latency_stats(seconds: List[float], prefix: str = '') -> Dict[str, float]:
+    """耗时列表的P50/P99（毫秒）"""
+    return {
+        f'{prefix}p50_ms': round(percentile(seconds, 0.5) * 1000, 3),
+        f'{prefix}p99_ms': round(percentile(seconds, 0.99) * 1000, 3)
+    }
+
+
+class BenchContext:
+    """场景运行环境"""
+
+    def __init__(self, standin: Optional[DouyinStandin], work_dir: Path, quick: bool):
+        self.standin = standin
+        self.work_dir = work_dir
+        self.quick = quick
+        self._dirs = 0
+
+    def fresh_dir(self) -> Path:
+        """新的空目录，同一场景多次运行时下载不会被跳过"""
+        self._dirs += 1
+        path = self.work_dir / f"run{self._dirs}"
+        path.mkdir(parents=True)
+        return path
+
+    def downloader(self, **kwargs):
+        """创建指向替身服务器的下载器，请求间隔交给高速率的限速器，Cookies写入临时目录"""
+        from app.core.downloader import DouyinDownloader
+        from app.utils.rate_limiter import RateLimiter
+
+        root = self.fresh_dir()
+        downloader = DouyinDownloader(**self.standin.downloader_kwargs(), download_root=str(root / 'downloads'),
+                                      **kwargs)
+        downloader.cookies_file = root / 'cookies.pkl'
+        downloader.rate_limiter = RateLimiter(rate=100000, burst=100000)
+        return downloader
+
+    def iterations(self, full: int, quick: int) -> int:
+        """按运行模式选择迭代次数"""
+        return quick if self.quick else full
+
+
+def _download_run(ctx: BenchContext, planner_kwargs: Optional[Dict] = None) -> Dict:
+    """下载全部用户的视频，按 download 区间统计每个视频的耗时"""
+    from app.utils.tracing import tracer
+
+    downloader = ctx.downloader(session_pool_size=4)
+    planner = None
+    if planner_kwargs is not None:
+        from app.core.planner import DownloadPlanner
+        planner = DownloadPlanner(downloader, **planner_kwargs)
+
+    results = []
+    started = time.perf_counter()
+    with tracer.record() as run:
+        for index in range(len(ctx.standin.users)):
+            results.extend(downloader.download_all_videos(ctx.standin.user_url(index), planner=planner))
+    elapsed = time.perf_counter() - started
+
+    downloads = [span for span in run.spans if span.name == 'download']
+    total_bytes = sum(span.args.get('bytes') or 0 for span in downloads)
+    succeeded = sum(1 for item in results if item['status'] == 'success')
+    stages = run.summary()
+    return {
+        'elapsed_seconds': round(elapsed, 4),
+        'videos': len(results),
+        'succeeded': succeeded,
+        'failed': sum(1 for item in results if item['status'] == 'failed'),
+        'videos_per_sec': round(succeeded / elapsed, 2),
+        'throughput_mb_per_sec': round(total_bytes / elapsed / 1024 / 1024, 2),
+        **latency_stats([span.duration_ns / 1e9 for span in downloads], 'download_'),
+        **latency_stats([span.duration_ns / 1e9 for span in run.spans if span.name == 'video_list_page'],
+                        'video_list_'),
+        'stage_self_seconds': {name: item['self_seconds'] for name, item in stages.items()}
+    }
+
+
+@scenario('download_all', standin={'users': 2, 'videos_per_user': 60, 'video_size': 512 * 1024},
+          quick_standin={'videos_per_user': 20, 'video_size': 128 * 1024})
+def bench_download_all(ctx: BenchContext) -> Dict:
+    """逐个下载用户的全部视频"""
+    return _download_run(ctx)
+
+
+@scenario('download_planned', standin={'users': 2, 'videos_per_user': 60, 'video_size': 512 * 1024},
+          quick_standin={'videos_per_user': 20, 'video_size': 128 * 1024})
+def bench_download_planned(ctx: BenchContext) -> Dict:
+    """先探测大小再按规划下载，较大的视频分段并发下载"""
+    return _download_run(ctx, {'probe_workers': 8, 'segment_threshold': 640 * 1024, 'segments': 4,
+                               'disk_reserve': 0})
+
+
+@scenario('download_faults', standin={'users': 1, 'videos_per_user': 60, 'video_size': 256 * 1024,
+                                      'cdn_latency': 0.005, 'api_rate_limit_every': 3,
+                                      'cdn_rate_limit_every': 7, 'disconnect_every': 11},
+          quick_standin={'videos_per_user': 20})
+def bench_download_faults(ctx: BenchContext) -> Dict:
+    """上游返回429、传输中途断开时的下载"""
+    return _download_run(ctx)
+
+
+def _micro(ctx: BenchContext, func: Callable[[], object], full: int, quick: int) -> Dict:
+    """重复调用函数，统计每秒次数和单次耗时分位数"""
+    func()  # 预热
+    timings = []
+    started = time.perf_counter()
+    for _ in range(ctx.iterations(full, quick)):
+        begin = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - started
+    return {
+        'iterations': len(timings),
+        'ops_per_sec': round(len(timings) / elapsed, 2),
+        'mean_ms': round(statistics.mean(timings) * 1000, 4),
+        **latency_stats(timings)
+    }
+
+
+@scenario('parse_user_page')
+def bench_parse_user_page(ctx: BenchContext) -> Dict:
+    """解析用户主页HTML（约256KB）"""
+    from app.core.downloader import DouyinDownloader
+
+    page_standin = DouyinStandin(users=1, videos_per_user=0, page_padding=256 * 1024)
+    html = page_standin.user_page(0)
+    page_standin.stop()
+    url = 'https://www.douyin.com/user/MS4wLjABAAAAstandin000000'
+    downloader = DouyinDownloader()
+    return {'page_kb': len(html) // 1024, **_micro(ctx, lambda: downloader._parse_user_page(html, url), 200, 20)}
+
+
+@scenario('parse_video_list')
+def bench_parse_video_list(ctx: BenchContext) -> Dict:
+    """解析一页作品列表JSON（20条）并转换为视频信息"""
+    from app.core.downloader import DouyinDownloader
+
+    page_standin = DouyinStandin(users=1, videos_per_user=20)
+    text = json.dumps(page_standin.video_page(0), ensure_ascii=False)
+    page_standin.stop()
+
+    def parse():
+        data = json.loads(text)
+        return [DouyinDownloader._to_video_info(item) for item in data.get('aweme_list', [])]
+
+    return _micro(ctx, parse, 5000, 200)
+
+
+@scenario('parse_moov')
+def bench_parse_moov(ctx: BenchContext) -> Dict:
+    """从视频头部解析时长和分辨率"""
+    from app.utils.mp4 import iter_boxes, parse_moov
+
+    head = StandinVideo('1', 0, 1024 * 1024, 30.0, 0).read(0, 64 * 1024 - 1)
+
+    def parse():
+        for box_type, start, payload_start, end in iter_boxes(head, 0, len(head)):
+            if box_type == b'moov':
+                return parse_moov(head, payload_start, end)
+
+    return _micro(ctx, parse, 20000, 500)
+
+
+# 启动开销场景在新解释器中执行的语句
+STARTUP_STATEMENTS = {
+    'import_app': 'import app',
+    'import_downloader': 'import app.core.downloader',
+    'import_failures': 'import app.core.failures',
+    'create_app': 'from app import create_app; from app.config.settings import config; create_app(config["testing"])'
+}
+
+
+@scenario('startup', memory=False)
+def bench_startup(ctx: BenchContext) -> Dict:
+    """命令行和gunicorn工作进程的启动开销：在新解释器中执行导入，扣除解释器自身的启动时间，取多次运行的最小值"""
+    runs = ctx.iterations(10, 3)
+
+    def spawn(statement: str) -> float:
+        best = None
+        for _ in range(runs):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, '-c', statement], cwd=ROOT_DIR, check=True, capture_output=True)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    interpreter = spawn('pass')
+    # 解释器启动时间不带单位后缀，只作记录不参与对比
+    metrics = {'interpreter_startup': round(interpreter * 1000, 3)}
+    for name, statement in STARTUP_STATEMENTS.items():
+        metrics[f'{name}_ms'] = round(max(spawn(statement) - interpreter, 0) * 1000, 3)
+    return metrics
+
+
+def run_scenario(name: str, quick: bool = False, memory: bool = True) -> Dict:
+    """运行单个场景：先计时，再在 tracemalloc 下运行一次统计内存峰值
+
+    Returns:
+        Dict: 场景指标，memory=True 时包含 peak_memory_mb
+    """
+    spec = SCENARIOS[name]
+    standin_kwargs = None
+    if spec['standin'] is not None:
+        standin_kwargs = dict(spec['standin'])
+        if quick:
+            standin_kwargs.update(spec['quick_standin'])
+
+    work_dir = Path(tempfile.mkdtemp(prefix=f'bench-{name}-'))
+    standin = DouyinStandin(**standin_kwargs).start() if standin_kwargs is not None else None
+    try:
+        ctx = BenchContext(standin, work_dir, quick)
+        metrics = spec['func'](ctx)
+        if memory and spec['memory']:
+            tracemalloc.start()
+            try:
+                spec['func'](BenchContext(standin, work_dir / 'memory', True))
+                metrics['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 3)
+            finally:
+                tracemalloc.stop()
+        if standin is not None:
+            metrics['standin'] = dict(standin.stats)
+        return {'config': standin_kwargs or {}, 'metrics': metrics}
+    finally:
+        if standin is not None:
+            standin.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_suite(names: Optional[List[str]] = None, quick: bool = False, memory: bool = True) -> Dict:
+    """运行多个场景，返回包含环境信息的结果"""
+    names = names or list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"未知的场景: {', '.join(sorted(unknown))}")
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'commit': _git_commit(),
+            'quick': quick
+        },
+        'scenarios': {name: run_scenario(name, quick, memory) for name in names}
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.1) -> List[Dict]:
+    """与基线对比，按指标名后缀判断方向，变差超过 threshold 的标记为回退
+
+    Returns:
+        List[Dict]: 每个可比较指标一行：scenario、metric、baseline、current、change、regression
+    """
+    rows = []
+    for name, result in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        for metric, value in result['metrics'].items():
+            base_value = base['metrics'].get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(base_value, (int, float)) or not base_value:
+                continue
+            if metric.endswith(HIGHER_IS_BETTER):
+                worse = (base_value - value) / base_value
+            elif metric.endswith(LOWER_IS_BETTER):
+                worse = (value - base_value) / base_value
+            else:
+                continue
+            rows.append({
+                'scenario': name,
+                'metric': metric,
+                'baseline': base_value,
+                'current': value,
+                'change': round((value - base_value) / base_value, 4),
+                'regression': worse > threshold
+            })
+    return rows
+
+
+def save_results(results: Dict, path: Optional[Path] = None) -> Path:
+    """保存结果，默认保存到 data/benchmarks/<时间>.json"""
+    if path is None:
+        path = RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    return path
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _print_results(results: Dict):
+    for name, result in results['scenarios'].items():
+        print(f"== {name}")
+        for metric, value in result['metrics'].items():
+            if not isinstance(value, dict):
+                print(f"   {metric:<28} {value}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口，有性能回退且指定 --fail-on-regression 时返回1"""
+    parser = argparse.ArgumentParser(description='离线性能基准测试')
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS), help='只运行指定场景，可重复')
+    parser.add_argument('--quick', action='store_true', help='使用较小的数据量和迭代次数')
+    parser.add_argument('--no-memory', action='store_true', help='跳过内存统计')
+    parser.add_argument('--output', type=Path, help='结果文件路径，默认 data/benchmarks/<时间>.json')
+    parser.add_argument('--baseline', type=Path, help='对比的基线结果文件')
+    parser.add_argument('--threshold', type=float, default=0.1, help='视为回退的变差比例，默认0.1')
+    parser.add_argument('--fail-on-regression', action='store_true', help='有回退时以非零状态退出')
+    args = parser.parse_args(argv)
+
+    # 基准测试期间只输出警告以上的日志，避免日志输出影响结果
+    from app.utils.log import setup_logging
+    setup_logging('WARNING')
+
+    results = run_suite(args.scenario, quick=args.quick, memory=not args.no_memory)
+    _print_results(results)
+    print(f"结果已保存到: {save_results(results, args.output)}")
+
+    if args.baseline is None:
+        return 0
+    rows = compare(json.loads(args.baseline.read_text(encoding='utf-8')), results, args.threshold)
+    regressions = [row for row in rows if row['regression']]
+    print(f"\n与基线对比（{args.baseline}）:")
+    for row in rows:
+        flag = '  回退' if row['regression'] else ''
+        metric = f"{row['scenario']}.{row['metric']}"
+        print(f"   {metric:<44} {row['baseline']} -> {row['current']} ({row['change']:+.1%}){flag}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+gunicorn 生产环境配置
+用法: gunicorn -c gunicorn.conf.py
+
+接口的耗时主要花在等待抖音上游响应，属于I/O密集型，因此默认使用单进程加多线程（gthread）：
+- 线程在等待上游时释放GIL，一个进程即可同时处理几十个请求
+- 响应缓存、请求合并、会话池和熔断器都是进程内共享的，单进程时命中率最高、对上游的请求最少
+- 进度事件流（SSE）和运行指标也是进程内的：下载事件只推送给同一进程中的订阅者，
+  /metrics 只返回处理该请求的进程的数据。调大 GUNICORN_WORKERS 后这两个接口在不同请求间看到的内容不一致，
+  需要更多CPU时更适合运行多个单进程实例，分别监听端口并分别抓取指标
+- 进度事件流长期占用一个线程，线程数要大于 PROGRESS_STREAM_MAX_SUBSCRIBERS
+所有参数都可以通过环境变量覆盖
+"""
+import os
+
+wsgi_app = 'main:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# 进程数：默认1个，见上方关于进程内状态的说明
+workers = int(os.environ.get('GUNICORN_WORKERS') or 1)
+worker_class = 'gthread'
+# 每个进程的线程数，决定单进程可以同时等待的上游请求数
+threads = int(os.environ.get('GUNICORN_THREADS') or 32)
+
+# gthread 下 timeout 只用于检测卡死的进程，不限制单个请求，SSE长连接不受影响
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 60)
+graceful_timeout = 30
+# 前置负载均衡通常会复用连接
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE') or 5)
+backlog = 2048
+
+# 定期重启进程，避免长期运行的内存增长；加入随机量避免所有进程同时重启
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 10000)
+max_requests_jitter = 1000
+
+raw_env = [f"FLASK_ENV={os.environ.get('FLASK_ENV', 'production')}"]
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
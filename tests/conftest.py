@@ -0,0 +1,125 @@
+"""
+测试共用的fixture
+"""
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+from loguru import logger
+
+
+class LocalServer(ThreadingHTTPServer):
+    """本地HTTP服务器替身，测试只声明需要的响应
+
+    - add() 按路径登记固定响应，路径为 '*' 时作为其他路径的默认响应，未登记的路径返回404
+    - script 中预设的 (状态码, 响应头) 按顺序优先返回，用完后再按路径响应
+    - 登记时指定 ranges=True 的200响应支持Range请求，返回206和对应区间
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.base = f"http://127.0.0.1:{self.server_port}"
+        self.lock = threading.Lock()
+        self.routes: Dict[str, Tuple[int, bytes, Dict[str, str], bool]] = {}
+        self.script: List[Tuple[int, Dict[str, str]]] = []
+        # 收到的请求路径（不含查询参数）、请求头、Range区间和发送的响应体字节数
+        self.hits: List[str] = []
+        self.request_headers: List[Dict[str, str]] = []
+        self.ranges: List[Tuple[str, int, int]] = []
+        self.sent = 0
+
+    def url(self, path: str) -> str:
+        return self.base + path
+
+    def add(self, path: str, body: bytes = b'', status: int = 200, headers: Optional[Dict[str, str]] = None,
+            ranges: bool = False):
+        """登记路径的响应
+
+        Args:
+            path: 请求路径，'*' 表示默认响应
+            body: 响应体
+            status: 状态码
+            headers: 额外的响应头
+            ranges: 是否支持Range请求
+        """
+        self.routes[path] = (status, body, headers or {}, ranges)
+
+    def count(self, path: str) -> int:
+        """指定路径收到的请求数"""
+        with self.lock:
+            return self.hits.count(path)
+
+    def respond(self, handler: BaseHTTPRequestHandler, send_body: bool):
+        path = handler.path.split('?')[0]
+        with self.lock:
+            self.hits.append(path)
+            self.request_headers.append(dict(handler.headers))
+            scripted = self.script.pop(0) if self.script else None
+        if scripted is not None:
+            status, headers = scripted
+            return self._send(handler, status, b'', headers, send_body)
+
+        route = self.routes.get(path) or self.routes.get('*')
+        if route is None:
+            return self._send(handler, 404, b'', {}, send_body)
+        status, body, headers, ranges = route
+        match = re.match(r'bytes=(\d+)-(\d*)', handler.headers.get('Range', ''))
+        if status == 200 and ranges and match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else len(body) - 1, len(body) - 1)
+            with self.lock:
+                self.ranges.append((path, start, end))
+            headers = dict(headers, **{'Content-Range': f'bytes {start}-{end}/{len(body)}', 'Accept-Ranges': 'bytes'})
+            return self._send(handler, 206, body[start:end + 1], headers, send_body)
+        return self._send(handler, status, body, headers, send_body)
+
+    def _send(self, handler: BaseHTTPRequestHandler, status: int, body: bytes, headers: Dict[str, str],
+              send_body: bool):
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        if not send_body:
+            return
+        try:
+            handler.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        with self.lock:
+            self.sent += len(body)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.respond(self, send_body=True)
+
+    def do_HEAD(self):
+        self.server.respond(self, send_body=False)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    """启动本地HTTP服务器，测试结束后关闭"""
+    server = LocalServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cli_logging():
+    """命令行入口会替换loguru的输出，测试结束后恢复为写入当前的 sys.stderr"""
+    yield
+    logger.remove()
+    logger.add(lambda message: sys.stderr.write(message))
@@ -0,0 +1,88 @@
+"""
+带宽整形器的测试用例
+"""
+import threading
+import time
+
+import pytest
+
+from app.utils.bandwidth import (PRIORITY_BACKFILL, PRIORITY_INCREMENTAL, PRIORITY_INTERACTIVE,
+                                 BandwidthShaper)
+
+CHUNK = 8 * 1024
+
+
+def _run(shaper, priorities, duration):
+    """每个优先级一个线程持续按块消耗带宽，返回各线程传输的字节数"""
+    totals = {priority: 0 for priority in priorities}
+    deadline = time.monotonic() + duration
+
+    def worker(priority):
+        while time.monotonic() < deadline:
+            shaper.consume(CHUNK, priority)
+            totals[priority] += CHUNK
+
+    threads = [threading.Thread(target=worker, args=(p,)) for p in priorities]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return totals
+
+
+def test_unlimited_does_not_wait():
+    """测试未设置上限时不等待"""
+    shaper = BandwidthShaper()
+    assert not shaper.enabled
+    assert shaper.consume(10 ** 9) == 0.0
+
+
+def test_global_rate_limit():
+    """测试全局速率上限"""
+    shaper = BandwidthShaper(rate=1024 * 1024, burst_seconds=0.1)
+    totals = _run(shaper, [PRIORITY_BACKFILL], 0.5)
+    assert 0.35 * 1024 * 1024 < totals[PRIORITY_BACKFILL] < 0.75 * 1024 * 1024
+
+
+def test_weighted_fair_sharing():
+    """测试同时传输时按权重分配，空闲类别的份额让给其他类别"""
+    shaper = BandwidthShaper(rate=2 * 1024 * 1024, burst_seconds=0.05)
+    totals = _run(shaper, [PRIORITY_INTERACTIVE, PRIORITY_BACKFILL], 0.8)
+    ratio = totals[PRIORITY_INTERACTIVE] / totals[PRIORITY_BACKFILL]
+    assert 4 < ratio < 14
+
+    stats = shaper.stats()
+    assert stats[PRIORITY_INTERACTIVE]['rate'] > stats[PRIORITY_BACKFILL]['rate']
+    time.sleep(1.1)
+    alone = _run(shaper, [PRIORITY_BACKFILL], 0.4)
+    assert alone[PRIORITY_BACKFILL] > 0.5 * 1024 * 1024
+
+
+def test_runtime_caps():
+    """测试运行时设置类别上限，多出的带宽分给其他类别"""
+    shaper = BandwidthShaper(rate=2 * 1024 * 1024, burst_seconds=0.05)
+    shaper.set_cap(PRIORITY_INTERACTIVE, 256 * 1024)
+    totals = _run(shaper, [PRIORITY_INTERACTIVE, PRIORITY_INCREMENTAL], 0.8)
+    assert totals[PRIORITY_INTERACTIVE] < 0.5 * 1024 * 1024
+    assert totals[PRIORITY_INCREMENTAL] > 0.9 * 1024 * 1024
+
+    shaper.set_rate(None)
+    shaper.set_cap(PRIORITY_INTERACTIVE, None)
+    assert not shaper.enabled
+
+
+def test_configure_validates_before_applying():
+    """测试批量调整时有无效值则不做任何修改，取消上限后恢复不限速"""
+    shaper = BandwidthShaper()
+    with pytest.raises(ValueError):
+        shaper.configure(weights={PRIORITY_BACKFILL: 2}, caps={PRIORITY_INTERACTIVE: 0})
+    assert shaper.stats()[PRIORITY_BACKFILL]['weight'] == 1
+
+    shaper.configure(weights={PRIORITY_BACKFILL: 2}, caps={PRIORITY_INTERACTIVE: 1024})
+    stats = shaper.stats()
+    assert stats[PRIORITY_BACKFILL]['weight'] == 2
+    assert stats[PRIORITY_INTERACTIVE]['cap'] == 1024
+    assert shaper.enabled
+
+    shaper.configure(caps={PRIORITY_INTERACTIVE: None})
+    assert not shaper.enabled
@@ -0,0 +1,96 @@
+"""
+封面抓取的测试用例
+"""
+import sqlite3
+
+import pytest
+from app.core.covers import CoverFetcher, cover_key
+from app.core.downloader import DouyinDownloader
+
+IMAGES = {
+    '/img/a.jpeg': b'\xff\xd8 image a',
+    '/img/b.jpeg': b'\xff\xd8 image b',
+    '/img/b-copy.jpeg': b'\xff\xd8 image b'
+}
+
+
+@pytest.fixture
+def server(http_server):
+    """返回图片的本地图片服务器，未登记的图片返回404"""
+    for path, body in IMAGES.items():
+        http_server.add(path, body, headers={'Content-Type': 'image/jpeg'})
+    return http_server
+
+
+@pytest.fixture
+def downloader(server, tmp_path):
+    """站点地址指向本地服务器的下载器"""
+    downloader = DouyinDownloader(base_url=server.base)
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    return downloader
+
+
+def test_cover_key_ignores_signature_and_host():
+    """测试去重键忽略签名参数和CDN节点"""
+    assert cover_key('https://p3-sign.douyinpic.com/obj/abc.jpeg?x-expires=1&x-signature=a') == \
+        cover_key('https://p9-sign.douyinpic.com/obj/abc.jpeg?x-expires=2&x-signature=b')
+
+
+def test_fetch_dedup_and_cache(server, downloader, tmp_path):
+    """测试按URL和内容哈希去重，再次运行时命中缓存"""
+    fetcher = CoverFetcher(downloader, str(tmp_path / 'covers'), workers=4, rate=1000)
+    videos = [
+        {'video_id': '1', 'cover': server.base + '/img/a.jpeg?x-signature=1'},
+        {'video_id': '2', 'cover': server.base + '/img/a.jpeg?x-signature=2'},
+        {'video_id': '3', 'cover': server.base + '/img/b.jpeg'},
+        {'video_id': '4', 'cover': server.base + '/img/b-copy.jpeg'},
+        {'video_id': '5', 'cover': server.base + '/img/missing.jpeg'},
+        {'video_id': '6', 'cover': None}
+    ]
+    paths = fetcher.fetch_all(videos)
+    assert paths['1'] == paths['2']
+    assert paths['3'] == paths['4']
+    assert paths['1'].endswith('.jpg')
+    assert paths['5'] is None and paths['6'] is None
+    assert server.count('/img/a.jpeg') == 1
+    assert fetcher.stats()['deduplicated'] == 1
+    assert len(list((tmp_path / 'covers' / 'objects').rglob('*.jpg'))) == 2
+    fetcher.close()
+
+    again = CoverFetcher(downloader, str(tmp_path / 'covers'), rate=1000)
+    again.submit(videos[:4])
+    stats = again.wait()
+    assert stats['cached'] == 4 and stats['fetched'] == 0
+    assert server.count('/img/a.jpeg') == 1
+    again.close()
+
+
+def test_fetch_uses_downloader_retry_and_referer(server, downloader, tmp_path):
+    """测试封面请求遵守Retry-After重试，Referer取自下载器的站点地址"""
+    server.script = [(429, {'Retry-After': '0'})]
+    fetcher = CoverFetcher(downloader, str(tmp_path / 'covers'), rate=1000)
+    assert fetcher.fetch(server.base + '/img/a.jpeg') is not None
+    assert server.count('/img/a.jpeg') == 2
+    assert all(headers['Referer'] == server.base + '/' for headers in server.request_headers)
+
+    # 域名熔断后不再发出请求
+    downloader.breakers.get(server.base.split('//')[1]).record_failure(cooldown=60)
+    assert fetcher.fetch(server.base + '/img/b.jpeg') is None
+    assert server.count('/img/b.jpeg') == 0
+    assert fetcher.stats()['failed'] == 1
+    fetcher.close()
+
+
+def test_close_releases_connections(server, downloader, tmp_path):
+    """测试关闭时释放线程池中各线程的数据库连接，之后仍可以查询"""
+    fetcher = CoverFetcher(downloader, str(tmp_path / 'covers'), workers=4, rate=1000)
+    fetcher.fetch_all([{'video_id': str(i), 'cover': server.base + path} for i, path in enumerate(IMAGES)])
+    conns = list(fetcher._conns)
+    assert len(conns) > 1
+    fetcher.close()
+    assert fetcher._conns == []
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+    assert fetcher.lookup(server.base + '/img/a.jpeg') is not None
+    fetcher.close()
@@ -0,0 +1,108 @@
+"""
+多用户批量抓取的测试用例
+"""
+import json
+import threading
+import time
+from pathlib import Path
+
+from app.config.settings import Config
+from app.core.crawler import BatchCrawler, main
+from app.core.resilience import RequestError
+from benchmarks.standin import DouyinStandin
+
+
+class FakeDownloader:
+    """按页返回固定视频数量的下载器替身"""
+
+    def __init__(self, videos_per_user, page_size=5):
+        self.videos_per_user = videos_per_user
+        self.page_size = page_size
+        self.rate_limiter = None
+        self.order = []
+        self.lock = threading.Lock()
+        # 每个用户的视频列表接口接下来失败的次数
+        self.list_failures = {}
+
+    def prepare_user_download(self, user_url):
+        if user_url == 'bad':
+            raise Exception("无效的用户URL")
+        return {'user_id': user_url, 'nickname': user_url}, Path('unused')
+
+    def get_video_list(self, user_id, max_cursor=0):
+        if self.list_failures.get(user_id, 0) > 0:
+            self.list_failures[user_id] -= 1
+            raise RequestError("获取视频列表失败: 503", status_code=503)
+        total = self.videos_per_user[user_id]
+        start = max_cursor
+        end = min(start + self.page_size, total)
+        videos = [{'video_id': f'{user_id}-{i}', 'title': str(i), 'play_url': ''} for i in range(start, end)]
+        return videos, (end if end < total else 0)
+
+    def download_one_video(self, video, download_dir):
+        time.sleep(0.001)
+        with self.lock:
+            self.order.append(video['video_id'].split('-')[0])
+        return {'video_id': video['video_id'], 'title': video['title'], 'status': 'success'}
+
+
+def test_all_videos_downloaded():
+    """测试所有用户的视频都被下载，失败用户不影响其他用户"""
+    downloader = FakeDownloader({'a': 12, 'b': 3})
+    crawler = BatchCrawler(downloader, max_workers=4)
+    results = crawler.run(['a', 'b', 'bad'])
+    assert len(results['a']) == 12
+    assert len(results['b']) == 3
+    assert results['bad'] == []
+    assert crawler.creators['bad'].state == 'failed'
+    overall = crawler.progress()
+    assert overall['success'] == 15
+    assert overall['creators_done'] == 3
+    # 累计值与逐个用户汇总的结果一致
+    creators = crawler.creators.values()
+    assert overall['discovered'] == sum(c.discovered for c in creators) == 15
+    assert overall['completed'] == sum(c.completed for c in creators)
+
+
+def test_round_robin_fairness():
+    """测试视频很多的用户不会让其他用户饿死"""
+    downloader = FakeDownloader({'big': 200, 'small': 4})
+    crawler = BatchCrawler(downloader, max_workers=1)
+    crawler.run(['big', 'small'])
+    last_small = max(i for i, user in enumerate(downloader.order) if user == 'small')
+    assert last_small < 20
+
+
+def test_progress_callback():
+    """测试进度回调"""
+    events = []
+    downloader = FakeDownloader({'a': 3})
+    BatchCrawler(downloader, max_workers=2, on_progress=lambda state, overall: events.append(state)).run(['a'])
+    assert events[-1]['state'] == 'done'
+    assert events[-1]['completed'] == 3
+
+
+def test_list_failure_retried_then_marked_failed():
+    """测试视频列表失败时重试该页，重试用完后用户标记为失败而不是完成"""
+    downloader = FakeDownloader({'a': 12, 'b': 12})
+    downloader.list_failures = {'a': 2, 'b': 10}
+    crawler = BatchCrawler(downloader, max_workers=2, list_retries=2)
+    results = crawler.run(['a', 'b'])
+    assert len(results['a']) == 12
+    assert crawler.creators['a'].state == 'done'
+    assert results['b'] == []
+    assert crawler.creators['b'].state == 'failed'
+
+
+def test_cli(tmp_path, monkeypatch, capsys, cli_logging):
+    """测试命令行入口按配置访问站点，下载完成后输出汇总进度"""
+    with DouyinStandin(users=2, videos_per_user=3, video_size=1024) as standin:
+        monkeypatch.setattr(Config, 'DOUYIN_BASE_URL', standin.base_url)
+        monkeypatch.setattr(Config, 'DOUYIN_SHORT_URL_BASE', standin.short_url_base)
+        monkeypatch.setattr(Config, 'COOKIES_FILE', tmp_path / 'cookies.pkl')
+        main([standin.user_url(0), standin.user_url(1), '--download-root', str(tmp_path / 'downloads'),
+              '--rate', '100', '--log-level', 'WARNING'])
+    output = json.loads(capsys.readouterr().out)
+    assert output['overall']['success'] == 6
+    assert len(output['creators']) == 2
+    assert len(list((tmp_path / 'downloads').rglob('*.mp4'))) == 6
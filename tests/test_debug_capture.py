@@ -0,0 +1,40 @@
+"""
+调试抓取的测试用例
+"""
+from app.core.downloader import DouyinDownloader
+from app.utils.debug_capture import DebugCapture
+from app.utils.rate_limiter import RateLimiter
+from benchmarks.standin import DouyinStandin
+
+
+def test_debug_capture_ring_buffer(tmp_path):
+    """测试调试抓取默认关闭，开启后在后台写入并按文件数和字节数淘汰最旧的文件"""
+    capture = DebugCapture(tmp_path / 'captures', max_files=3, max_bytes=250)
+    assert not capture.capture('user_page', b'x' * 10)
+
+    capture.configure(sample_rate=1.0)
+    assert not capture.capture('video_list', b'x', error=True)
+    for index in range(5):
+        assert capture.capture('user_page', bytes([48 + index]) * 100, suffix='.html')
+    capture.flush()
+
+    files = sorted((tmp_path / 'captures').iterdir())
+    assert [path.read_bytes()[:1] for path in files] == [b'3', b'4']
+    assert capture.stats()['written'] == 5
+    assert capture.stats()['bytes'] == 200
+
+
+def test_downloader_captures_responses(tmp_path):
+    """测试下载器把用户主页和视频列表响应交给调试抓取，而不是每次写固定文件"""
+    with DouyinStandin(videos_per_user=5) as standin:
+        downloader = DouyinDownloader(**standin.downloader_kwargs())
+        downloader.cookies_file = tmp_path / 'cookies.pkl'
+        downloader.rate_limiter = RateLimiter(rate=10000, burst=10000)
+        downloader.debug_capture = DebugCapture(tmp_path / 'captures', sample_rate=1.0)
+        assert downloader.get_user_info(standin.user_url(0))
+        assert len(downloader.get_video_list(standin.users[0].sec_uid)[0]) == 5
+    downloader.debug_capture.flush()
+
+    names = sorted(path.name for path in (tmp_path / 'captures').iterdir())
+    assert len(names) == 2
+    assert names[0].endswith('-user_page.html') and names[1].endswith('-video_list.json')
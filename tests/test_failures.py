@@ -0,0 +1,82 @@
+"""
+下载失败台账的测试用例
+"""
+import json
+
+import pytest
+from app.core.downloader import DouyinDownloader
+from app.core.failures import (REASON_HTTP_ERROR, REASON_NETWORK, REASON_UNAVAILABLE, REASON_URL_EXPIRED,
+                               STATUS_ABANDONED, STATUS_FAILED, STATUS_RESOLVED, FailureLedger, main)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    """失败台账"""
+    return FailureLedger(str(tmp_path / 'failures.db'), max_attempts=3)
+
+
+@pytest.fixture
+def cdn(http_server):
+    """签名过期的地址返回403，新地址返回视频内容"""
+    http_server.add('/expired.mp4', status=403)
+    http_server.add('*', b'video-bytes')
+    return http_server
+
+
+def _video(video_id, play_url='http://cdn/v.mp4'):
+    return {'video_id': video_id, 'title': f't{video_id}', 'play_url': play_url}
+
+
+def test_record_attempts_and_abandon(ledger, tmp_path):
+    """测试累计尝试次数，达到上限后放弃，按原因筛选待重试记录"""
+    for _ in range(2):
+        ledger.record(_video('1'), tmp_path, REASON_URL_EXPIRED, '403')
+    ledger.record(_video('2'), tmp_path, REASON_NETWORK, 'timeout')
+    assert [item['video_id'] for item in ledger.pending()] == ['2', '1']
+    assert [item['video_id'] for item in ledger.pending(reasons=[REASON_URL_EXPIRED])] == ['1']
+
+    assert ledger.record(_video('1'), tmp_path, REASON_URL_EXPIRED, '403') == 3
+    assert ledger.get('1')['status'] == STATUS_ABANDONED
+    assert ledger.resolve('2')
+    assert ledger.stats() == {STATUS_ABANDONED: {REASON_URL_EXPIRED: 1}, STATUS_RESOLVED: {REASON_NETWORK: 1}}
+
+
+def test_download_failure_recorded_and_retried(cdn, ledger, tmp_path, monkeypatch):
+    """测试下载失败被记录原因，重试时重新获取播放地址后成功"""
+    downloader = DouyinDownloader(failure_ledger=ledger)
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    downloader._throttle = lambda: None
+
+    result = downloader.download_one_video(_video('42', cdn.base + '/expired.mp4'), tmp_path)
+    assert result['status'] == 'failed'
+    assert result['reason'] == REASON_URL_EXPIRED
+    assert ledger.get('42')['status'] == STATUS_FAILED
+
+    fresh = {'42': _video('42', cdn.base + '/fresh.mp4'), '43': None}
+    monkeypatch.setattr(downloader, 'get_video_detail', lambda video_id: fresh[video_id])
+    ledger.record(_video('43'), tmp_path, REASON_URL_EXPIRED, '403')
+
+    summary = ledger.retry(downloader, workers=2)
+    assert summary == {'success': 1, 'failed': 0, 'unavailable': 1}
+    assert ledger.get('42')['status'] == STATUS_RESOLVED
+    assert ledger.get('43')['reason'] == REASON_UNAVAILABLE
+    assert (tmp_path / 't42_42.mp4').read_bytes() == b'video-bytes'
+
+
+def test_retry_detail_unparseable_not_unavailable(cdn, ledger, tmp_path):
+    """测试视频详情接口返回无法解析的内容时记为请求失败，不会被当作视频已删除"""
+    downloader = DouyinDownloader(base_url=cdn.base)
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    downloader._throttle = lambda: None
+    ledger.record(_video('44'), tmp_path, REASON_URL_EXPIRED, '403')
+
+    assert ledger.retry(downloader) == {'success': 0, 'failed': 1, 'unavailable': 0}
+    assert ledger.get('44')['reason'] == REASON_HTTP_ERROR
+    assert ledger.get('44')['status'] == STATUS_FAILED
+
+
+def test_cli_stats(ledger, tmp_path, capsys, cli_logging):
+    """测试命令行统计"""
+    ledger.record(_video('1'), tmp_path, REASON_NETWORK, 'timeout')
+    main(['--db', str(ledger.path), 'stats'])
+    assert json.loads(capsys.readouterr().out) == {STATUS_FAILED: {REASON_NETWORK: 1}}
@@ -0,0 +1,89 @@
+"""
+共享工作台账的测试用例
+"""
+import multiprocessing
+import time
+
+import pytest
+from app.core.ledger import KIND_VIDEO, STATUS_DONE, STATUS_FAILED, BaseLedger, SQLiteLedger
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """台账数据库路径"""
+    return str(tmp_path / 'ledger.db')
+
+
+def _worker(db_path, node_id, queue):
+    """在独立进程中领取并完成工作项"""
+    ledger = SQLiteLedger(db_path, lease_seconds=30)
+    while True:
+        items = ledger.acquire(node_id, KIND_VIDEO, limit=3)
+        if not items:
+            break
+        for item in items:
+            queue.put((node_id, item['key']))
+            ledger.complete(item['key'], node_id)
+    ledger.close()
+
+
+def test_processes_split_work_without_duplicates(db_path):
+    """测试多个进程分摊工作项且不重复处理"""
+    keys = [f'video:{i}' for i in range(60)]
+    SQLiteLedger(db_path).add(keys, KIND_VIDEO)
+
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(db_path, f'node-{i}', queue)) for i in range(4)]
+    for p in processes:
+        p.start()
+    claimed = [queue.get(timeout=30) for _ in keys]
+    for p in processes:
+        p.join(30)
+
+    assert sorted(key for _, key in claimed) == sorted(keys)
+    assert SQLiteLedger(db_path).stats(KIND_VIDEO) == {STATUS_DONE: 60}
+
+
+def test_expired_lease_taken_over(db_path):
+    """测试节点崩溃（不再心跳）后租约过期被其他节点接手"""
+    crashed = SQLiteLedger(db_path, lease_seconds=0.2, heartbeat_interval=3600)
+    assert crashed.try_acquire('video:1', 'node-a')
+
+    other = SQLiteLedger(db_path, lease_seconds=0.2)
+    assert not other.try_acquire('video:1', 'node-b')
+    time.sleep(0.3)
+    assert other.try_acquire('video:1', 'node-b')
+    assert other.complete('video:1', 'node-b')
+    assert not crashed.complete('video:1', 'node-a')
+    assert not other.try_acquire('video:1', 'node-c')
+
+
+def test_heartbeat_keeps_lease(db_path):
+    """测试心跳续期后租约不会被接手"""
+    holder = SQLiteLedger(db_path, lease_seconds=0.3, heartbeat_interval=0.05)
+    assert holder.try_acquire('video:1', 'node-a')
+    time.sleep(0.6)
+    assert not SQLiteLedger(db_path).try_acquire('video:1', 'node-b')
+    holder.close()
+
+
+def test_fail_retries_until_max_attempts(db_path):
+    """测试失败的工作项重试到最大次数后标记为失败"""
+    ledger = SQLiteLedger(db_path, max_attempts=2)
+    assert ledger.try_acquire('video:1', 'node-a')
+    ledger.fail('video:1', 'node-a', 'timeout')
+    assert ledger.try_acquire('video:1', 'node-a')
+    ledger.fail('video:1', 'node-a', 'timeout')
+    assert not ledger.try_acquire('video:1', 'node-a')
+    assert ledger.stats() == {STATUS_FAILED: 1}
+
+
+def test_incomplete_backend_rejected():
+    """测试未实现全部接口的存储后端无法实例化"""
+    class PartialLedger(BaseLedger):
+        def add(self, keys, kind=KIND_VIDEO, payloads=None):
+            return 0
+
+    with pytest.raises(TypeError):
+        PartialLedger()
@@ -0,0 +1,100 @@
+"""
+MP4元数据探测的测试用例
+"""
+import struct
+
+import pytest
+from app.core.downloader import DouyinDownloader
+from app.core.metadata import MetadataProbe
+from app.utils.mp4 import MP4FormatError, parse_moov
+
+
+def box(box_type, payload):
+    """构造box"""
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def mvhd(timescale, duration, version=0):
+    """构造mvhd"""
+    if version == 1:
+        body = struct.pack('>BxxxQQIQ', 1, 0, 0, timescale, duration)
+    else:
+        body = struct.pack('>BxxxIIII', 0, 0, 0, timescale, duration)
+    return box(b'mvhd', body + b'\0' * 80)
+
+
+def tkhd(width, height, rotation=0):
+    """构造版本0的tkhd，rotation 为0或90"""
+    a, b = (0, 0x10000) if rotation == 90 else (0x10000, 0)
+    matrix = struct.pack('>9i', a, b, 0, -b, a, 0, 0, 0, 0x40000000)
+    body = struct.pack('>BxxxIIIII', 0, 0, 0, 1, 0, 0) + b'\0' * 16 + matrix
+    return box(b'tkhd', body + struct.pack('>II', width << 16, height << 16))
+
+
+def trak(handler, width=0, height=0, rotation=0):
+    """构造trak"""
+    hdlr = box(b'hdlr', b'\0' * 8 + handler + b'\0' * 13)
+    return box(b'trak', tkhd(width, height, rotation) + box(b'mdia', hdlr))
+
+
+def make_mp4(moov_at_end=False, mdat_size=400 * 1024, **video):
+    """构造只有头部结构的合成MP4文件"""
+    moov = box(b'moov', mvhd(1000, 15500) + trak(b'soun') + trak(b'vide', **video))
+    ftyp = box(b'ftyp', b'isom\0\0\2\0isomiso2avc1mp41')
+    mdat = box(b'mdat', b'\0' * mdat_size)
+    return ftyp + mdat + moov if moov_at_end else ftyp + moov + mdat
+
+
+@pytest.fixture
+def cdn(http_server):
+    """支持Range请求并统计发送字节数的本地CDN替身"""
+    return http_server
+
+
+@pytest.fixture
+def probe(tmp_path):
+    """使用小读取窗口的探测器"""
+    downloader = DouyinDownloader()
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    return MetadataProbe(downloader, head_bytes=4096)
+
+
+def test_parse_moov():
+    """测试解析时长、分辨率和旋转"""
+    data = make_mp4(width=1920, height=1080, rotation=90)
+    moov_start = data.index(b'moov') - 4
+    meta = parse_moov(data, moov_start + 8, moov_start + struct.unpack_from('>I', data, moov_start)[0])
+    assert meta == {'duration': 15.5, 'width': 1080, 'height': 1920, 'rotation': 90}
+
+    moov = box(b'moov', mvhd(90000, 90000 * 61, version=1))
+    assert parse_moov(moov, 8) == {'duration': 61.0}
+    with pytest.raises(MP4FormatError):
+        parse_moov(box(b'moov', trak(b'vide', 720, 1280)), 8)
+
+
+@pytest.mark.parametrize('moov_at_end', [False, True])
+def test_probe_reads_only_headers(cdn, probe, moov_at_end):
+    """测试moov在文件开头或末尾时都只读取少量字节"""
+    data = make_mp4(moov_at_end=moov_at_end, width=1080, height=1920)
+    cdn.add('/v.mp4', data, ranges=True)
+    meta = probe.probe(cdn.base + '/v.mp4')
+    assert meta['duration'] == 15.5
+    assert (meta['width'], meta['height']) == (1080, 1920)
+    assert meta['size'] == len(data)
+    assert meta['bitrate'] == int(len(data) * 8 / 15.5)
+    assert cdn.sent <= 2 * 4096
+    assert len(cdn.hits) == (2 if moov_at_end else 1)
+
+
+def test_enrich_videos(cdn, probe):
+    """测试批量补全视频元数据，失败的视频保持原样"""
+    cdn.add('/a.mp4', make_mp4(width=720, height=1280), ranges=True)
+    cdn.add('/bad.mp4', b'\0\0\0\4ftyp' + b'\0' * 100, ranges=True)
+    videos = [
+        {'video_id': 'a', 'play_url': cdn.base + '/a.mp4', 'duration': 0},
+        {'video_id': 'bad', 'play_url': cdn.base + '/bad.mp4', 'duration': 3}
+    ]
+    probe.enrich(videos)
+    assert videos[0] == {'video_id': 'a', 'play_url': cdn.base + '/a.mp4', 'duration': 16,
+                         'width': 720, 'height': 1280, 'bitrate': videos[0]['bitrate']}
+    assert videos[1] == {'video_id': 'bad', 'play_url': cdn.base + '/bad.mp4', 'duration': 3}
@@ -0,0 +1,83 @@
+"""
+运行指标的测试用例
+"""
+import pytest
+from app.core.downloader import DouyinDownloader, endpoint_class
+from app.utils.metrics import MetricsRegistry, _Metric, metrics
+
+
+@pytest.fixture
+def registry():
+    """独立的指标注册表"""
+    return MetricsRegistry(namespace='test')
+
+
+def test_render_text_format(registry):
+    """测试计数器、仪表、直方图和回调指标的导出格式"""
+    requests_total = registry.counter('requests_total', '请求次数', ('host', 'status'))
+    requests_total.labels('a.com', 200).inc()
+    requests_total.labels('a.com', 200).inc(2)
+    registry.gauge('active', '活跃数').set(3)
+    latency = registry.histogram('latency_seconds', '耗时', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+    registry.register_callback('entries', '条目数', lambda: {('x"y',): 2}, labelnames=('key',))
+    registry.register_callback('broken', '回调出错', lambda: 1 / 0)
+
+    lines = registry.render().splitlines()
+    assert '# TYPE test_requests_total counter' in lines
+    assert 'test_requests_total{host="a.com",status="200"} 3' in lines
+    assert 'test_active 3' in lines
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count 3' in lines
+    assert 'test_entries{key="x\\"y"} 2' in lines
+    assert not any('broken' in line for line in lines)
+
+
+def test_register_conflicts(registry):
+    """测试同名指标复用，类型或标签不一致时报错"""
+    assert registry.counter('c', '计数', ('a',)) is registry.counter('c', '计数', ('a',))
+    with pytest.raises(ValueError):
+        registry.gauge('c', '计数', ('a',))
+    with pytest.raises(ValueError):
+        registry.counter('c', '计数', ('a',)).labels('x', 'y')
+
+
+def test_metric_subclass_requires_new_child():
+    """测试未实现 _new_child 的指标类型在创建时报错"""
+    class Summary(_Metric):
+        metric_type = 'summary'
+
+    with pytest.raises(TypeError):
+        Summary('summary', '未实现子指标')
+
+
+def test_endpoint_class():
+    """测试端点类别划分"""
+    assert endpoint_class('https://www.douyin.com/aweme/v1/web/aweme/post/?a=1') == 'video_list'
+    assert endpoint_class('https://www.douyin.com/user/MS4w') == 'user_page'
+    assert endpoint_class('https://v.douyin.com/abc/') == 'short_url'
+    assert endpoint_class('https://v3-web.douyinvod.com/x.mp4') == 'cdn'
+
+
+def test_download_instrumented(http_server, tmp_path):
+    """测试下载过程记录上游请求、重试、传输字节和下载结果"""
+    http_server.script = [(503, {'Retry-After': '0'})]
+    http_server.add('/v.mp4', b'x' * 1000)
+    host = f"127.0.0.1:{http_server.server_port}"
+    downloader = DouyinDownloader()
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    downloader._throttle = lambda: None
+    bytes_before = metrics.get('download_bytes_total').labels('backfill').value
+    success_before = metrics.get('downloads_total').labels('success').value
+    assert downloader.download_video(http_server.url('/v.mp4'), str(tmp_path / 'v.mp4'), priority='backfill')
+
+    requests_total = metrics.get('upstream_requests_total')
+    assert requests_total.labels('cdn', host, 503).value == 1
+    assert requests_total.labels('cdn', host, 200).value == 1
+    assert metrics.get('upstream_retries_total').labels('cdn', host, 503).value == 1
+    assert metrics.get('download_bytes_total').labels('backfill').value - bytes_before == 1000
+    assert metrics.get('downloads_total').labels('success').value - success_before == 1
+    assert metrics.get('active_transfers').labels('backfill').value == 0
@@ -0,0 +1,141 @@
+"""
+用户监控的测试用例
+"""
+import threading
+import time
+
+import pytest
+from app.core.monitor import CreatorMonitor, CreatorSchedule
+from app.core.resilience import RequestError
+
+
+class FakeDownloader:
+    """可以动态发布视频的下载器替身"""
+
+    base_url = 'https://www.douyin.com'
+
+    def __init__(self, download_root=None):
+        self.rate_limiter = None
+        self.download_root = download_root
+        self.videos = {}
+        self.calls = []
+        self.downloads = []
+        self.fail_next = False
+
+    def post(self, user_id, video_id, create_time):
+        self.videos.setdefault(user_id, []).insert(0, {
+            'video_id': video_id, 'title': video_id, 'play_url': '', 'create_time': create_time
+        })
+
+    def get_video_list(self, user_id, max_cursor=0):
+        self.calls.append(user_id)
+        if self.fail_next:
+            self.fail_next = False
+            raise RequestError("获取视频列表失败: 503", status_code=503)
+        videos = self.videos.get(user_id, [])
+        page = videos[max_cursor:max_cursor + 20]
+        next_cursor = max_cursor + 20 if max_cursor + 20 < len(videos) else 0
+        return page, next_cursor
+
+    def prepare_user_download(self, user_url):
+        user_id = user_url.rsplit('/', 1)[-1]
+        download_dir = self.download_root / f'nickname-{user_id}'
+        download_dir.mkdir(parents=True, exist_ok=True)
+        return {'user_id': user_id, 'nickname': f'nickname-{user_id}'}, download_dir
+
+    def download_one_video(self, video, download_dir, priority=None):
+        self.downloads.append((video['video_id'], download_dir))
+        return {'video_id': video['video_id'], 'status': 'success'}
+
+
+@pytest.fixture
+def downloader():
+    """创建下载器替身"""
+    return FakeDownloader()
+
+
+def test_baseline_then_new_videos(downloader):
+    """测试首次轮询只记录基线，之后只返回新视频"""
+    now = int(time.time())
+    downloader.post('u1', 'a', now - 7200)
+    downloader.post('u1', 'b', now - 3600)
+    monitor = CreatorMonitor(downloader)
+    creator = CreatorSchedule('u1', 1800)
+
+    assert monitor.poll(creator) == []
+    assert creator.avg_post_gap == 3600
+
+    downloader.post('u1', 'c', now)
+    assert [v['video_id'] for v in monitor.poll(creator)] == ['c']
+    assert monitor.poll(creator) == []
+
+
+def test_burst_pages_through(downloader):
+    """测试短时间发布超过一页视频时继续翻页"""
+    monitor = CreatorMonitor(downloader)
+    creator = CreatorSchedule('u1', 1800)
+    downloader.post('u1', 'old', 1)
+    monitor.poll(creator)
+    for i in range(30):
+        downloader.post('u1', f'n{i}', 100 + i)
+    assert len(monitor.poll(creator)) == 30
+
+
+def test_interval_adapts(downloader):
+    """测试活跃用户缩短间隔，长期不更新的用户退避到上限"""
+    monitor = CreatorMonitor(downloader, min_interval=60, max_interval=86400)
+    active = CreatorSchedule('active', 1800)
+    active.avg_post_gap = 600
+    assert monitor.next_interval(active, True) == 150
+
+    dormant = CreatorSchedule('dormant', 1800)
+    dormant.latest_create_time = int(time.time()) - 365 * 86400
+    assert monitor.next_interval(dormant, False) == 86400
+
+
+def test_run_dispatches_new_videos(downloader):
+    """测试监控循环按到期时间轮询并把新视频交给处理回调"""
+    found = []
+    monitor = CreatorMonitor(downloader, min_interval=0.01, initial_interval=0.01,
+                             on_new_videos=lambda creator, videos: found.extend(videos))
+    monitor.add_creator('u1', due_in=0)
+    monitor.add_creator('u2', due_in=0)
+    downloader.post('u1', 'a', int(time.time()))
+
+    thread = threading.Thread(target=monitor.run, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    downloader.post('u1', 'b', int(time.time()) + 1)
+    deadline = time.time() + 2
+    while not found and time.time() < deadline:
+        time.sleep(0.01)
+    monitor.stop()
+    thread.join(2)
+
+    assert [v['video_id'] for v in found] == ['b']
+    assert set(downloader.calls) == {'u1', 'u2'}
+
+
+def test_default_download_dir_matches_batch_download(tmp_path):
+    """测试默认下载目录与批量下载相同，为 download_root/<昵称>"""
+    downloader = FakeDownloader(tmp_path)
+    downloader.post('u1', 'a', int(time.time()))
+    monitor = CreatorMonitor(downloader, download_existing=True)
+    monitor.add_creator('u1', due_in=0)
+    creator = monitor.creators['u1']
+    monitor._poll_and_reschedule(creator, threading.Semaphore(0))
+    assert creator.download_dir == tmp_path / 'nickname-u1'
+    assert downloader.downloads == [('a', tmp_path / 'nickname-u1')]
+
+
+def test_list_failure_backs_off(downloader):
+    """测试视频列表获取失败时记为轮询失败并退避，不当作没有新视频"""
+    monitor = CreatorMonitor(downloader, initial_interval=100, backoff=2, max_interval=1000,
+                             on_new_videos=lambda creator, videos: None)
+    monitor.add_creator('u1', due_in=0)
+    creator = monitor.creators['u1']
+    downloader.fail_next = True
+    monitor._poll_and_reschedule(creator, threading.Semaphore(0))
+    assert creator.failures == 1
+    assert creator.interval == 200
+    assert creator.polls == 0
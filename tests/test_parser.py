@@ -1,6 +1,9 @@
 """
 URL解析模块的测试用例
 """
+import threading
+import time
+
 import pytest
 from app.core.parser import URLParser
 
@@ -45,4 +48,88 @@ def test_url_validation(parser):
         "https://v.douyin.com/abcd123/",
     ]
     for url in valid_urls:
-        assert parser._is_valid_url(url) is True 
\ No newline at end of file
+        assert parser._is_valid_url(url) is True 
+
+
+def test_normalize_url_offline(parser):
+    """测试离线标准化"""
+    assert parser.normalize_url(" https://douyin.com/user/abc?from=share ") == (
+        'user', "https://www.douyin.com/user/abc")
+    assert parser.normalize_url("https://v.douyin.com/xyz") == ('short', "https://v.douyin.com/xyz/")
+    assert parser.normalize_url("https://example.com") == (None, None)
+
+
+def test_parse_urls_batch(parser, monkeypatch):
+    """测试批量解析：去重、短链接只展开一次并缓存"""
+    calls = []
+
+    def fake_expand(short_url):
+        calls.append(short_url)
+        return "https://www.douyin.com/user/from_short?x=1"
+
+    monkeypatch.setattr(parser, '_expand_short_url', fake_expand)
+    urls = [
+        "https://www.douyin.com/user/a",
+        "https://www.douyin.com/user/a",
+        "https://v.douyin.com/s1/",
+        "https://v.douyin.com/s1",
+        "not_a_url",
+    ]
+    results = dict(parser.parse_urls(urls))
+    assert len(results) == 4
+    assert results["https://www.douyin.com/user/a"] == "https://www.douyin.com/user/a"
+    assert results["https://v.douyin.com/s1"] == "https://www.douyin.com/user/from_short"
+    assert results["not_a_url"] is None
+    assert calls == ["https://v.douyin.com/s1/"]
+
+    list(parser.parse_urls(["https://v.douyin.com/s1/"]))
+    assert len(calls) == 1
+
+
+def test_parse_urls_cancelled_when_consumer_stops(parser, monkeypatch):
+    """测试调用方提前停止迭代时取消尚未开始的短链接展开"""
+    calls = []
+    release = threading.Event()
+
+    def slow_expand(short_url):
+        calls.append(short_url)
+        release.wait(1)
+        return "https://www.douyin.com/user/from_short"
+
+    monkeypatch.setattr(parser, '_expand_short_url', slow_expand)
+    urls = [f"https://v.douyin.com/s{i}/" for i in range(20)]
+    results = parser.parse_urls(urls, max_workers=2)
+    next(results)
+    results.close()
+    release.set()
+    time.sleep(0.1)
+    assert len(calls) <= 4
+
+
+@pytest.fixture
+def profile_server(http_server):
+    """模拟用户主页的本地服务器，/user/missing 返回404"""
+    padding = b'x' * (1024 * 1024)
+    for name, title in (('ok', '用户主页'), ('gone', '用户不存在')):
+        page = f'<html><head><title>{title}</title></head><body>'.encode() + padding
+        http_server.add(f'/user/{name}', page, headers={'Content-Type': 'text/html; charset=utf-8'})
+    return http_server
+
+
+def test_validate_user_probe(parser, profile_server):
+    """测试轻量验证：识别200错误页，结果被缓存"""
+    base = profile_server.url('/user')
+    assert parser.validate_user_exists(f"{base}/ok") == (True, None)
+    assert parser.validate_user_exists(f"{base}/gone") == (False, "用户不存在")
+    assert parser.validate_user_exists(f"{base}/missing") == (False, "用户不存在")
+    assert parser.validate_user_exists(f"{base}/ok") == (True, None)
+    assert len(profile_server.hits) == 3
+
+
+def test_configured_site():
+    """测试配置站点地址后，抖音链接和配置地址的链接都标准化到配置地址"""
+    parser = URLParser(base_url='http://127.0.0.1:8600', short_url_base='http://127.0.0.1:8600/s')
+    assert parser.normalize_url('https://www.douyin.com/user/abc') == ('user', 'http://127.0.0.1:8600/user/abc')
+    assert parser.normalize_url('http://127.0.0.1:8600/user/abc?x=1') == ('user', 'http://127.0.0.1:8600/user/abc')
+    assert parser.normalize_url('https://v.douyin.com/sd01/') == ('short', 'http://127.0.0.1:8600/s/sd01/')
+    assert parser._to_user_url('http://127.0.0.1:8600/user/abc') == 'http://127.0.0.1:8600/user/abc'
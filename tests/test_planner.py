@@ -0,0 +1,139 @@
+"""
+下载规划和分段下载的测试用例
+"""
+import os
+
+import pytest
+from app.core import downloader as downloader_module
+from app.core.downloader import DouyinDownloader, video_save_path
+from app.core.planner import DownloadPlanner
+from app.core.progress import EVENT_COMPLETED, EVENT_PROGRESS, ProgressBus
+
+FILES = {
+    '/small.mp4': os.urandom(1000),
+    '/large.mp4': os.urandom(300 * 1024 + 7),
+    '/norange.mp4': os.urandom(5000)
+}
+
+
+@pytest.fixture
+def cdn(http_server):
+    """支持Range请求的本地CDN替身，/norange.mp4 不支持Range"""
+    for path, body in FILES.items():
+        http_server.add(path, body, ranges=path != '/norange.mp4')
+    return http_server
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    """不做请求间延迟的下载器"""
+    downloader = DouyinDownloader()
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    downloader._throttle = lambda: None
+    return downloader
+
+
+def test_probe_sizes(cdn, downloader):
+    """测试探测文件大小和Range支持"""
+    planner = DownloadPlanner(downloader)
+    videos = [{'play_url': cdn.base + path} for path in ('/large.mp4', '/norange.mp4', '/missing.mp4')]
+    videos.append({'play_url': None})
+    planner.probe(videos)
+    assert [(v['size'], v['accept_ranges']) for v in videos] == [
+        (len(FILES['/large.mp4']), True), (5000, False), (None, False), (None, False)
+    ]
+
+
+def test_plan_order_segments_and_disk_admission(tmp_path, monkeypatch):
+    """测试从小到大排序、大文件分段、磁盘空间不足时推迟"""
+    planner = DownloadPlanner(None, segment_threshold=500, segments=3, disk_reserve=100)
+    monkeypatch.setattr(DownloadPlanner, '_free_bytes', staticmethod(lambda path: 1500))
+    videos = [
+        {'video_id': 'big', 'size': 900, 'accept_ranges': True},
+        {'video_id': 'unknown', 'size': None, 'accept_ranges': False},
+        {'video_id': 'small', 'size': 100, 'accept_ranges': True},
+        {'video_id': 'mid', 'size': 600, 'accept_ranges': False}
+    ]
+    plan = planner.plan(videos, tmp_path)
+    assert [v['video_id'] for v in plan.videos] == ['small', 'mid', 'unknown']
+    assert [v['video_id'] for v in plan.deferred] == ['big']
+    assert [v['segments'] for v in plan.videos] == [1, 1, 1]
+    assert plan.total_bytes == 700
+
+    monkeypatch.setattr(DownloadPlanner, '_free_bytes', staticmethod(lambda path: None))
+    plan = planner.plan(videos, tmp_path)
+    assert {v['video_id']: v['segments'] for v in plan.videos}['big'] == 3
+
+
+def test_plan_skips_budget_for_files_on_disk(tmp_path, monkeypatch):
+    """测试目标文件已存在的视频不占用磁盘预算，也不计入总字节数"""
+    planner = DownloadPlanner(None, disk_reserve=0)
+    monkeypatch.setattr(DownloadPlanner, '_free_bytes', staticmethod(lambda path: 1000))
+    videos = [
+        {'video_id': 'done', 'title': 'done', 'size': 800},
+        {'video_id': 'new', 'title': 'new', 'size': 900}
+    ]
+    video_save_path(videos[0], tmp_path).write_bytes(b'x' * 800)
+    plan = planner.plan(videos, tmp_path)
+    assert [v['video_id'] for v in plan.videos] == ['done', 'new']
+    assert plan.deferred == []
+    assert plan.total_bytes == 900
+    assert plan.to_dict()['on_disk'] == 1
+
+
+def test_segmented_download(cdn, downloader, tmp_path):
+    """测试分段下载的文件内容完整"""
+    save_path = str(tmp_path / 'large.mp4')
+    size = len(FILES['/large.mp4'])
+    assert downloader.download_video(cdn.base + '/large.mp4', save_path, size=size, segments=4)
+    with open(save_path, 'rb') as f:
+        assert f.read() == FILES['/large.mp4']
+    assert sorted(start for _, start, _ in cdn.ranges) == [0, 76802, 153604, 230406]
+    assert not os.path.exists(save_path + '.part')
+
+
+def test_planned_download_all(cdn, downloader, tmp_path, monkeypatch):
+    """测试按规划顺序下载全部视频"""
+    videos = [
+        {'video_id': name, 'title': name, 'play_url': cdn.base + f'/{name}.mp4'}
+        for name in ('large', 'small', 'norange')
+    ]
+    monkeypatch.setattr(downloader, 'prepare_user_download', lambda url: ({'user_id': 'u1'}, tmp_path))
+    monkeypatch.setattr(downloader, 'get_video_list', lambda user_id, cursor=0: (videos, 0))
+    planner = DownloadPlanner(downloader, segment_threshold=100 * 1024)
+
+    results = downloader.download_all_videos('https://www.douyin.com/user/u1', planner=planner)
+    assert [r['video_id'] for r in results] == ['small', 'norange', 'large']
+    assert all(r['status'] == 'success' for r in results)
+    assert len([r for r in cdn.ranges if r[0] == '/large.mp4' and r[1] > 0]) == 3
+
+
+def test_planned_progress_counts_only_success(cdn, downloader, tmp_path, monkeypatch):
+    """测试整体进度只累计下载成功的字节，失败的视频从待下载总量中扣除，已存在的文件不计入"""
+    bus = ProgressBus(min_interval=0)
+    monkeypatch.setattr(downloader_module, 'progress_bus', bus)
+    videos = [
+        {'video_id': 'small', 'title': 'small', 'play_url': cdn.base + '/small.mp4'},
+        {'video_id': 'gone', 'title': 'gone', 'play_url': cdn.base + '/gone.mp4', 'size': 2000,
+         'accept_ranges': True},
+        {'video_id': 'norange', 'title': 'norange', 'play_url': cdn.base + '/norange.mp4'}
+    ]
+    video_save_path(videos[2], tmp_path).write_bytes(FILES['/norange.mp4'])
+    monkeypatch.setattr(downloader, 'prepare_user_download', lambda url: ({'user_id': 'u1'}, tmp_path))
+    monkeypatch.setattr(downloader, 'get_video_list', lambda user_id, cursor=0: (videos, 0))
+
+    results = downloader.download_all_videos('https://www.douyin.com/user/u1', planner=DownloadPlanner(downloader))
+    assert {r['video_id']: r['status'] for r in results} == {'small': 'success', 'gone': 'failed',
+                                                             'norange': 'skipped'}
+
+    events = []
+    for event in bus.subscribe(task_id='user:u1', last_id=0, timeout=0.05, max_age=2):
+        if event is None:
+            continue
+        events.append(event)
+        if event['type'] == EVENT_COMPLETED:
+            break
+    progress = [e for e in events if e['type'] == EVENT_PROGRESS]
+    assert progress[-1]['downloaded'] == progress[-1]['total'] == 1000
+    assert events[-1]['downloaded'] == 1000
+    assert events[-1]['total'] == 3000
@@ -0,0 +1,97 @@
+"""
+进度事件总线的测试用例
+"""
+import threading
+import time
+
+import pytest
+from app.core import downloader as downloader_module
+from app.core.downloader import DouyinDownloader
+from app.core.progress import EVENT_COMPLETED, EVENT_PROGRESS, EVENT_STARTED, ProgressBus
+
+
+@pytest.fixture
+def bus():
+    """创建ProgressBus实例"""
+    return ProgressBus(capacity=16, min_interval=60)
+
+
+def _collect(bus, count, **kwargs):
+    """在后台线程中订阅并收集指定数量的事件"""
+    events = []
+    ready = threading.Event()
+
+    def run():
+        stream = bus.subscribe(timeout=0.05, **kwargs)
+        ready.set()
+        for event in stream:
+            if event is not None:
+                events.append(event)
+            if len(events) >= count:
+                break
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait(1)
+    return thread, events
+
+
+def test_progress_rate_limited(bus):
+    """测试字节进度按时间间隔限流，完成时总会发布"""
+    assert bus.progress('t1', 10, 100) is True
+    assert bus.progress('t1', 20, 100) is False
+    assert bus.progress('t1', 100, 100) is True
+
+
+def test_subscribers_receive_events_in_order(bus):
+    """测试多个订阅者都按顺序收到事件"""
+    subscribers = [_collect(bus, 2, last_id=0) for _ in range(3)]
+    bus.publish('t1', EVENT_PROGRESS, downloaded=1)
+    bus.finish('t1', EVENT_COMPLETED)
+    for thread, events in subscribers:
+        thread.join(2)
+        assert [e['type'] for e in events] == [EVENT_PROGRESS, EVENT_COMPLETED]
+        assert events[0]['id'] < events[1]['id']
+
+
+def test_subscribe_filters_task(bus):
+    """测试按任务ID过滤事件"""
+    thread, events = _collect(bus, 1, task_id='t2', last_id=0)
+    bus.publish('t1', EVENT_PROGRESS)
+    bus.publish('t2', EVENT_PROGRESS)
+    thread.join(2)
+    assert [e['task_id'] for e in events] == ['t2']
+    assert bus.snapshot('t2')[0]['task_id'] == 't2'
+
+
+def test_subscribe_ends_after_max_age(bus):
+    """测试订阅到期后结束迭代"""
+    started = time.monotonic()
+    assert list(bus.subscribe(timeout=5, max_age=0.1)) in ([], [None])
+    assert time.monotonic() - started < 1
+
+
+def test_download_video_publishes_events(http_server, tmp_path, monkeypatch):
+    """测试下载视频时依次发布开始、字节进度和完成事件"""
+    body = b'x' * (3 * 1024 * 1024)
+    http_server.add('/v.mp4', body)
+    bus = ProgressBus(min_interval=0)
+    monkeypatch.setattr(downloader_module, 'progress_bus', bus)
+    downloader = DouyinDownloader()
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    downloader._throttle = lambda: None
+    assert downloader.download_video(http_server.url('/v.mp4'), str(tmp_path / 'v.mp4'), task_id='v1')
+
+    events = []
+    for event in bus.subscribe(task_id='v1', last_id=0, timeout=0.05, max_age=2):
+        if event is None:
+            continue
+        events.append(event)
+        if event['type'] == EVENT_COMPLETED:
+            break
+    types = [e['type'] for e in events]
+    assert types[0] == EVENT_STARTED
+    assert types[-1] == EVENT_COMPLETED
+    assert types.count(EVENT_PROGRESS) >= 2
+    assert events[-2]['downloaded'] == len(body)
+    assert events[-1]['total'] == len(body)
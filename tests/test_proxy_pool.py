@@ -0,0 +1,92 @@
+"""
+代理池的测试用例
+"""
+import socket
+import time
+
+import pytest
+import requests
+from app.core.downloader import DouyinDownloader
+from app.core.proxy_pool import NoProxyAvailable, ProxyPool
+
+
+def _dead_proxy_url():
+    """返回一个没有服务监听的本地地址"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+def test_bad_proxy_quarantined(http_server):
+    """测试失败的代理被隔离，请求转移到健康代理"""
+    # 本地服务器充当代理，直接以自身名义响应转发来的请求
+    http_server.add('*', b'good')
+    good = http_server.base
+    bad = _dead_proxy_url()
+    pool = ProxyPool([bad], failure_threshold=2, quarantine_base=60)
+    pool.add(good, max_concurrency=0)
+
+    def fetch():
+        try:
+            with pool.use(timeout=1) as proxy:
+                return requests.get('http://example.invalid/', proxies=proxy.proxies, timeout=2).text
+        except requests.RequestException:
+            return None
+
+    assert [fetch(), fetch()] == [None, None]
+    pool.remove(good)
+    pool.add(good)
+    served = [fetch() for _ in range(10)]
+
+    stats = {item['url']: item for item in pool.stats()}
+    assert stats[bad]['quarantined'] is True
+    assert stats[bad]['failures'] == 2
+    assert stats[good]['successes'] == 10
+    assert set(served) == {'good'}
+
+
+def test_per_proxy_concurrency_limit():
+    """测试单个代理的并发上限"""
+    pool = ProxyPool(['http://p1'], max_concurrency=2)
+    first = pool.acquire()
+    pool.acquire()
+    with pytest.raises(NoProxyAvailable):
+        pool.acquire(timeout=0.05)
+    pool.release(first, True, 0.1)
+    assert pool.acquire(timeout=0.05) is first
+    assert pool.stats()[0]['inflight'] == 2
+
+
+def test_quarantine_backoff_and_probation():
+    """测试隔离期结束后试用，试用失败立即以更长时间重新隔离"""
+    pool = ProxyPool(['http://p1'], failure_threshold=1, quarantine_base=0.05)
+    pool.release(pool.acquire(), False)
+    assert pool.stats()[0]['quarantined'] is True
+
+    proxy = pool.acquire(timeout=1)
+    assert proxy.probation is True
+    pool.release(proxy, False)
+    assert pool.stats()[0]['quarantine_count'] == 2
+    assert pool.stats()[0]['quarantined'] is True
+
+    time.sleep(0.15)
+    proxy = pool.acquire(timeout=1)
+    pool.release(proxy, True, 0.2)
+    assert pool.stats()[0]['quarantine_count'] == 0
+
+
+def test_downloader_uses_pool(http_server, tmp_path):
+    """测试下载器通过代理池发送请求，流式响应关闭后才归还并发名额"""
+    http_server.add('*', b'proxied')
+    pool = ProxyPool([http_server.base], max_concurrency=1)
+    downloader = DouyinDownloader(proxy_pool=pool)
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+
+    assert downloader._make_request('GET', 'http://example.invalid/').text == 'proxied'
+    response = downloader._make_request('GET', 'http://example.invalid/', stream=True)
+    assert pool.stats()[0]['inflight'] == 1
+    response.close()
+    assert pool.stats()[0]['inflight'] == 0
+    assert pool.stats()[0]['successes'] == 2
@@ -0,0 +1,159 @@
+"""
+重试策略和熔断器的测试用例
+"""
+import time
+from email.utils import formatdate
+
+import pytest
+from app.core.downloader import DouyinDownloader
+from app.core.resilience import (BlockedError, CircuitBreaker, CircuitOpenError, HTTPStatusError, RateLimitedError,
+                                 ResponseParseError, RetryPolicy, parse_retry_after)
+from app.utils.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def server(http_server):
+    """按 script 预设顺序返回状态码的本地服务器，预设用完后返回200"""
+    http_server.add('*', b'ok')
+    return http_server
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    """重试等待时间很短的下载器"""
+    downloader = DouyinDownloader()
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    downloader.cdn_retry_policy = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.01,
+                                              retry_statuses=(429, 503), breaker_statuses=(429,),
+                                              max_retry_after=1)
+    return downloader
+
+
+def test_retries_transient_status(server, downloader):
+    """测试可重试的状态码重试后成功"""
+    server.script = [(503, {}), (503, {})]
+    assert downloader._make_request('GET', server.url('/video.mp4')).status_code == 200
+    assert len(server.hits) == 3
+
+
+def test_retry_after_honoured_and_too_long_fails_fast(server, downloader):
+    """测试遵守较短的Retry-After，超过上限时直接失败并按要求时长熔断"""
+    server.script = [(429, {'Retry-After': '0'})]
+    assert downloader._make_request('GET', server.url('/video.mp4')).status_code == 200
+
+    server.script = [(429, {'Retry-After': '120'})]
+    with pytest.raises(RateLimitedError) as excinfo:
+        downloader._make_request('GET', server.url('/video.mp4'))
+    assert excinfo.value.retry_after == 120
+    assert excinfo.value.attempts == 1
+
+    hits = len(server.hits)
+    with pytest.raises(CircuitOpenError) as excinfo:
+        downloader._make_request('GET', server.url('/video.mp4'))
+    assert excinfo.value.retry_in > 100
+    assert len(server.hits) == hits
+
+
+def test_exhausted_retries_raise_typed_error(server, downloader):
+    """测试重试用完后抛出带状态码的异常，403不重试"""
+    server.script = [(503, {})] * 3
+    with pytest.raises(HTTPStatusError) as excinfo:
+        downloader._make_request('GET', server.url('/video.mp4'))
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.attempts == 3
+
+    server.script = [(403, {})]
+    hits = len(server.hits)
+    with pytest.raises(BlockedError):
+        downloader._make_request('GET', server.url('/video.mp4'))
+    assert len(server.hits) == hits + 1
+
+
+def test_not_found_returned_to_caller(server, downloader):
+    """测试不需要重试的状态码原样返回"""
+    server.script = [(404, {})]
+    assert downloader._make_request('GET', server.url('/video.mp4')).status_code == 404
+    assert len(server.hits) == 1
+
+
+def test_breaker_opens_and_recovers():
+    """测试熔断器连续失败后打开，冷却后半开只放行一个探测请求"""
+    breaker = CircuitBreaker('cdn.example.com', failure_threshold=2, recovery_timeout=0.05)
+    breaker.allow()
+    breaker.record_failure()
+    breaker.allow()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    time.sleep(0.06)
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_failure()
+    assert breaker.to_dict()['state'] == CircuitBreaker.OPEN
+    assert breaker.to_dict()['open_remaining'] > 0.05
+
+    time.sleep(0.11)
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.to_dict()['state'] == CircuitBreaker.CLOSED
+
+
+def test_policy_selection_and_backoff(downloader):
+    """测试接口和CDN使用不同策略，全抖动退避不超过上限"""
+    assert downloader._retry_policy('https://www.douyin.com/aweme/v1/web/aweme/post/') is downloader.api_retry_policy
+    assert downloader._retry_policy('https://v3-web.douyinvod.com/x.mp4') is downloader.cdn_retry_policy
+
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+    delays = [policy.backoff(10) for _ in range(200)]
+    assert all(0 <= delay <= 5 for delay in delays)
+    assert max(delays) - min(delays) > 1
+
+
+def test_parse_retry_after():
+    """测试解析秒数和HTTP日期格式的Retry-After"""
+    assert parse_retry_after('30') == 30
+    assert 50 < parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_half_open_probe_released_on_local_error(server, downloader, monkeypatch):
+    """测试半开探测因本地异常（如没有可用代理）失败时归还探测名额，域名之后仍能恢复"""
+    host = server.url('/video.mp4').split('/')[2]
+    breaker = downloader.breakers.get(host)
+    breaker.recovery_timeout = 0.01
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    time.sleep(0.02)
+
+    original_send = downloader._send
+
+    def failing_send(method, url, **kwargs):
+        raise TimeoutError("没有空闲的会话")
+
+    monkeypatch.setattr(downloader, '_send', failing_send)
+    with pytest.raises(TimeoutError):
+        downloader._make_request('GET', server.url('/video.mp4'))
+    assert breaker.to_dict()['state'] == CircuitBreaker.HALF_OPEN
+
+    monkeypatch.setattr(downloader, '_send', original_send)
+    assert downloader._make_request('GET', server.url('/video.mp4')).status_code == 200
+    assert breaker.to_dict()['state'] == CircuitBreaker.CLOSED
+
+
+def test_video_list_failure_raises(server, tmp_path):
+    """测试视频列表返回非200或无法解析时抛出异常，不会被当作没有更多视频"""
+    downloader = DouyinDownloader(base_url=server.base)
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    downloader.rate_limiter = RateLimiter(rate=10000, burst=10000)
+
+    server.script = [(404, {})]
+    with pytest.raises(HTTPStatusError) as excinfo:
+        downloader.get_video_list('user')
+    assert excinfo.value.status_code == 404
+
+    # 服务器返回200但内容不是JSON
+    with pytest.raises(ResponseParseError):
+        downloader.get_video_list('user')
@@ -0,0 +1,244 @@
+"""
+API路由的测试用例
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import Flask
+
+from app.api import api_bp, routes
+from app.core.resilience import CircuitOpenError, ResponseParseError
+from app.utils.bandwidth import BandwidthShaper
+
+
+class FakeDownloader:
+    """记录调用次数的下载器替身"""
+
+    base_url = 'https://www.douyin.com'
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get_user_info(self, url):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.05)
+        return {
+            'user_id': '123',
+            'nickname': '测试用户',
+            'avatar': 'https://example.com/a.jpg',
+            'signature': '',
+            'following_count': 1,
+            'follower_count': 2,
+            'liked_count': 3
+        }
+
+    def get_video_list(self, user_id, max_cursor=0):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.05)
+        video = {
+            'video_id': f'v{max_cursor}',
+            'title': '标题',
+            'cover': 'c',
+            'play_url': 'p',
+            'duration': 15,
+            'create_time': 1704628800,
+            'statistics': {'digg_count': 10, 'comment_count': 2, 'share_count': 1}
+        }
+        return [video], (max_cursor + 1 if max_cursor < 1 else 0)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """替换路由共享的下载器并清空缓存"""
+    downloader = FakeDownloader()
+    monkeypatch.setattr(routes, '_downloader', downloader)
+    routes._response_cache.clear()
+    return downloader
+
+
+@pytest.fixture
+def client():
+    """创建测试客户端"""
+    app = Flask(__name__)
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
+    return app.test_client()
+
+
+def test_user_info_coalesced_and_cached(fake, client):
+    """测试并发请求同一用户只访问一次上游"""
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(lambda _: client.get('/api/v1/user/MS4w'), range(8)))
+    assert all(r.status_code == 200 for r in responses)
+    assert responses[0].json['data']['user_id'] == 'MS4w'
+    client.get('/api/v1/user/MS4w')
+    assert fake.calls == 1
+
+
+def test_user_videos_cursor(fake, client):
+    """测试视频列表分页游标透传"""
+    data = client.get('/api/v1/user/MS4w/videos').json['data']
+    assert data['has_more'] is True
+    assert data['cursor'] == '1'
+    assert data['videos'][0]['like_count'] == 10
+
+    data = client.get('/api/v1/user/MS4w/videos', query_string={'cursor': data['cursor']}).json['data']
+    assert data['has_more'] is False
+    assert data['videos'][0]['video_id'] == 'v1'
+
+
+def test_user_videos_probe_metadata(fake, client, monkeypatch):
+    """测试probe参数补全分辨率，且与未探测的结果分开缓存"""
+    class FakeProbe:
+        def enrich(self, videos):
+            for video in videos:
+                video.update({'width': 720, 'height': 1280, 'bitrate': 1000000})
+
+    monkeypatch.setattr(routes, '_metadata_probe', FakeProbe())
+    assert 'width' not in client.get('/api/v1/user/MS4w/videos').json['data']['videos'][0]
+    video = client.get('/api/v1/user/MS4w/videos?probe=1').json['data']['videos'][0]
+    assert (video['width'], video['height'], video['bitrate']) == (720, 1280, 1000000)
+
+
+def test_user_videos_invalid_cursor(fake, client):
+    """测试无效游标"""
+    assert client.get('/api/v1/user/MS4w/videos?cursor=abc').status_code == 400
+
+
+def test_upstream_circuit_open_returns_503(fake, client, monkeypatch):
+    """测试上游熔断时返回503和Retry-After"""
+    def fail(user_id, max_cursor=0):
+        raise CircuitOpenError("域名已熔断: www.douyin.com", host='www.douyin.com', retry_in=12.3)
+
+    monkeypatch.setattr(fake, 'get_video_list', fail)
+    response = client.get('/api/v1/user/MS4w/videos')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '13'
+
+
+def test_upstream_failure_not_cached(fake, client, monkeypatch):
+    """测试上游失败返回502且不写入缓存，上游恢复后立即返回完整列表"""
+    list_videos = fake.get_video_list
+
+    def fail(user_id, max_cursor=0):
+        raise ResponseParseError("无法解析接口响应", status_code=200)
+
+    monkeypatch.setattr(fake, 'get_video_list', fail)
+    assert client.get('/api/v1/user/MS4w/videos').status_code == 502
+
+    monkeypatch.setattr(fake, 'get_video_list', list_videos)
+    response = client.get('/api/v1/user/MS4w/videos')
+    assert response.status_code == 200
+    assert len(response.json['data']['videos']) == 1
+
+
+def test_parse_batch_streams_results(client, monkeypatch):
+    """测试批量解析接口逐行返回结果"""
+    parser = routes.get_parser()
+    monkeypatch.setattr(parser, '_expand_short_url', lambda url: None)
+    response = client.post('/api/v1/parse/batch', json={
+        'urls': ["https://www.douyin.com/user/a", "https://v.douyin.com/bad/", "x"]
+    })
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert response.mimetype == 'application/x-ndjson'
+    assert lines[0] == {'input': "https://www.douyin.com/user/a", 'url': "https://www.douyin.com/user/a"}
+    assert {line['input'] for line in lines if line['url'] is None} == {"https://v.douyin.com/bad/", "x"}
+
+
+def test_progress_stream_lifetime_and_subscriber_cap(client):
+    """测试进度事件流到期后结束，连接数达到上限时返回503"""
+    client.application.config.update(PROGRESS_STREAM_MAX_AGE=0.1, PROGRESS_STREAM_MAX_SUBSCRIBERS=1)
+    response = client.get('/api/v1/progress/stream', headers={'Last-Event-ID': '0'})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).startswith('retry: 3000')
+    response.close()
+
+    streaming = client.get('/api/v1/progress/stream', buffered=False)
+    assert streaming.status_code == 200
+    rejected = client.get('/api/v1/progress/stream')
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After'] == '5'
+    streaming.close()
+    response = client.get('/api/v1/progress/stream')
+    assert response.status_code == 200
+    response.close()
+    assert routes._stream_subscribers == 0
+
+
+def test_parse_batch_requires_urls(client):
+    """测试批量解析接口参数校验"""
+    assert client.post('/api/v1/parse/batch', json={'urls': []}).status_code == 400
+
+
+def test_metrics_endpoint(fake, client):
+    """测试指标接口按路由模板统计请求，并导出响应缓存统计"""
+    client.get('/api/v1/user/MS4w')
+    client.get('/api/v1/user/MS4w')
+    response = client.get('/api/v1/metrics')
+    text = response.data.decode()
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    assert 'douyin_http_requests_total{method="GET",route="/api/v1/user/<user_id>",status="200"}' in text
+    assert 'route="/api/v1/user/MS4w"' not in text
+    assert '# TYPE douyin_response_cache_hits_total counter' in text
+
+
+def test_create_app():
+    """测试应用工厂按配置注册蓝图"""
+    from app import create_app
+    from app.config.settings import config
+
+    app = create_app(config['testing'])
+    assert app.config['TESTING']
+    assert app.config['DOUYIN_BASE_URL'] == 'https://www.douyin.com'
+    assert '/api/v1/user/<user_id>' in {rule.rule for rule in app.url_map.iter_rules()}
+
+
+def test_bandwidth_admin(client, monkeypatch):
+    """测试查看和调整带宽整形设置，无效参数不做任何修改"""
+    shaper = BandwidthShaper()
+    monkeypatch.setattr(routes, 'bandwidth_shaper', shaper)
+    data = client.get('/api/v1/admin/bandwidth').get_json()['data']
+    assert data['rate'] is None
+    assert data['classes']['interactive']['weight'] == 8
+
+    response = client.put('/api/v1/admin/bandwidth', json={'caps': {'backfill': -1}})
+    assert response.status_code == 400
+    assert not shaper.enabled
+
+    response = client.put('/api/v1/admin/bandwidth', json={
+        'rate': 4096, 'weights': {'backfill': 2}, 'caps': {'backfill': 1024}
+    })
+    data = response.get_json()['data']
+    assert data['rate'] == 4096
+    assert data['classes']['backfill']['weight'] == 2
+    assert data['classes']['backfill']['cap'] == 1024
+
+    data = client.put('/api/v1/admin/bandwidth', json={'rate': None, 'caps': {'backfill': None}}).get_json()['data']
+    assert data['rate'] is None and data['classes']['backfill']['cap'] is None
+    assert data['classes']['backfill']['weight'] == 2
+
+
+def test_create_app_configures_bandwidth(monkeypatch):
+    """测试应用工厂按配置设置带宽整形"""
+    from app import create_app
+    from app.config.settings import config
+    from app.utils import bandwidth
+
+    class BandwidthConfig(config['testing']):
+        BANDWIDTH_RATE = 8192
+        BANDWIDTH_WEIGHTS = {'backfill': 3}
+        BANDWIDTH_CAPS = {'incremental': 2048}
+
+    shaper = BandwidthShaper()
+    monkeypatch.setattr(bandwidth, 'bandwidth_shaper', shaper)
+    create_app(BandwidthConfig)
+    stats = shaper.stats()
+    assert shaper.rate == 8192
+    assert stats['backfill']['weight'] == 3
+    assert stats['incremental']['cap'] == 2048
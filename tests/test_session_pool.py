@@ -0,0 +1,110 @@
+"""
+会话池的测试用例
+"""
+import threading
+
+import pytest
+import requests
+from app.core.downloader import DouyinDownloader
+from app.core.session_pool import SessionPool
+
+
+@pytest.fixture
+def pool():
+    """创建两个会话的会话池"""
+    return SessionPool(requests.Session, size=2)
+
+
+def _checkout_in_thread(pool, timeout=0.05):
+    """在新线程中尝试借出会话，返回是否成功"""
+    result = []
+
+    def run():
+        try:
+            with pool.checkout(timeout=timeout):
+                result.append(True)
+        except TimeoutError:
+            result.append(False)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_checkout_exclusive_and_nested(pool):
+    """测试会话独占借出，同一线程嵌套借出复用同一个会话"""
+    with pool.checkout() as first:
+        with pool.checkout() as nested:
+            assert nested is first
+        assert _checkout_in_thread(pool) is True
+        with pool.checkout() as again:
+            assert again is first
+    assert pool.current() is None
+
+
+def test_checkout_waits_when_exhausted(pool):
+    """测试会话全部借出时其他线程等待"""
+    ready = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.checkout():
+            ready.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    ready.wait()
+    with pool.checkout():
+        assert _checkout_in_thread(pool) is False
+    release.set()
+    holder.join()
+    assert _checkout_in_thread(pool) is True
+
+
+def test_affinity_prefers_same_session(pool):
+    """测试同一亲和键优先借出上次使用的会话，而不是最近归还的会话"""
+    bound = []
+    ready = threading.Event()
+
+    def hold():
+        with pool.checkout(affinity='user-a') as session:
+            bound.append(session)
+            ready.set()
+
+    with pool.checkout() as other:
+        thread = threading.Thread(target=hold)
+        thread.start()
+        ready.wait()
+        thread.join()
+    assert bound[0] is not other
+    with pool.checkout(affinity='user-a') as again:
+        assert again is bound[0]
+
+
+def test_downloader_identity_fixed():
+    """测试下载器每个会话的User-Agent固定，线程内使用借出的会话"""
+    downloader = DouyinDownloader(session_pool_size=3)
+    assert downloader.session_pool.sessions == []
+    primary = downloader.session
+    agents = [s.headers['User-Agent'] for s in downloader.session_pool.sessions]
+    with downloader.session_pool.checkout() as session:
+        assert downloader.session is session
+        assert downloader.user_agent == session.headers['User-Agent']
+    assert downloader.session is primary is downloader.session_pool.sessions[0]
+    assert [s.headers['User-Agent'] for s in downloader.session_pool.sessions] == agents
+    adapter = downloader.session.get_adapter('https://www.douyin.com/aweme/v1/web/aweme/post/')
+    assert adapter is not downloader.session.get_adapter('https://v3-web.douyinvod.com/video.mp4')
+
+
+def test_sessions_created_on_demand():
+    """测试会话在借出时才创建，有空闲会话时不创建新会话"""
+    pool = SessionPool(requests.Session, size=3)
+    assert pool.sessions == [] and pool.size == 3
+    with pool.checkout() as first:
+        assert pool.sessions == [first]
+    with pool.checkout() as again:
+        assert again is first
+    pool.ensure_size(5)
+    assert pool.size == 5 and len(pool.sessions) == 1
@@ -0,0 +1,81 @@
+"""
+本地替身服务器和基准测试的测试用例
+"""
+import requests
+
+from app.core.downloader import DouyinDownloader
+from app.utils.rate_limiter import RateLimiter
+from benchmarks.loadgen import local_service, run_load
+from benchmarks.standin import DouyinStandin
+from benchmarks.suite import compare, run_suite
+
+
+def make_downloader(standin, tmp_path):
+    """创建指向替身服务器的下载器"""
+    downloader = DouyinDownloader(**standin.downloader_kwargs(), download_root=str(tmp_path / 'downloads'))
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    downloader.rate_limiter = RateLimiter(rate=10000, burst=10000)
+    return downloader
+
+
+def test_download_all_offline(tmp_path):
+    """测试通过短链接离线下载用户的全部视频，分页和文件大小正确"""
+    with DouyinStandin(videos_per_user=45, video_size=64 * 1024, page_padding=4096) as standin:
+        downloader = make_downloader(standin, tmp_path)
+        results = downloader.download_all_videos(standin.short_url(0))
+        sizes = {video.video_id: video.size for video in standin.users[0].videos}
+        assert standin.stats['video_list'] == 3
+        detail = downloader.get_video_detail(standin.users[0].videos[3].video_id)
+
+    assert len(results) == 45
+    assert all(item['status'] == 'success' for item in results)
+    assert all((tmp_path / 'downloads' / 'standin_user_0').joinpath(item['path']).stat().st_size ==
+               sizes[item['video_id']] for item in results)
+    assert detail['play_url'].endswith('.mp4?sig=3')
+
+
+def test_cdn_range_and_faults(tmp_path):
+    """测试CDN的Range请求、429和中途断开"""
+    with DouyinStandin(videos_per_user=2, video_size=200 * 1024, cdn_rate_limit_every=2) as standin:
+        video = standin.users[0].videos[0]
+        url = f"{standin.cdn_url}/video/{video.video_id}.mp4"
+        response = requests.get(url, headers={'Range': 'bytes=0-99'})
+        assert response.status_code == 206
+        assert response.content == video.read(0, 99)
+        assert response.headers['Content-Range'] == f"bytes 0-99/{video.size}"
+        assert requests.get(url).status_code == 429
+
+    with DouyinStandin(videos_per_user=2, video_size=200 * 1024, disconnect_every=1) as standin:
+        video = standin.users[0].videos[0]
+        url = f"{standin.cdn_url}/video/{video.video_id}.mp4"
+        downloader = make_downloader(standin, tmp_path)
+        result = downloader.download_one_video({'video_id': video.video_id, 'title': 'v', 'play_url': url},
+                                               tmp_path)
+        assert result['status'] == 'failed'
+        assert result['reason'] == 'network'
+        assert standin.stats['disconnects'] == 1
+
+
+def test_suite_and_compare():
+    """测试运行基准场景，并按指标方向判断回退"""
+    results = run_suite(['parse_video_list'], quick=True, memory=False)
+    metrics = results['scenarios']['parse_video_list']['metrics']
+    assert metrics['iterations'] == 200 and metrics['ops_per_sec'] > 0
+
+    baseline = {'scenarios': {'s': {'metrics': {'ops_per_sec': 100, 'p99_ms': 10, 'iterations': 5}}}}
+    current = {'scenarios': {'s': {'metrics': {'ops_per_sec': 80, 'p99_ms': 10.5, 'iterations': 9}}}}
+    rows = {row['metric']: row for row in compare(baseline, current, threshold=0.1)}
+    assert rows['ops_per_sec']['regression']
+    assert not rows['p99_ms']['regression']
+    assert 'iterations' not in rows
+
+
+def test_loadgen_local_service():
+    """测试进程内启动API服务并压测所有路由"""
+    with local_service(users=5) as target:
+        results = run_load(target, users=5, duration=1, concurrency=4, rate=40)
+
+    assert set(results['routes']) == {'parse', 'user', 'videos', 'download'}
+    assert results['total']['errors'] == 0
+    assert results['total']['requests'] == 40
+    assert all(row['requests'] > 0 and row['p99_ms'] >= row['p50_ms'] for row in results['routes'].values())
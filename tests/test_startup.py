@@ -0,0 +1,48 @@
+"""
+启动开销的测试用例
+"""
+import json
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+
+import requests
+from app.core.downloader import DouyinDownloader
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CREATE_APP = 'from app import create_app; from app.config.settings import config; create_app(config["testing"])'
+
+
+def imported_modules(statement):
+    """在新的解释器中执行导入语句，返回之后已加载的模块名"""
+    code = f"{statement}\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    return set(json.loads(output.stdout.strip().splitlines()[-1]))
+
+
+def test_heavy_modules_not_imported():
+    """测试导入下载器和创建应用时不加载bs4、lxml和pandas"""
+    heavy = {'bs4', 'lxml', 'pandas'}
+    assert not heavy & imported_modules('import app.core.downloader')
+    assert not heavy & imported_modules(CREATE_APP)
+
+
+def test_light_imports():
+    """测试导入包和失败台账不加载flask和requests"""
+    assert not {'flask', 'requests'} & imported_modules('import app')
+    assert 'requests' not in imported_modules('import app.core.failures')
+
+
+def test_cookies_loaded_lazily(tmp_path):
+    """测试Cookies在第一次使用会话时才加载，构造后修改的路径生效"""
+    jar = requests.cookies.RequestsCookieJar()
+    jar.set('ttwid', 'abc', domain='.douyin.com', path='/')
+    cookies_file = tmp_path / 'cookies.pkl'
+    cookies_file.write_bytes(pickle.dumps(jar))
+
+    downloader = DouyinDownloader()
+    downloader.cookies_file = cookies_file
+    assert downloader.session_pool.sessions == []
+    assert downloader.session.cookies.get('ttwid') == 'abc'
+
@@ -0,0 +1,105 @@
+"""
+分阶段耗时追踪的测试用例
+"""
+import json
+import threading
+import time
+
+import pytest
+from app.core.downloader import DouyinDownloader
+from app.utils.tracing import Tracer, traced, tracer
+
+
+def busy_parse(seconds):
+    """模拟CPU密集的解析"""
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def test_disabled_records_nothing():
+    """测试未在记录时返回空区间"""
+    local = Tracer()
+    with local.span('idle') as span:
+        span.set(bytes=1)
+    assert not local.enabled
+    assert local.current().set(x=1) is None
+
+
+def test_nested_spans_and_summary(tmp_path):
+    """测试嵌套区间的自身耗时、出错标记和Chrome trace导出"""
+    local = Tracer()
+    with local.record() as run:
+        with local.span('crawl'):
+            with local.span('throttle'):
+                time.sleep(0.05)
+            with local.span('download') as span:
+                span.set(bytes=100)
+            with pytest.raises(ValueError):
+                with local.span('download'):
+                    raise ValueError('boom')
+    assert not local.enabled
+
+    summary = run.summary()
+    assert summary['download']['count'] == 2
+    assert summary['download']['bytes'] == 100
+    assert summary['download']['errors'] == 1
+    assert summary['crawl']['seconds'] >= 0.05
+    assert summary['crawl']['self_seconds'] < summary['throttle']['self_seconds']
+
+    trace = json.loads(run.export_chrome_trace(tmp_path / 'trace.json').read_text(encoding='utf-8'))
+    spans = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert [event['name'] for event in spans] == ['throttle', 'download', 'download', 'crawl']
+    assert spans[2]['args'] == {'outcome': 'error', 'error': 'ValueError'}
+    assert any(event['ph'] == 'M' and event['name'] == 'thread_name' for event in trace['traceEvents'])
+
+
+def test_sampling_profiler_only_profiled_spans(tmp_path):
+    """测试采样分析器只采集处于 profile 区间内的线程"""
+    local = Tracer()
+    with local.record(profile=True, interval=0.002) as run:
+        with local.span('parse', profile=True):
+            busy_parse(0.2)
+        busy_parse(0.1)
+    stacks = run.collapsed_stacks()
+    assert stacks
+    assert all('test_sampling_profiler_only_profiled_spans' in stack for stack in stacks)
+    assert sum(count for stack, count in stacks.items() if 'busy_parse' in stack) > 0
+
+    trace = run.to_chrome_trace()
+    assert trace['samples'] and trace['stackFrames']
+    assert run.export_collapsed(tmp_path / 'stacks.txt').read_text(encoding='utf-8').strip()
+
+
+def test_traced_decorator_threads():
+    """测试装饰器和多线程区间"""
+    @traced('work')
+    def work():
+        time.sleep(0.01)
+
+    with tracer.record() as run:
+        threads = [threading.Thread(target=work) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert run.summary()['work']['count'] == 3
+    assert len({span.tid for span in run.spans}) == 3
+
+
+def test_download_stages(http_server, tmp_path):
+    """测试下载过程记录请求和传输区间"""
+    http_server.add('/v.mp4', b'x' * 2048)
+    downloader = DouyinDownloader()
+    downloader.cookies_file = tmp_path / 'cookies.pkl'
+    downloader._throttle = lambda: None
+    with tracer.record() as run:
+        assert downloader.download_video(http_server.url('/v.mp4'), str(tmp_path / 'v.mp4'))
+
+    download = next(span for span in run.spans if span.name == 'download')
+    http = next(span for span in run.spans if span.name == 'http')
+    assert download.args['bytes'] == 2048 and download.args['outcome'] == 'ok'
+    assert http.args == {'method': 'GET', 'endpoint': 'cdn', 'status': 200}
+    assert download.child_ns >= http.duration_ns